@@ -0,0 +1,198 @@
+import threading
+
+from db import DB_PATH, get_connection
+from sharding import active_catalog
+
+# Aggregates over the conversations table, kept current by an insert trigger
+# so the dashboard never scans the raw log.
+HISTOGRAM_BUCKET = 10                 # interest 0-9, 10-19, ..., 100
+SERIES_LEVELS = (1, 100, 10000)       # turns per point at each resolution
+SERIES_RETAIN = 1000                  # finest level keeps only the last N turns
+MAX_CHART_POINTS = 200
+
+ANALYTICS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS interest_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        turns INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        nonzero_turns INTEGER NOT NULL,
+        nonzero_total INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS interest_histogram (
+        bucket INTEGER PRIMARY KEY,
+        turns INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS interest_series (
+        level INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        turns INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        PRIMARY KEY (level, bucket)
+    ) WITHOUT ROWID""",
+]
+
+
+def _series_upserts(row: str) -> str:
+    return "\n".join(
+        f"""INSERT INTO interest_series (level, bucket, turns, total)
+            VALUES ({size}, ({row}.id - 1) / {size}, 1, {row}.interest_score)
+            ON CONFLICT (level, bucket) DO UPDATE SET turns = turns + 1, total = total + excluded.total;"""
+        for size in SERIES_LEVELS
+    )
+
+
+ANALYTICS_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_analytics_ai AFTER INSERT ON conversations BEGIN
+        INSERT INTO interest_stats (id, turns, total, nonzero_turns, nonzero_total)
+            VALUES (1, 1, new.interest_score, new.interest_score > 0, MAX(new.interest_score, 0))
+            ON CONFLICT (id) DO UPDATE SET
+                turns = turns + 1,
+                total = total + excluded.total,
+                nonzero_turns = nonzero_turns + excluded.nonzero_turns,
+                nonzero_total = nonzero_total + excluded.nonzero_total;
+        INSERT INTO interest_histogram (bucket, turns)
+            VALUES (MIN(new.interest_score, 100) / {HISTOGRAM_BUCKET}, 1)
+            ON CONFLICT (bucket) DO UPDATE SET turns = turns + 1;
+        {_series_upserts("new")}
+        DELETE FROM interest_series
+            WHERE level = {SERIES_LEVELS[0]} AND bucket <= new.id - 1 - {SERIES_RETAIN};
+    END
+"""
+
+_BACKFILL = [
+    """INSERT INTO interest_stats (id, turns, total, nonzero_turns, nonzero_total)
+        SELECT 1, COUNT(*), COALESCE(SUM(interest_score), 0),
+               COALESCE(SUM(interest_score > 0), 0),
+               COALESCE(SUM(CASE WHEN interest_score > 0 THEN interest_score ELSE 0 END), 0)
+        FROM conversations""",
+    f"""INSERT INTO interest_histogram (bucket, turns)
+        SELECT MIN(interest_score, 100) / {HISTOGRAM_BUCKET}, COUNT(*)
+        FROM conversations GROUP BY 1""",
+    f"""INSERT INTO interest_series (level, bucket, turns, total)
+        SELECT {SERIES_LEVELS[0]}, (id - 1) / {SERIES_LEVELS[0]}, COUNT(*), SUM(interest_score)
+        FROM conversations
+        WHERE id > (SELECT COALESCE(MAX(id), 0) FROM conversations) - {SERIES_RETAIN}
+        GROUP BY 2""",
+] + [
+    f"""INSERT INTO interest_series (level, bucket, turns, total)
+        SELECT {size}, (id - 1) / {size}, COUNT(*), SUM(interest_score)
+        FROM conversations GROUP BY 2"""
+    for size in SERIES_LEVELS[1:]
+]
+
+ANALYTICS_TABLES = ("interest_stats", "interest_histogram", "interest_series")
+
+
+def _has_trigger(conn) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'conversations_analytics_ai'"
+    ).fetchone() is not None
+
+
+def ensure_analytics(conn) -> bool:
+    """
+    Create the aggregate tables and trigger. The first time (or after
+    conversations was dropped, taking the trigger with it) they are rebuilt
+    from whatever is already logged - one full scan, once.
+    """
+    if _has_trigger(conn):
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if _has_trigger(conn):
+            conn.rollback()
+            return False
+        for table in ANALYTICS_TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        for stmt in ANALYTICS_SCHEMA:
+            conn.execute(stmt)
+        has_log = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations'"
+        ).fetchone()
+        if has_log:
+            for stmt in _BACKFILL:
+                conn.execute(stmt)
+            conn.execute(ANALYTICS_TRIGGER)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+_ready = set()
+
+
+def _conn(db_path: str):
+    conn = get_connection(db_path)
+    if db_path not in _ready:
+        ensure_analytics(conn)
+        _ready.add(db_path)
+    return conn
+
+
+# ---------- Readers (O(1) / O(buckets)) ----------
+def interest_summary(db_path: str = DB_PATH) -> dict:
+    """Turn count and averages; `average_nonzero` skips 0% turns like the dashboard always has."""
+    row = _conn(db_path).execute(
+        "SELECT turns, total, nonzero_turns, nonzero_total FROM interest_stats WHERE id = 1"
+    ).fetchone()
+    turns, total, nz_turns, nz_total = row or (0, 0, 0, 0)
+    return {
+        "turns": turns,
+        "average": total / turns if turns else 0.0,
+        "average_nonzero": nz_total / nz_turns if nz_turns else 0.0,
+    }
+
+
+def interest_histogram(db_path: str = DB_PATH):
+    """[(bucket_start, turns)] for interest scores in HISTOGRAM_BUCKET-wide bins."""
+    rows = _conn(db_path).execute("SELECT bucket, turns FROM interest_histogram ORDER BY bucket").fetchall()
+    return [(b * HISTOGRAM_BUCKET, n) for b, n in rows]
+
+
+def interest_series(max_points: int = MAX_CHART_POINTS, db_path: str = DB_PATH):
+    """
+    Interest over time as [(turn, mean_interest)], using the finest series
+    level that covers the whole log in at most `max_points` points (the
+    last `max_points` points of the coarsest level otherwise).
+    """
+    conn = _conn(db_path)
+    row = conn.execute("SELECT turns FROM interest_stats WHERE id = 1").fetchone()
+    turns = row[0] if row else 0
+    if not turns:
+        return []
+    last_id = conn.execute("SELECT MAX(id) FROM conversations").fetchone()[0] or turns
+    size = SERIES_LEVELS[-1]
+    for level in SERIES_LEVELS:
+        retained = SERIES_RETAIN if level == SERIES_LEVELS[0] else last_id
+        if last_id <= retained and -(-last_id // level) <= max_points:
+            size = level
+            break
+    rows = conn.execute(
+        """SELECT bucket, turns, total FROM interest_series
+           WHERE level = ? ORDER BY bucket DESC LIMIT ?""",
+        (size, max_points),
+    ).fetchall()
+    rows.reverse()
+    return [(b * size + (size + 1) / 2 if size > 1 else b + 1, total / n) for b, n, total in rows]
+
+
+_catalog_stats = (None, None)
+_catalog_stats_lock = threading.Lock()
+
+
+def catalog_stats(db_path: str = DB_PATH):
+    """(total_products, [(category, count)]) computed once per catalog load."""
+    global _catalog_stats
+    generation = active_catalog(db_path).generation
+    cached_generation, stats = _catalog_stats
+    if cached_generation == generation:
+        return stats
+    with _catalog_stats_lock:
+        rows = get_connection(db_path).execute(
+            "SELECT category, COUNT(*) FROM products GROUP BY category ORDER BY category"
+        ).fetchall()
+        stats = (sum(n for _, n in rows), rows)
+        _catalog_stats = (generation, stats)
+    return stats
@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl
+
+from analytics import catalog_stats, interest_series, interest_summary
+from chat_engine import RESPONSE_CACHE, generate_response, log_conversation
+import conversations
+from log_writer import get_log_writer
+from product import FIELDS
+from session_context import SessionContext
+import tracing
+
+# Headless JSON chat API on a stdlib asyncio HTTP/1.1 server. Chat turns and
+# analytics reads run on a bounded thread pool; the event loop only parses
+# requests, so thousands of idle keep-alive sessions cost almost nothing.
+HOST = "127.0.0.1"
+PORT = 8000
+DB_THREADS = 8            # concurrent generate_response / analytics calls
+MAX_PENDING = 256         # turns admitted at once; beyond that requests get 503
+MAX_BATCH = 256           # messages per /chat/batch request
+MAX_SESSIONS = 10000      # SessionContexts kept, least recently used evicted
+MAX_PAGE = 1000          # turns per GET /conversations page
+MAX_BODY = 1 << 20
+IDLE_TIMEOUT = 30.0       # seconds a keep-alive connection may sit idle
+
+RESULT_FIELDS = FIELDS    # keys of each result object, in product.Product order
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str = None, headers=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.headers = headers or {}
+
+
+class _Session:
+    __slots__ = ("context", "lock", "users")
+
+    def __init__(self):
+        self.context = SessionContext()
+        self.lock = asyncio.Lock()
+        self.users = 0          # turns holding or waiting for the lock
+
+
+class SessionStore:
+    """
+    session_id -> SessionContext, LRU-bounded, with a lock per session so its
+    turns stay ordered. Only idle sessions are evicted: one with a turn in
+    flight or queued stays (past maxsize if need be) until its turns finish.
+    """
+
+    def __init__(self, maxsize: int = MAX_SESSIONS):
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+
+    async def acquire(self, session_id: str):
+        """The session's context, with its lock held; pair with release()."""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = _Session()
+        else:
+            self._sessions.move_to_end(session_id)
+        entry.users += 1
+        self._evict()
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            entry.users -= 1
+            raise
+        return entry.context
+
+    def release(self, session_id: str):
+        entry = self._sessions[session_id]
+        entry.lock.release()
+        entry.users -= 1
+
+    def _evict(self):
+        excess = len(self._sessions) - self.maxsize
+        if excess <= 0:
+            return
+        idle = []
+        for session_id, entry in self._sessions.items():
+            if not entry.users:
+                idle.append(session_id)
+                if len(idle) == excess:
+                    break
+        for session_id in idle:
+            del self._sessions[session_id]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def _turn(message: str, context, log: bool) -> dict:
+    """One chat turn, run on the DB thread pool."""
+    bot_text, interest, results = generate_response(message, context)
+    logged = log_conversation(message, bot_text, interest, results) if log else None
+    return {
+        "response": bot_text,
+        "interest": interest,
+        "results": [r.as_dict() for r in results],
+        "logged": logged,
+    }
+
+
+def _turns(items) -> list:
+    """A batch of turns in one pool job; a failed item does not fail the batch."""
+    out = []
+    for message, context, log in items:
+        try:
+            out.append(_turn(message, context, log))
+        except Exception as e:
+            print("API ERROR:", e)
+            out.append({"error": str(e)})
+    return out
+
+
+def _analytics(max_points: int) -> dict:
+    total, categories = catalog_stats()
+    return {
+        "summary": interest_summary(),
+        "series": interest_series(max_points),
+        "catalog": {"total": total, "categories": dict(categories)},
+    }
+
+
+def _conversations(limit: int, cursor, since, until) -> dict:
+    rows, next_cursor = conversations.page(limit, cursor, since, until, newest_first=True)
+    return {
+        "turns": [{"id": r[0], "message": r[1], "response": conversations.render_turn(r),
+                   "interest": r[3], "timestamp": r[4]} for r in rows],
+        "next": f"{next_cursor[0]}|{next_cursor[1]}" if next_cursor else None,
+    }
+
+
+class ChatAPI:
+    def __init__(self, db_threads: int = DB_THREADS, max_pending: int = MAX_PENDING,
+                 max_sessions: int = MAX_SESSIONS):
+        self.executor = ThreadPoolExecutor(db_threads, thread_name_prefix="foodiebot-db")
+        self.max_pending = max_pending
+        self.sessions = SessionStore(max_sessions)
+        self.pending = 0
+        self.counters = {"requests": 0, "turns": 0, "rejected": 0, "errors": 0}
+
+    # ---------- Admission ----------
+    def _admit(self, n: int):
+        # Shed load before queueing on the pool: a fast 503 beats a slow timeout
+        if self.pending + n > self.max_pending:
+            self.counters["rejected"] += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "server busy, retry shortly",
+                            {"Retry-After": "1"})
+        self.pending += n
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # ---------- Routes ----------
+    @staticmethod
+    def _message(item) -> str:
+        message = item.get("message") if isinstance(item, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, '"message" must be a non-empty string')
+        return message
+
+    async def chat(self, body: dict) -> dict:
+        message = self._message(body)
+        session_id = body.get("session_id")
+        log = body.get("log", True)
+        self._admit(1)
+        try:
+            if session_id is None:
+                return await self._run(_turn, message, "", log)
+            session_id = str(session_id)
+            context = await self.sessions.acquire(session_id)
+            try:
+                return await self._run(_turn, message, context, log)
+            finally:
+                self.sessions.release(session_id)
+        finally:
+            self.pending -= 1
+            self.counters["turns"] += 1
+
+    async def chat_batch(self, body: dict) -> dict:
+        items = body.get("requests")
+        if not isinstance(items, list) or not items:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, '"requests" must be a non-empty list')
+        if len(items) > MAX_BATCH:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"at most {MAX_BATCH} requests per batch")
+        parsed = []
+        for item in items:
+            message = self._message(item)
+            session_id = item.get("session_id")
+            parsed.append((message, None if session_id is None else str(session_id), item.get("log", True)))
+        self._admit(len(parsed))
+        contexts = {}
+        try:
+            # Sorted acquisition so overlapping batches cannot deadlock
+            for session_id in sorted({sid for _, sid, _ in parsed if sid is not None}):
+                contexts[session_id] = await self.sessions.acquire(session_id)
+            turns = [(message, "" if sid is None else contexts[sid], log) for message, sid, log in parsed]
+            return {"responses": await self._run(_turns, turns)}
+        finally:
+            for session_id in reversed(list(contexts)):
+                self.sessions.release(session_id)
+            self.pending -= len(parsed)
+            self.counters["turns"] += len(parsed)
+
+    async def analytics(self, query: dict) -> dict:
+        try:
+            max_points = int(query.get("max_points", 200))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "max_points must be an integer")
+        return await self._run(_analytics, max_points)
+
+    async def conversation_page(self, query: dict) -> dict:
+        """Newest turns first; pass the returned `next` as `cursor` for the following page."""
+        try:
+            limit = min(max(int(query.get("limit", 50)), 1), MAX_PAGE)
+            cursor = None
+            if query.get("cursor"):
+                timestamp, _, cid = query["cursor"].rpartition("|")
+                cursor = (timestamp, int(cid))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "limit must be an integer and cursor a previous `next`")
+        return await self._run(_conversations, limit, cursor, query.get("since"), query.get("until"))
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "pending": self.pending,
+            "sessions": len(self.sessions),
+            **self.counters,
+            "response_cache": RESPONSE_CACHE.stats(),
+            "log_writer": get_log_writer().stats(),
+            "tracing": tracing.snapshot() if tracing.ENABLED else None,
+        }
+
+    async def dispatch(self, method: str, path: str, query: dict, body: bytes):
+        if path == "/health":
+            return {"status": "ok"}
+        if path == "/stats":
+            return self.stats()
+        if path == "/analytics":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            return await self.analytics(query)
+        if path == "/conversations":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            return await self.conversation_page(query)
+        if path in ("/chat", "/chat/batch"):
+            if method != "POST":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "body must be JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+            return await (self.chat(payload) if path == "/chat" else self.chat_batch(payload))
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    # ---------- HTTP/1.1 ----------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                        {"error": "headers too large"}, keep_alive=False)
+                    return
+                try:
+                    method, path, query, headers, version = _parse_head(head)
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request"},
+                                        keep_alive=False)
+                    return
+                keep_alive = _keep_alive(version, headers)
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0 or length > MAX_BODY:
+                        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                    body = await reader.readexactly(length) if length else b""
+                except ValueError:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "bad Content-Length")
+
+                self.counters["requests"] += 1
+                status, extra = HTTPStatus.OK, None
+                try:
+                    payload = await self.dispatch(method, path, query, body)
+                except HTTPError as e:
+                    status, payload, extra = e.status, {"error": str(e)}, e.headers
+                except Exception as e:
+                    print("API ERROR:", e)
+                    self.counters["errors"] += 1
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+                await self._respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    return
+        except HTTPError as e:
+            await self._respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status: HTTPStatus, payload, keep_alive=True, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def _parse_head(head: bytes):
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split(" ")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    path, _, qs = target.partition("?")
+    query = dict(parse_qsl(qs))
+    return method.upper(), path, query, headers, version
+
+
+def _keep_alive(version: str, headers: dict) -> bool:
+    conn = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return conn == "keep-alive"
+    return conn != "close"
+
+
+# ---------- Serving ----------
+async def serve(host: str = HOST, port: int = PORT, db_threads: int = DB_THREADS,
+                max_pending: int = MAX_PENDING, reuse_port: bool = False, ready=None):
+    api = ChatAPI(db_threads, max_pending)
+    server = await asyncio.start_server(api.handle, host, port, reuse_port=reuse_port or None,
+                                        backlog=1024)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows / not the main thread
+            pass
+    bound = server.sockets[0].getsockname()
+    print(f"✅ FoodieBot API (pid {os.getpid()}) listening on http://{bound[0]}:{bound[1]}", flush=True)
+    if ready is not None:
+        ready(bound[1])
+    async with server:
+        await stop.wait()
+    api.close()
+
+
+def _worker(host, port, db_threads, max_pending):
+    asyncio.run(serve(host, port, db_threads, max_pending, reuse_port=True))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless FoodieBot chat API")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes sharing the port (SO_REUSEPORT) and foodiebot.db")
+    parser.add_argument("--db-threads", type=int, default=DB_THREADS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        asyncio.run(serve(args.host, args.port, args.db_threads, args.max_pending))
+        return 0
+
+    import multiprocessing
+    procs = [multiprocessing.Process(target=_worker, daemon=True,
+                                     args=(args.host, args.port, args.db_threads, args.max_pending))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    while not stop.is_set() and any(p.is_alive() for p in procs):
+        stop.wait(1.0)
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from benchmark import query_workload, summarize
+
+DEFAULT_SESSIONS = 200
+DEFAULT_TURNS = 20
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection to the API."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split(b" ", 2)[1])
+        length, close = 0, False
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection" and value.strip().lower() == "close":
+                close = True
+        data = await self.reader.readexactly(length) if length else b""
+        if close:
+            await self.close()
+        return status, json.loads(data) if data else None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def _session(host, port, sid, turns, batch, think, rng, latencies, statuses):
+    client = Client(host, port)
+    try:
+        i = 0
+        while i < len(turns):
+            chunk = turns[i:i + batch]
+            i += len(chunk)
+            if batch > 1:
+                path = "/chat/batch"
+                payload = {"requests": [{"message": m, "session_id": sid} for m in chunk]}
+            else:
+                path, payload = "/chat", {"message": chunk[0], "session_id": sid}
+            t0 = time.perf_counter_ns()
+            try:
+                status, _ = await client.request("POST", path, payload)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                status = type(e).__name__
+                await client.close()
+            latencies.append(time.perf_counter_ns() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+    finally:
+        await client.close()
+
+
+async def run(host: str, port: int, sessions: int, turns: int, batch: int = 1,
+              think: float = 0.0, seed: int = 0) -> dict:
+    """Drive `sessions` concurrent sessions of `turns` messages each; returns a report."""
+    rng = random.Random(seed)
+    workload = [m for m, _ in query_workload(sessions * turns, seed)]
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _session(host, port, f"load-{seed}-{s}", workload[s * turns:(s + 1) * turns], batch, think,
+                 random.Random(rng.random()), latencies, statuses)
+        for s in range(sessions)
+    ))
+    wall = time.perf_counter() - start
+    report = summarize(latencies, wall)
+    report["turns_per_s"] = sessions * turns / wall if wall else 0.0
+    report["statuses"] = {str(k): v for k, v in sorted(statuses.items(), key=str)}
+    stats_client = Client(host, port)
+    try:
+        report["server"] = (await stats_client.request("GET", "/stats"))[1]
+    finally:
+        await stats_client.close()
+    return report
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port: int, workers: int = 1, extra=()):
+    """Start api.py in a subprocess and wait until it accepts connections."""
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api.py"),
+           "--port", str(port), "--workers", str(workers), *extra]
+    proc = subprocess.Popen(cmd)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("api.py exited during startup")
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("api.py did not start listening")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the FoodieBot HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="port of a running api.py (default: spawn one)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes when spawning")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="messages per session")
+    parser.add_argument("--batch", type=int, default=1, help="messages per /chat/batch request")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between turns, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    proc = None
+    port = args.port
+    if port is None:
+        port = _free_port()
+        proc = spawn_server(port, args.workers)
+    try:
+        report = asyncio.run(run(args.host, port, args.sessions, args.turns,
+                                 args.batch, args.think, args.seed))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    print(f"⏱️  {args.sessions} sessions × {args.turns} turns (batch {args.batch}): "
+          f"{report['turns_per_s']:,.0f} turns/s")
+    print(f"   p50 {report['p50_ms']:.2f}ms  p95 {report['p95_ms']:.2f}ms  "
+          f"p99 {report['p99_ms']:.2f}ms  max {report['max_ms']:.2f}ms")
+    print(f"   statuses {report['statuses']}, rejected by server {report['server']['rejected']}")
+    errors = sum(n for status, n in report["statuses"].items() if status != "200")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,22 @@
 import streamlit as st
 from datetime import datetime
-import pandas as pd
-import sqlite3
-import matplotlib.pyplot as plt
 
+from analytics import catalog_stats, interest_series, interest_summary
 from chat_engine import generate_response, log_conversation
+from rendering import snippet
+from session_context import SessionContext
+from sharding import active_catalog
+import tracing
+
+# Dietary tags the sidebar tracks as "mentioned" once a result carries them
+DIETARY_MENTIONS = frozenset({"vegetarian", "vegan", "spicy"})
 
 st.set_page_config(page_title="🍔 FoodieBot Chat & Analytics", layout="wide")
 st.title("🍔 FoodieBot Chat & Analytics")
 
 # Session state
 if "context" not in st.session_state:
-    st.session_state.context = ""
+    st.session_state.context = SessionContext()
 if "history" not in st.session_state:
     st.session_state.history = []  # list of dicts: {role, text, interest, ts}
 if "last_results" not in st.session_state:
@@ -32,67 +37,64 @@ with left:
         st.session_state.history.append({"role": "user", "text": user_input, "interest": None, "ts": ts})
         st.session_state.history.append({"role": "bot", "text": bot_text, "interest": int(interest), "ts": ts})
         st.session_state.last_results = results
-        st.session_state.context += f"User: {user_input}\nBot: {bot_text}\n"
 
         # update dietary mentions
         for r in results:
-            tags = (r[6] or "").lower()
-            if "vegetarian" in tags:
-                st.session_state.dietary_mentions.add("vegetarian")
-            if "vegan" in tags:
-                st.session_state.dietary_mentions.add("vegan")
-            if "spicy" in tags:
-                st.session_state.dietary_mentions.add("spicy")
+            st.session_state.dietary_mentions.update(DIETARY_MENTIONS & r.tags)
 
         try:
-            log_conversation(user_input, bot_text, interest)
+            if not log_conversation(user_input, bot_text, interest, results):
+                st.warning("Conversation log queue is full; this turn was not logged.")
         except Exception:
             st.warning("Failed to log conversation (non-blocking).")
 
-    st.markdown("### Conversation")
-    if not st.session_state.history:
-        st.info("Try: `show me burgers`, `I want vegan wraps`, `Any spicy vegetarian curry under $8?`")
-    else:
-        for turn in st.session_state.history[-30:]:
-            if turn["role"] == "user":
-                st.markdown(f"**You:** {turn['text']}")
-            else:
-                st.markdown(f"**Bot:** {turn['text']}")
-                st.caption(f"Interest: {turn['interest']}%")
-
-    st.markdown("### Results preview from database")
-    if st.session_state.last_results:
-        for r in st.session_state.last_results[:20]:
-            pid, name, category, price, spice, desc, tags = r
-            st.markdown(f"**{name}** — *{category}* — ${price:.2f} — Spice {spice}/10")
-            if desc:
-                st.caption(desc if len(desc) <= 200 else desc[:200].rsplit(" ", 1)[0] + "...")
-            if tags:
-                st.markdown(f"*Tags:* `{tags}`")
-            st.markdown("---")
-    else:
-        st.info("No matching products found in database. Try different keywords or relax constraints.")
+    with tracing.span("streamlit_render"):
+        st.markdown("### Conversation")
+        if not st.session_state.history:
+            st.info("Try: `show me burgers`, `I want vegan wraps`, `Any spicy vegetarian curry under $8?`")
+        else:
+            for turn in st.session_state.history[-30:]:
+                if turn["role"] == "user":
+                    st.markdown(f"**You:** {turn['text']}")
+                else:
+                    st.markdown(f"**Bot:** {turn['text']}")
+                    st.caption(f"Interest: {turn['interest']}%")
+
+        st.markdown("### Results preview from database")
+        if st.session_state.last_results:
+            # title/description excerpts are rendered once per catalog version
+            cache = active_catalog().snippets
+            for r in st.session_state.last_results[:20]:
+                snip = snippet(r, cache)
+                st.markdown(snip.preview_title)
+                if snip.preview_desc:
+                    st.caption(snip.preview_desc)
+                if r.dietary_tags:
+                    st.markdown(f"*Tags:* `{r.dietary_tags}`")
+                st.markdown("---")
+        else:
+            st.info("No matching products found in database. Try different keywords or relax constraints.")
 
 with right:
     st.subheader("📊 Analytics")
-    # load conversation logs (persistent)
+    # pre-aggregated by a trigger on conversations (see analytics.py)
     try:
-        conn = sqlite3.connect("foodiebot.db")
-        conv_df = pd.read_sql_query("SELECT * FROM conversations ORDER BY id", conn)
-        conn.close()
+        summary = interest_summary()
+        series = interest_series()
     except Exception:
-        conv_df = pd.DataFrame()
+        summary, series = {"turns": 0}, []
+
+    if summary["turns"]:
+        st.metric("Average Interest", f"{summary['average_nonzero']:.2f}%")
+        import matplotlib.pyplot as plt  # only once there is something to chart
 
-    if not conv_df.empty:
-        valid = conv_df[conv_df["interest_score"] > 0]["interest_score"]
-        avg = valid.mean() if not valid.empty else 0.0
-        st.metric("Average Interest", f"{avg:.2f}%")
         fig, ax = plt.subplots()
-        ax.plot(list(range(1, len(conv_df) + 1)), conv_df["interest_score"], marker="o")
+        ax.plot([x for x, _ in series], [y for _, y in series], marker="o" if len(series) <= 50 else None)
         ax.set_xlabel("Turn")
         ax.set_ylabel("Interest (%)")
         ax.set_ylim(0, 100)
         st.pyplot(fig)
+        plt.close(fig)
     else:
         st.metric("Average Interest", "0.00%")
         st.info("No conversation logs yet.")
@@ -102,14 +104,31 @@ with right:
 
     st.markdown("**Database status**")
     try:
-        conn = sqlite3.connect("foodiebot.db")
-        total = pd.read_sql_query("SELECT COUNT(*) AS total FROM products", conn)["total"].iloc[0]
-        cat_counts = pd.read_sql_query("SELECT category, COUNT(*) as count FROM products GROUP BY category", conn)
-        conn.close()
+        total, cat_counts = catalog_stats()
         st.write(f"Total Products: **{int(total)}**")
-        st.dataframe(cat_counts, height=200)
+        st.dataframe(
+            {"category": [c for c, _ in cat_counts], "count": [n for _, n in cat_counts]},
+            height=200,
+        )
     except Exception:
         st.error("Failed to read products DB. Run setup_db.py locally to create/populate database.")
 
+if tracing.ENABLED:
+    with st.expander("🩺 Diagnostics"):
+        diag = tracing.snapshot()
+        stages = diag["stages"]
+        if stages:
+            st.markdown("**Stage latency (ms)**")
+            st.dataframe([{"stage": name, **stats} for name, stats in stages.items()])
+        for q in diag["sql"]:
+            st.markdown(f"**{q['name']}** — {q['count']} runs, p95 {q['p95_ms']:.3f} ms")
+            st.code(q["sql"] + "\n\n" + "\n".join(q["plan"]), language="sql")
+        if diag["slowest"]:
+            st.markdown("**Slowest profiled turns**")
+            for item in diag["slowest"]:
+                st.write(f"{item['ms']:.1f} ms — `{item['profile']}`")
+        if st.button("Reset diagnostics"):
+            tracing.reset()
+
 st.markdown("---")
 st.caption("Quick tests: `show me burgers`, `I want vegan wraps`, `Any spicy vegetarian curry under $8?`, `Less than 10 dollars pasta`") 
@@ -0,0 +1,791 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from db import PRODUCTS_PATH
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_QUERIES = 2000
+DEFAULT_OUT = "benchmark_results.json"   # the latency report --compare reads
+MODE_OUT = "benchmark_{mode}.json"        # reports of the other modes, so they never overwrite it
+TEMPLATE_PATH = PRODUCTS_PATH    # synthetic catalogs resample the committed dataset
+REGRESSION_THRESHOLD = 0.20   # flag p95 increases above 20%
+
+# Weighted mix of realistic chat messages; None context = fresh session,
+# "veg" = a session where the user already said they are vegetarian.
+QUERY_MIX = [
+    ("show me burgers", 10, None),
+    ("I want vegan wraps", 6, None),
+    ("anything under $10", 8, None),
+    ("Less than 10 dollars pasta", 3, None),
+    ("What's spicy?", 6, None),
+    ("Any spicy vegetarian curry under $8?", 4, None),
+    ("pizza", 8, None),
+    ("something cheesy and comforting", 4, None),
+    ("I'm vegetarian", 4, None),
+    ("salad under $9", 4, "veg"),
+    ("spicy tacos", 4, "veg"),
+    ("how much is the classic cheeseburger?", 3, None),
+    ("I'll take the Mediterranean Veggie Burger", 2, None),
+    ("Maybe that's too expensive, I don't like it", 2, None),
+    ("I love spicy food, amazing!", 3, None),
+    ("dessert", 4, None),
+    ("breakfast", 3, None),
+    ("fried chicken wings", 3, None),
+    ("korean", 3, None),
+    ("a shake please", 2, "veg"),
+    ("gluten-free options", 2, None),
+    ("fries", 2, None),
+]
+
+_NAME_PREFIXES = ("Classic", "Spicy", "Loaded", "Mini", "Deluxe", "Crispy", "Smoky", "Garden",
+                  "Double", "Zesty", "Golden", "Fiery", "Royal", "Street", "Urban", "Rustic")
+
+
+# ---------- Synthetic catalogs ----------
+def synthetic_products(n: int, seed: int = 0, template_path: str = TEMPLATE_PATH):
+    """
+    Yield n products shaped like products.json: each is a copy of a random
+    real product with a fresh id and name and price/spice/popularity
+    resampled from the real distributions.
+    """
+    with open(template_path, "r", encoding="utf-8") as f:
+        templates = json.load(f)["products"]
+    rng = random.Random(seed)
+    prices = [p["price"] for p in templates]
+    spices = [p["spice_level"] for p in templates]
+    pops = [p["popularity_score"] for p in templates]
+    for i in range(n):
+        p = dict(rng.choice(templates))
+        p["product_id"] = f"SY{i:07d}"
+        p["name"] = f"{rng.choice(_NAME_PREFIXES)} {p['name']} #{i}"
+        p["price"] = round(max(1.0, rng.choice(prices) + rng.uniform(-1.5, 1.5)), 2)
+        p["spice_level"] = min(10, max(0, rng.choice(spices) + rng.randint(-1, 1)))
+        p["popularity_score"] = min(100, max(0, rng.choice(pops) + rng.randint(-5, 5)))
+        yield p
+
+
+def build_catalog_db(n: int, db_path: str, seed: int = 0) -> float:
+    """Write a synthetic catalog to db_path through setup_db.ingest; returns seconds."""
+    from setup_db import ingest
+
+    feed = db_path + ".ndjson"
+    with open(feed, "w", encoding="utf-8") as f:
+        for p in synthetic_products(n, seed):
+            f.write(json.dumps(p))
+            f.write("\n")
+    try:
+        return ingest(feed, db_path, rebuild=True)["seconds"]
+    finally:
+        os.remove(feed)
+
+
+def query_workload(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    messages = [m for m, _, _ in QUERY_MIX]
+    weights = [w for _, w, _ in QUERY_MIX]
+    contexts = {m: c for m, _, c in QUERY_MIX}
+    picks = rng.choices(messages, weights=weights, k=count)
+    return [(m, contexts[m]) for m in picks]
+
+
+# ---------- Measurement ----------
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies_ns, wall_seconds):
+    ms = sorted(x / 1e6 for x in latencies_ns)
+    return {
+        "calls": len(ms),
+        "mean_ms": sum(ms) / len(ms) if ms else 0.0,
+        "p50_ms": _percentile(ms, 0.50),
+        "p95_ms": _percentile(ms, 0.95),
+        "p99_ms": _percentile(ms, 0.99),
+        "max_ms": ms[-1] if ms else 0.0,
+        "throughput_per_s": len(ms) / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def _timed(fn, args_list):
+    latencies = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for args in args_list:
+        t0 = clock()
+        fn(*args)
+        latencies.append(clock() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def _peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def run_worker(size: int, db_path: str, queries: int, seed: int, cache: bool) -> dict:
+    """Runs inside a fresh interpreter whose FOODIEBOT_DB points at db_path."""
+    import chat_engine
+    from catalog import get_catalog
+    from normalizer import clean_text, parse_price_range
+    from session_context import SessionContext
+
+    if not cache:
+        chat_engine.RESPONSE_CACHE.maxsize = 0
+
+    t0 = time.perf_counter()
+    get_catalog(db_path)
+    catalog_load = time.perf_counter() - t0
+
+    workload = query_workload(queries, seed)
+
+    def context_for(kind):
+        if kind != "veg":
+            return ""
+        ctx = SessionContext()
+        ctx.dietary.add("vegetarian")
+        return ctx
+
+    # Warm-up pass so one-off costs (FTS migration check, statement cache) are excluded
+    for m, kind in workload[:20]:
+        chat_engine.generate_response(m, context_for(kind))
+
+    # Filters exactly as generate_response derives them, precomputed for query_database
+    filter_args = []
+    for m, kind in workload:
+        text = clean_text(m)
+        features = chat_engine.extract_features(text)
+        filters = {"context": "vegetarian" if kind == "veg" else ""}
+        filters.update(features.filters)
+        price_min, price_max = parse_price_range(text)
+        if price_min is not None:
+            filters["price_min"] = price_min
+        if price_max is not None:
+            filters["price_max"] = price_max
+        if not features.category_like:
+            filters["keyword"] = text
+        filter_args.append((filters,))
+
+    ops = {
+        "generate_response": _timed(chat_engine.generate_response,
+                                    [(m, context_for(kind)) for m, kind in workload]),
+        "query_database": _timed(chat_engine.query_database, filter_args),
+        "calculate_interest_score": _timed(chat_engine.calculate_interest_score,
+                                           [(m, True) for m, _ in workload]),
+    }
+    return {
+        "size": size,
+        "catalog_load_seconds": catalog_load,
+        "peak_memory_mb": _peak_memory_mb(),
+        "response_cache": chat_engine.RESPONSE_CACHE.stats(),
+        "ops": ops,
+    }
+
+
+# ---------- Microbenchmarks ----------
+def _legacy_clean_text(s) -> str:
+    """chat_engine._clean_text as it was before normalizer.py, for comparison."""
+    import re
+    import unicodedata
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKC", str(s))
+    s = re.sub(r"[\u200B-\u200D\uFEFF]", "", s)
+    s = "".join(ch for ch in s if ch.isprintable() or ch in "\n\t")
+    return s.strip()
+
+
+def _legacy_parse_price(text: str):
+    import re
+    if not text:
+        return None
+    t = text.lower()
+    m = re.search(r"under ?\$\s*([0-9]+(?:\.[0-9]+)?)", t)
+    if not m:
+        m = re.search(r"less than\s*([0-9]+(?:\.[0-9]+)?)\s*dollars?", t)
+    return float(m.group(1)) if m else None
+
+
+def _per_call_us(fn, args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for a in args:
+            fn(a)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(args) * 1e6
+
+
+def run_micro(seed: int = 0, rows_per_turn: int = 20) -> dict:
+    """
+    Text normalization and price parsing, old vs new, per call and per turn.
+    Before the catalog and cleaned-at-ingestion text, every turn also cleaned
+    each of the 7 columns of up to 20 result rows; that cost is now zero.
+    """
+    from normalizer import clean_text, parse_price
+
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        products = json.load(f)["products"]
+    messages = [m for m, _ in query_workload(2000, seed)] + ["Café crème — ｄｅｓｓｅｒｔ​ please"] * 20
+    columns = [str(p.get(k, "")) for p in products
+               for k in ("product_id", "name", "category", "price", "spice_level", "description")]
+
+    ops = {
+        "clean_text(message)": (_legacy_clean_text, clean_text, messages),
+        "clean_text(column)": (_legacy_clean_text, clean_text, columns),
+        "parse_price(message)": (_legacy_parse_price, parse_price, messages),
+    }
+    report = {}
+    for name, (old, new, args) in ops.items():
+        report[name] = {"old_us": _per_call_us(old, args), "new_us": _per_call_us(new, args)}
+    msg, col, price = (report[k] for k in ops)
+    report["per_turn"] = {
+        "old_us": msg["old_us"] + price["old_us"] + rows_per_turn * 7 * col["old_us"],
+        "new_us": msg["new_us"] + price["new_us"],
+    }
+    return report
+
+
+# ---------- Sharded query workers ----------
+DEFAULT_SHARDS = (0, 1, 2, 4)
+# CPU-heavy catalog queries (custom ranking weights, substring keyword scans),
+# the ones a single process serializes under the GIL.
+SHARD_WEIGHTS = ({"budget_fit": 0.5, "chef_special": 0.3}, {"spice_closeness": 1.0, "limited_time": 0.5})
+SHARD_KEYWORDS = ("spicy", "cheese", "chicken", "garden", "smoky", "rice")
+
+
+def shard_workload(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        kwargs = {"price_max": rng.choice((None, 8.0, 12.0, 20.0)), "limit": 20}
+        if rng.random() < 0.5:
+            kwargs["weights"] = rng.choice(SHARD_WEIGHTS)
+            kwargs["spice_min"] = rng.choice((None, 3, 6))
+        else:
+            kwargs["keyword"] = rng.choice(SHARD_KEYWORDS)
+        out.append(kwargs)
+    return out
+
+
+def _run_clients(query, workload, clients: int) -> dict:
+    """Drive `query(**kwargs)` from `clients` threads; latency per call."""
+    import threading
+
+    latencies = []
+    items = iter(workload)
+    lock = threading.Lock()
+
+    def client():
+        clock = time.perf_counter_ns
+        local = []
+        while True:
+            with lock:
+                kwargs = next(items, None)
+            if kwargs is None:
+                break
+            t0 = clock()
+            query(**kwargs)
+            local.append(clock() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_shards(size: int, workdir: str, queries: int, seed: int, shard_counts, clients: int,
+               partition: str = "hash") -> dict:
+    """Same heavy workload through the in-process catalog (0) and N shard processes."""
+    from catalog import Catalog
+    from ranking import RankingEngine
+    from sharding import ShardedCatalog
+
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    build_catalog_db(size, db_path, seed)
+    workload = shard_workload(queries, seed)
+    results = []
+    for n in shard_counts:
+        t0 = time.perf_counter()
+        if n == 0:
+            catalog = Catalog.load(db_path)
+            engine = RankingEngine(catalog)
+            query, close = engine.query, None
+        else:
+            catalog = ShardedCatalog(n, db_path, partition)
+            query, close = catalog.query, catalog.close
+        load = time.perf_counter() - t0
+        try:
+            for kwargs in workload[:20]:
+                query(**kwargs)
+            stats = _run_clients(query, workload, clients)
+        finally:
+            if close:
+                close()
+            catalog = engine = query = None
+        results.append({"shards": n, "load_seconds": load, **stats})
+    base = results[0]["throughput_per_s"] if results else 0.0
+    for r in results:
+        r["speedup"] = r["throughput_per_s"] / base if base else 0.0
+    return {"size": size, "clients": clients, "partition": partition,
+            "cpus": os.cpu_count(), "results": results}
+
+
+# ---------- Cold start ----------
+def run_cold_start(size: int, workdir: str, seed: int) -> dict:
+    """Time to the first query result: Catalog.load from SQLite vs mapping a snapshot."""
+    import gc
+
+    from catalog import Catalog
+    from snapshot import SnapshotCatalog, export
+
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    snap_path = os.path.join(workdir, f"bench_{size}.snap")
+    build_catalog_db(size, db_path, seed)
+    t0 = time.perf_counter()
+    export(Catalog.load(db_path), snap_path)
+    export_seconds = time.perf_counter() - t0
+    gc.collect()
+
+    result = {"size": size, "export_seconds": export_seconds,
+              "snapshot_mb": os.path.getsize(snap_path) / 1e6}
+    for name, open_catalog in (("sqlite", lambda: Catalog.load(db_path)),
+                               ("snapshot", lambda: SnapshotCatalog(snap_path))):
+        t0 = time.perf_counter()
+        catalog = open_catalog()
+        opened = time.perf_counter() - t0
+        catalog.query(category="burger", price_max=10.0)
+        first = time.perf_counter() - t0
+        result[name] = {"open_ms": opened * 1000, "first_query_ms": first * 1000}
+        catalog = None
+        gc.collect()
+    return result
+
+
+# ---------- Semantic search ----------
+SEMANTIC_QUERIES = ("something cheesy and comforting", "smoky bbq", "crispy garden snack",
+                    "spicy chicken with rice", "loaded deluxe burger", "a mini sweet treat")
+SEMANTIC_CHANGED = 0.01   # fraction of products edited before the incremental re-sync
+
+
+def run_semantic(size: int, workdir: str, queries: int, seed: int) -> dict:
+    """Embedding search: index build, filtered top-k latency, and incremental vector sync."""
+    import sqlite3
+
+    from catalog import Catalog
+    from ranking import get_engine
+    from semantic import SemanticIndex, ranked_ids, sync_vectors
+
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    build_catalog_db(size, db_path, seed)   # ingest featurizes every product
+    catalog = Catalog.load(db_path)
+    get_engine(catalog)
+    t0 = time.perf_counter()
+    index = SemanticIndex.load(catalog, db_path)
+    build_seconds = time.perf_counter() - t0
+
+    rng = random.Random(seed)
+    workload = [(rng.choice(SEMANTIC_QUERIES), rng.choice((None, 8.0, 12.0, 20.0))) for _ in range(queries)]
+    latencies = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for text, price_max in workload:
+        t0 = clock()
+        ranked_ids(catalog, text, price_max=price_max, db_path=db_path)
+        latencies.append(clock() - t0)
+    stats = summarize(latencies, time.perf_counter() - start)
+
+    conn = sqlite3.connect(db_path)
+    step = max(1, int(1 / SEMANTIC_CHANGED))
+    conn.execute(f"UPDATE products SET description = description || ' smoky' WHERE rowid % {step} = 0")
+    conn.commit()
+    t0 = time.perf_counter()
+    synced = sync_vectors(conn)
+    sync_seconds = time.perf_counter() - t0
+    conn.close()
+    return {"size": size, "index_build_seconds": build_seconds,
+            "index_mb": (index.positions.nbytes + index.weights.nbytes) / 1e6,
+            "query": stats, "incremental_sync_seconds": sync_seconds,
+            "vectors_recomputed": synced["updated"]}
+
+
+# ---------- Conversation log ----------
+DEFAULT_CONVERSATIONS = 10_000_000
+CONVERSATION_DAYS = 90        # logged turns are spread evenly over this many days...
+CONVERSATION_RETAIN = 30      # ...and the rollup keeps the last this many
+CONVERSATION_VARIANTS = 512   # distinct synthetic turns, cycled through
+CONVERSATION_READS = 200
+
+
+def _conversation_variants(storage: str, seed: int = 0):
+    """(message, response, interest, product_ids, filters) turns shaped like real logs."""
+    from log_writer import compact_fields
+    from rendering import render_response
+
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        templates = json.load(f)["products"]
+    rows = [(p["product_id"], p["name"], p["category"], float(p["price"]), int(p["spice_level"]),
+             p["description"], ",".join(p.get("dietary_tags") or [])) for p in templates]
+    rng = random.Random(seed)
+    messages = [m for m, _, _ in QUERY_MIX]
+    filter_sets = [{}, {"category": "Burger"}, {"price_max": 10.0}, {"dietary_tags": "vegetarian", "spice_min": 5}]
+    out = []
+    for _ in range(CONVERSATION_VARIANTS):
+        results = rng.sample(rows, rng.choice((0, 3, 8, 12, 20)))
+        interest = rng.choice((0, 0, 5, 10, 15, 25, 30, 45))
+        if storage == "compact":
+            out.append((rng.choice(messages), None, interest) + compact_fields(results, rng.choice(filter_sets)))
+        else:
+            out.append((rng.choice(messages), render_response(results), interest, None, None))
+    return out
+
+
+def _db_size_mb(conn) -> tuple:
+    """(file MB, MB in use): pages freed by deletes stay in the file until VACUUM."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * page_size / 1e6, (pages - free) * page_size / 1e6
+
+
+def _time_reads(fn, runs: int = CONVERSATION_READS) -> dict:
+    return _timed(fn, [()] * runs)
+
+
+def run_conversations(turns: int, workdir: str, storage: str, seed: int = 0) -> dict:
+    """
+    Log `turns` synthetic turns over CONVERSATION_DAYS days, then time the
+    keyset readers against OFFSET paging, and the rollup to CONVERSATION_RETAIN
+    days. Rows are bulk-inserted with the timestamp index in place but
+    without the dashboard trigger, which is measured by the main benchmark.
+    """
+    import sqlite3
+
+    import conversations
+    from log_writer import ensure_conversations
+
+    db_path = os.path.join(workdir, f"conversations_{storage}_{turns}.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    ensure_conversations(conn)
+    variants = _conversation_variants(storage, seed)
+    start_epoch = int(datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp())
+    step = CONVERSATION_DAYS * 86400 / turns
+    insert = ("INSERT INTO conversations (user_message, bot_response, interest_score, timestamp, "
+              "product_ids, filters) VALUES (?, ?, ?, datetime(?, 'unixepoch'), ?, ?)")
+    t0 = time.perf_counter()
+    chunk = 50_000
+    for lo in range(0, turns, chunk):
+        batch = []
+        for i in range(lo, min(turns, lo + chunk)):
+            m, r, interest, ids, filters = variants[i % CONVERSATION_VARIANTS]
+            batch.append((m, r, interest, start_epoch + int(i * step), ids, filters))
+        conn.executemany(insert, batch)
+        conn.commit()
+    insert_seconds = time.perf_counter() - t0
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    file_mb, _ = _db_size_mb(conn)
+
+    def day(k):
+        return (datetime(2026, 1, 1) + timedelta(days=k)).strftime("%Y-%m-%d")
+
+    middle = conn.execute("SELECT timestamp, id FROM conversations WHERE id = ?", (turns // 2,)).fetchone()
+    reads = {
+        "newest_page": _time_reads(lambda: conversations.page(100, newest_first=True, db_path=db_path)),
+        "keyset_page_middle": _time_reads(lambda: conversations.page(100, after=middle, db_path=db_path)),
+        "offset_page_middle": _time_reads(lambda: conn.execute(
+            f"SELECT {conversations.TURN_COLUMNS} FROM conversations ORDER BY timestamp, id "
+            f"LIMIT 100 OFFSET {turns // 2}").fetchall(), runs=5),
+        "one_day_page": _time_reads(lambda: conversations.page(
+            100, since=day(CONVERSATION_DAYS // 2), until=day(CONVERSATION_DAYS // 2 + 1), db_path=db_path)),
+    }
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(days=CONVERSATION_DAYS)
+    t0 = time.perf_counter()
+    rolled = conversations.rollup(CONVERSATION_RETAIN, now=now, db_path=db_path)
+    rollup_seconds = time.perf_counter() - t0
+    reads["daily_after_rollup"] = _time_reads(lambda: conversations.daily(
+        since=day(CONVERSATION_DAYS - 7), db_path=db_path), runs=20)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    _, live_mb = _db_size_mb(conn)
+    conn.close()
+    os.remove(db_path)
+    return {"turns": turns, "storage": storage, "insert_seconds": insert_seconds,
+            "inserts_per_s": turns / insert_seconds if insert_seconds else 0.0,
+            "db_mb": file_mb, "bytes_per_turn": file_mb * 1e6 / turns,
+            "rollup_seconds": rollup_seconds, "rolled_up": rolled["rolled_up"],
+            "db_mb_after_rollup": live_mb, "reads": reads}
+
+
+# ---------- Startup ----------
+STARTUP_MODES = {"default": {}, "headless": {"FOODIEBOT_HEADLESS": "1"}}
+STARTUP_MESSAGE = "show me burgers"
+
+# Runs in a fresh interpreter under -X importtime; prints one JSON line.
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import chat_engine
+t1 = time.perf_counter()
+chat_engine.generate_response({message!r})
+t2 = time.perf_counter()
+here = {here!r}
+third_party = sorted({{m.split(".")[0] for m in sys.modules}} - set(sys.stdlib_module_names)
+                     - {{f[:-3] for f in __import__("os").listdir(here) if f.endswith(".py")}}
+                     - {{"__main__", "__mp_main__", "_distutils_hack"}})
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_response_ms": (t2 - t0) * 1000,
+                  "third_party": third_party}}))
+"""
+
+
+def _importtime(stderr: str, top: int = 8):
+    """Slowest modules by self time from -X importtime output: [(module, self_ms, cumulative_ms)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(rows, key=lambda r: -r[1])[:top]
+
+
+def run_startup(db_path: str, runs: int = 5) -> dict:
+    """Cold `import chat_engine` + first generate_response per mode, median of `runs` fresh interpreters."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = _STARTUP_SCRIPT.format(message=STARTUP_MESSAGE, here=here)
+    report = {}
+    for mode, extra_env in STARTUP_MODES.items():
+        env = dict(os.environ, FOODIEBOT_DB=db_path, **extra_env)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, (here, env.get("PYTHONPATH"))))
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-X", "importtime", "-c", script], env=env, check=True,
+                                 capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(db_path)))
+            samples.append((json.loads(out.stdout.strip().splitlines()[-1]), out.stderr))
+        samples.sort(key=lambda s: s[0]["first_response_ms"])
+        median, stderr = samples[len(samples) // 2]
+        report[mode] = {**median, "slowest_imports": _importtime(stderr)}
+    return report
+
+
+# ---------- Driver ----------
+def run_size(size: int, workdir: str, queries: int, seed: int, cache: bool) -> dict:
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    build_seconds = build_catalog_db(size, db_path, seed)
+    env = dict(os.environ, FOODIEBOT_DB=db_path)
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--size", str(size),
+           "--db", db_path, "--queries", str(queries), "--seed", str(seed)]
+    if not cache:
+        cmd.append("--no-cache")
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["build_seconds"] = build_seconds
+    return result
+
+
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD):
+    """List of human-readable p95 regressions between two result files."""
+    base = {r["size"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in current.get("results", []):
+        old = base.get(r["size"])
+        if not old:
+            continue
+        for op, stats in r["ops"].items():
+            old_p95 = old["ops"].get(op, {}).get("p95_ms")
+            if old_p95 and stats["p95_ms"] > old_p95 * (1 + threshold):
+                regressions.append(
+                    f"{op} @ {r['size']}: p95 {old_p95:.3f}ms -> {stats['p95_ms']:.3f}ms "
+                    f"(+{(stats['p95_ms'] / old_p95 - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the FoodieBot chat hot path")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--out", help=f"report file (default {DEFAULT_OUT}, or "
+                                      f"{MODE_OUT.format(mode='<mode>')} for --startup/--conversations/--shards)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="flag p95 regressions against an earlier run")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--micro", action="store_true", help="text normalization / price parsing microbenchmarks only")
+    parser.add_argument("--shards", type=int, nargs="+", metavar="N",
+                        help=f"query-worker scaling: compare N shard processes (0 = in-process), "
+                             f"e.g. {' '.join(map(str, DEFAULT_SHARDS))}")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1,
+                        help="concurrent client threads for --shards")
+    parser.add_argument("--partition", default="hash", choices=("hash", "category"))
+    parser.add_argument("--cold-start", action="store_true",
+                        help="time to first query: SQLite catalog load vs memory-mapped snapshot")
+    parser.add_argument("--semantic", action="store_true",
+                        help="embedding search: index build, top-k latency, incremental sync")
+    parser.add_argument("--conversations", type=int, nargs="?", const=DEFAULT_CONVERSATIONS, metavar="TURNS",
+                        help=f"conversation log size, paging and rollup (default {DEFAULT_CONVERSATIONS:,} turns)")
+    parser.add_argument("--storage", nargs="+", default=["full", "compact"], choices=("full", "compact"),
+                        help="log storage modes for --conversations")
+    parser.add_argument("--startup", action="store_true",
+                        help="cold import + time to first response, default vs headless (-X importtime)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per --startup mode")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    mode = next((m for m in ("startup", "conversations", "shards") if getattr(args, m)), None)
+    if args.out is None:
+        args.out = MODE_OUT.format(mode=mode) if mode else DEFAULT_OUT
+
+    if args.worker:
+        print(json.dumps(run_worker(args.size, args.db, args.queries, args.seed, not args.no_cache)))
+        return 0
+
+    if args.micro:
+        for name, r in run_micro(args.seed).items():
+            speedup = r["old_us"] / r["new_us"] if r["new_us"] else float("inf")
+            print(f"   {name:<22} {r['old_us']:8.2f}us -> {r['new_us']:7.2f}us  ({speedup:,.1f}x)")
+        return 0
+
+    if args.startup:
+        with tempfile.TemporaryDirectory(prefix="foodiebot-bench-") as workdir:
+            size = min(args.sizes)
+            db_path = os.path.join(workdir, f"bench_{size}.db")
+            build_catalog_db(size, db_path, args.seed)
+            report = run_startup(db_path, args.runs)
+        for mode, r in report.items():
+            extra = f", third-party: {', '.join(r['third_party'])}" if r["third_party"] else ", stdlib only"
+            print(f"⏱️  {mode:<9} import {r['import_ms']:6.1f}ms, first response {r['first_response_ms']:6.1f}ms{extra}")
+            for name, self_ms, cumulative_ms in r["slowest_imports"][:5]:
+                print(f"      {name:<36} self {self_ms:6.1f}ms  cumulative {cumulative_ms:6.1f}ms")
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                                "python": platform.python_version(), "platform": platform.platform()},
+                       "startup": report}, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+        return 0
+
+    if args.conversations:
+        reports = []
+        with tempfile.TemporaryDirectory(prefix="foodiebot-bench-") as workdir:
+            for storage in args.storage:
+                print(f"⏱️  {args.conversations:,} logged turns, {storage} storage...", flush=True)
+                r = run_conversations(args.conversations, workdir, storage, args.seed)
+                reports.append(r)
+                print(f"   {r['db_mb']:,.0f} MB ({r['bytes_per_turn']:,.0f} B/turn), "
+                      f"{r['inserts_per_s']:,.0f} inserts/s; rollup of {r['rolled_up']:,} turns "
+                      f"{r['rollup_seconds']:.1f}s -> {r['db_mb_after_rollup']:,.0f} MB in use")
+                for name, q in r["reads"].items():
+                    print(f"   {name:<20} p50 {q['p50_ms']:8.3f}ms  p95 {q['p95_ms']:8.3f}ms")
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                                "python": platform.python_version(), "platform": platform.platform(),
+                                "seed": args.seed},
+                       "conversations": reports}, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+        return 0
+
+    if args.semantic:
+        with tempfile.TemporaryDirectory(prefix="foodiebot-bench-") as workdir:
+            for size in args.sizes:
+                r = run_semantic(size, workdir, args.queries, args.seed)
+                q = r["query"]
+                print(f"⏱️  {size:,} products: top-k p50 {q['p50_ms']:.2f}ms  p95 {q['p95_ms']:.2f}ms  "
+                      f"p99 {q['p99_ms']:.2f}ms; index {r['index_mb']:.1f} MB built in "
+                      f"{r['index_build_seconds']:.2f}s; {r['vectors_recomputed']:,} changed vectors "
+                      f"re-synced in {r['incremental_sync_seconds']:.2f}s")
+        return 0
+
+    if args.cold_start:
+        with tempfile.TemporaryDirectory(prefix="foodiebot-bench-") as workdir:
+            for size in args.sizes:
+                r = run_cold_start(size, workdir, args.seed)
+                print(f"⏱️  {size:,} products: sqlite load {r['sqlite']['first_query_ms']:,.1f}ms, "
+                      f"snapshot {r['snapshot']['first_query_ms']:,.2f}ms to first result "
+                      f"(open {r['snapshot']['open_ms']:.2f}ms; {r['snapshot_mb']:.1f} MB, "
+                      f"export {r['export_seconds']:.1f}s)")
+        return 0
+
+    if args.shards:
+        reports = []
+        with tempfile.TemporaryDirectory(prefix="foodiebot-bench-") as workdir:
+            for size in args.sizes:
+                print(f"⏱️  {size:,} products, {args.clients} clients, {args.partition} shards...", flush=True)
+                r = run_shards(size, workdir, args.queries, args.seed, args.shards,
+                               args.clients, args.partition)
+                reports.append(r)
+                for s in r["results"]:
+                    label = f"{s['shards']} shards" if s["shards"] else "in-process"
+                    print(f"   {label:<12} p50 {s['p50_ms']:.2f}ms  p95 {s['p95_ms']:.2f}ms  "
+                          f"{s['throughput_per_s']:,.0f}/s  ({s['speedup']:.2f}x, load {s['load_seconds']:.1f}s)")
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                                "python": platform.python_version(), "platform": platform.platform(),
+                                "queries": args.queries, "seed": args.seed},
+                       "shards": reports}, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+        return 0
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="foodiebot-bench-") as workdir:
+        for size in args.sizes:
+            print(f"⏱️  {size:,} products...", flush=True)
+            r = run_size(size, workdir, args.queries, args.seed, not args.no_cache)
+            results.append(r)
+            for op, s in r["ops"].items():
+                print(f"   {op:<26} p50 {s['p50_ms']:.3f}ms  p95 {s['p95_ms']:.3f}ms  "
+                      f"p99 {s['p99_ms']:.3f}ms  {s['throughput_per_s']:,.0f}/s")
+            print(f"   build {r['build_seconds']:.1f}s, catalog load {r['catalog_load_seconds']:.2f}s, "
+                  f"peak memory {r['peak_memory_mb'] or 0:.0f} MB")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "queries": args.queries,
+            "seed": args.seed,
+            "response_cache": not args.no_cache,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"⚠️ Regression: {line}")
+        if regressions:
+            return 1
+        print("✅ No regressions against", args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from array import array
+
+from db import DB_PATH, get_connection
+from normalizer import clean_text
+from product import Product, ResultSet
+from tags import TagDictionary, require_tags
+
+# How often get_catalog() asks SQLite whether the products table was rebuilt.
+VERSION_CHECK_INTERVAL = 1.0
+
+# Columns the catalog keeps in memory, in popularity order.
+_LOAD_SQL = """
+    SELECT product_id, name, category, price, spice_level, description,
+           dietary_tags, mood_tags, popularity_score,
+           calories, prep_time, chef_special, limited_time,
+           dietary_mask, mood_mask, allergen_mask, rowid
+    FROM products
+    {where}
+    ORDER BY popularity_score DESC, rowid
+"""
+
+
+# Incremented every time a Catalog is built, so caches can tell reloads apart.
+_generations = itertools.count(1)
+
+
+def _db_version(conn):
+    """(user_version, schema_version) - both change when setup_db.py rebuilds products."""
+    user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    return (user_version, schema_version)
+
+
+def _bits(mask: int):
+    """Indexes of the set bits in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _trigrams(s: str):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class Catalog:
+    """
+    Read-only, in-memory copy of the products table.
+
+    Products are stored in popularity order, so position i doubles as the
+    popularity rank and every posting list below is already sorted the same
+    way the old `ORDER BY popularity_score DESC` returned rows.
+    """
+
+    def __init__(self, rows, version=None, tags=None):
+        self.version = version
+        self.tags = tags or TagDictionary()
+        self.generation = next(_generations)
+        n = len(rows)
+        self.rows = []                     # Products, as query_database returns them
+        self.price = array("d", [0.0]) * n
+        self.spice = array("i", [0]) * n
+        self.popularity = array("i", [0]) * n
+        self.calories = array("i", [0]) * n
+        self.prep_time = array("i", [0]) * n
+        self.chef_special = array("b", [0]) * n
+        self.limited_time = array("b", [0]) * n
+        self.dietary_mask = array("q", [0]) * n
+        self.mood_mask = array("q", [0]) * n
+        self.allergen_mask = array("q", [0]) * n
+        self.rowid = array("q", [0]) * n
+        self.category_lc = []
+        self.haystack = []                 # lowercased keyword fields, NUL separated
+        self.position = {}                 # raw product_id -> position
+
+        self.veg_bits = veg_bits = self.tags.any_mask("dietary", ("vegetarian", "vegan"))
+        by_category = {}
+        by_dietary = {}
+        veg = array("i")
+        for i, (pid, name, category, price, spice, desc, dietary, mood,
+                pop, calories, prep, chef, limited, dmask, mmask, amask, rowid) in enumerate(rows):
+            price = float(price) if price is not None else 0.0
+            spice = int(spice) if spice is not None else 0
+            self.rows.append(Product(
+                clean_text(pid),
+                clean_text(name),
+                clean_text(category),
+                price,
+                spice,
+                clean_text(desc),
+                clean_text(dietary),
+            ))
+            self.position[pid] = i
+            self.price[i] = price
+            self.spice[i] = spice
+            self.popularity[i] = pop or 0
+            self.calories[i] = calories or 0
+            self.prep_time[i] = prep or 0
+            self.chef_special[i] = 1 if chef else 0
+            self.limited_time[i] = 1 if limited else 0
+            self.dietary_mask[i] = dmask
+            self.mood_mask[i] = mmask
+            self.allergen_mask[i] = amask
+            self.rowid[i] = rowid
+
+            cat_lc = (category or "").lower()
+            self.category_lc.append(cat_lc)
+            by_category.setdefault(cat_lc, array("i")).append(i)
+            for bit in _bits(dmask):
+                by_dietary.setdefault(bit, array("i")).append(i)
+            if dmask & veg_bits:
+                veg.append(i)
+            self.haystack.append("\0".join(
+                (col or "").lower() for col in (name, category, desc, dietary, mood)
+            ))
+
+        self.by_category = by_category
+        self.by_dietary = by_dietary       # dietary tag bit -> positions
+        self.vegetarian = veg
+        self._match_cache = {}
+
+        # Sorted (value, position) views for range predicates.
+        self.price_order = array("i", sorted(range(n), key=self.price.__getitem__))
+        self.price_sorted = array("d", (self.price[i] for i in self.price_order))
+        self.spice_order = array("i", sorted(range(n), key=self.spice.__getitem__))
+        self.spice_sorted = array("i", (self.spice[i] for i in self.spice_order))
+
+        self._trigrams = None
+        self._trigram_lock = threading.Lock()
+
+        # product_id -> rendering.Snippet for rows that are not Products (they carry their own)
+        self.snippets = {}
+
+    @property
+    def trigrams(self):
+        """
+        Trigram -> positions, for LIKE '%kw%' over the keyword fields. Built
+        on first use: keyword search normally goes through FTS5 (fts.py), and
+        this index is by far the most expensive part of a large catalog.
+        """
+        if self._trigrams is None:
+            with self._trigram_lock:
+                if self._trigrams is None:
+                    grams = {}
+                    for i, text in enumerate(self.haystack):
+                        for g in _trigrams(text):
+                            postings = grams.get(g)
+                            if postings is None:
+                                grams[g] = [i]
+                            else:
+                                postings.append(i)
+                    self._trigrams = {g: array("i", postings) for g, postings in grams.items()}
+        return self._trigrams
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def load(cls, db_path: str = DB_PATH, where: str = "", params=()):
+        """Load products (optionally only those matching a `WHERE ...` clause, e.g. one shard)."""
+        conn = get_connection(db_path)
+        require_tags(conn)
+        version = _db_version(conn)
+        rows = conn.execute(_LOAD_SQL.format(where=where), params).fetchall()
+        return cls(rows, version, TagDictionary.load(conn))
+
+    # ---------- Posting lists ----------
+    def _matching(self, index: dict, needle: str):
+        """Posting lists whose indexed value contains `needle` (like LOWER(col) LIKE '%needle%')."""
+        key = (id(index), needle)
+        lists = self._match_cache.get(key)
+        if lists is None:
+            lists = [postings for value, postings in index.items() if needle in value]
+            if len(self._match_cache) < 1024:
+                self._match_cache[key] = lists
+        return lists
+
+    @staticmethod
+    def _merge(lists):
+        if not lists:
+            return array("i")
+        if len(lists) == 1:
+            return lists[0]
+        return array("i", heapq.merge(*lists))
+
+    def _keyword_candidates(self, kw: str):
+        """Smallest trigram posting list for kw; positions still need a substring check."""
+        if len(kw) < 3:
+            return None
+        best = None
+        trigrams = self.trigrams
+        for g in _trigrams(kw):
+            postings = trigrams.get(g)
+            if postings is None:
+                return array("i")
+            if best is None or len(postings) < len(best):
+                best = postings
+        return best
+
+    def _candidates(self, category, price_max, spice_min, dietary_bits, vegetarian, keyword, limit,
+                    price_min=None):
+        """Positions to walk, in popularity order; None means "no match possible"."""
+        n = len(self.rows)
+
+        # Candidate sources as (size, thunk producing positions in popularity order);
+        # nothing is merged or sliced unless that source is the one we walk.
+        sources = []
+        if category:
+            c_lists = self._matching(self.by_category, category)
+            sources.append((sum(map(len, c_lists)), lambda: self._merge(c_lists)))
+        if dietary_bits:
+            d_list = min((self.by_dietary.get(bit, array("i")) for bit in _bits(dietary_bits)), key=len)
+            sources.append((len(d_list), lambda: d_list))
+        if vegetarian:
+            sources.append((len(self.vegetarian), lambda: self.vegetarian))
+        if keyword:
+            kw_list = self._keyword_candidates(keyword)
+            if kw_list is not None:
+                sources.append((len(kw_list), lambda: kw_list))
+        if price_min is not None or price_max is not None:
+            p_lo = bisect.bisect_left(self.price_sorted, price_min) if price_min is not None else 0
+            p_hi = bisect.bisect_right(self.price_sorted, price_max) if price_max is not None else n
+            p_hi = max(p_lo, p_hi)
+            sources.append((p_hi - p_lo, lambda: sorted(self.price_order[p_lo:p_hi])))
+        if spice_min is not None:
+            s_cut = bisect.bisect_left(self.spice_sorted, spice_min)
+            sources.append((n - s_cut, lambda: sorted(self.spice_order[s_cut:])))
+
+        # Either walk the smallest candidate list, or walk the whole catalog in
+        # popularity order and stop after `limit` hits - whichever is expected to
+        # touch fewer positions (selectivities treated as independent).
+        if not sources:
+            return range(n)
+        size, build = min(sources, key=lambda s: s[0])
+        if size == 0:
+            return None
+        selectivity = 1.0
+        for s_size, _ in sources:
+            selectivity *= s_size / n
+        if size < limit / selectivity:
+            return build()
+        return range(n)
+
+    # ---------- Query ----------
+    def query(self, category=None, price_max=None, spice_min=None, dietary=None,
+              vegetarian=False, keyword=None, ranked_ids=None, limit=20,
+              exclude_allergens=None, price_min=None):
+        """
+        Same filter semantics as the original SQL in query_database: substring
+        match on category/keyword fields, price_min <= price <= price_max,
+        spice_level >= spice_min, most popular first.
+
+        `dietary` is a tag or list of tags that must all be present, matched
+        exactly through the tag bitmasks; `exclude_allergens` drops products
+        carrying any of the given allergens. `ranked_ids` (e.g. from
+        fts.keyword_search) restricts the result to those products and keeps
+        their order instead of popularity order.
+
+        Returns a ResultSet over this catalog's shared Product objects.
+        """
+        return ResultSet(self.rows, self.query_positions(
+            category, price_max, spice_min, dietary, vegetarian, keyword,
+            ranked_ids, limit, exclude_allergens, price_min))
+
+    def query_positions(self, category=None, price_max=None, spice_min=None, dietary=None,
+                        vegetarian=False, keyword=None, ranked_ids=None, limit=20,
+                        exclude_allergens=None, price_min=None):
+        """Positions of the rows query() returns, in the same order."""
+        category = category.lower() if category else None
+        keyword = keyword.lower() if keyword else None
+        need = 0
+        if dietary:
+            need = self.tags.mask("dietary", [dietary] if isinstance(dietary, str) else dietary)
+            if need is None:
+                return []
+        veg_bits = self.veg_bits if vegetarian else 0
+        if vegetarian and not veg_bits:
+            return []
+        excluded = self.tags.any_mask("allergen", exclude_allergens) if exclude_allergens else 0
+
+        if ranked_ids is not None:
+            position = self.position
+            positions = [position[pid] for pid in ranked_ids if pid in position]
+        else:
+            positions = self._candidates(category, price_max, spice_min, need,
+                                         vegetarian, keyword, limit, price_min)
+            if positions is None:
+                return []
+
+        price, spice = self.price, self.spice
+        dietary_mask, allergen_mask = self.dietary_mask, self.allergen_mask
+        category_lc, haystack = self.category_lc, self.haystack
+        out = []
+        for i in positions:
+            if price_max is not None and price[i] > price_max:
+                continue
+            if price_min is not None and price[i] < price_min:
+                continue
+            if spice_min is not None and spice[i] < spice_min:
+                continue
+            if category and category not in category_lc[i]:
+                continue
+            if dietary_mask[i] & need != need:
+                continue
+            if veg_bits and not dietary_mask[i] & veg_bits:
+                continue
+            if allergen_mask[i] & excluded:
+                continue
+            if keyword and keyword not in haystack[i]:
+                continue
+            out.append(i)
+            if len(out) >= limit:
+                break
+        return out
+
+
+# ---------- Process-wide instance ----------
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_catalog(db_path: str = DB_PATH) -> Catalog:
+    """Return the shared catalog, reloading it if the products table was rebuilt."""
+    global _catalog, _checked_at
+    now = time.monotonic()
+    cat = _catalog
+    if cat is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return cat
+    with _lock:
+        if _catalog is not None:
+            version = _db_version(get_connection(db_path))
+            if version != _catalog.version:
+                _catalog = None
+        if _catalog is None:
+            _catalog = Catalog.load(db_path)
+        _checked_at = now
+        return _catalog
+
+
+def invalidate_catalog():
+    """Drop the cached catalog; the next get_catalog() reloads from SQLite."""
+    global _catalog
+    with _lock:
+        _catalog = None
+
+
+def reload_catalog(db_path: str = DB_PATH) -> Catalog:
+    invalidate_catalog()
+    return get_catalog(db_path)
@@ -1,19 +1,93 @@
 import os
 import re
 import sqlite3
-import unicodedata
-from dotenv import load_dotenv
-
-try:
-    import google.generativeai as genai
-    load_dotenv()
-    if os.getenv("GEMINI_API_KEY"):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        MODEL_AVAILABLE = True
-    else:
-        MODEL_AVAILABLE = False
-except Exception:
-    MODEL_AVAILABLE = False
+import threading
+
+from db import get_connection
+from fts import FTSUnavailable, keyword_search
+from log_writer import get_log_writer
+from matcher import PhraseMatcher
+from normalizer import clean_text, parse_price, parse_price_range
+from product import EMPTY
+from rendering import iter_response, render_response
+from response_cache import ResponseCache
+from session_context import SessionContext
+from sharding import ShardedCatalog, ShardError, active_catalog
+from tracing import request, span
+
+# Headless: the request path only, on the standard library - no LLM client,
+# no dotenv, no NumPy ranking (custom weights fall back to popularity/FTS order).
+HEADLESS = os.environ.get("FOODIEBOT_HEADLESS", "") not in ("", "0")
+
+# Embedding search (semantic.py) over the user's message: "fallback" only when
+# the keyword/filter query finds nothing, "hybrid" appends similar products
+# after the FTS matches, "off" disables it. Needs NumPy; skipped when headless
+# and with query workers.
+SEMANTIC_SEARCH = os.environ.get("FOODIEBOT_SEMANTIC", "fallback")
+
+# ---------- LLM (optional) ----------
+# Responses are rule-based, so google.generativeai and python-dotenv are only
+# imported the first time llm_model() is called, not when chat_engine loads.
+LLM_MODEL_NAME = "gemini-1.5-flash"
+_llm = None            # [model or None] once resolved
+_llm_lock = threading.Lock()
+
+
+def llm_model():
+    """The configured Gemini model, or None (headless, package missing or no GEMINI_API_KEY)."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                model = None
+                if not HEADLESS:
+                    try:
+                        from dotenv import load_dotenv
+                        import google.generativeai as genai
+                        load_dotenv()
+                        if os.getenv("GEMINI_API_KEY"):
+                            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                            model = genai.GenerativeModel(LLM_MODEL_NAME)
+                    except Exception:
+                        model = None
+                _llm = [model]
+    return _llm[0]
+
+
+def __getattr__(name):
+    # MODEL_AVAILABLE used to be computed at import; it now resolves on first access
+    if name == "MODEL_AVAILABLE":
+        return llm_model() is not None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _ranking_engine(catalog):
+    """RankingEngine for custom weights; None when headless or NumPy is not installed."""
+    if HEADLESS:
+        return None
+    try:
+        from ranking import get_engine
+    except ImportError:
+        return None
+    return get_engine(catalog)
+
+
+def _semantic_ids(catalog, text: str, kwargs: dict):
+    """Product ids similar to `text` that pass the structured filters, or None if unavailable."""
+    if HEADLESS or SEMANTIC_SEARCH == "off" or isinstance(catalog, ShardedCatalog):
+        return None
+    try:
+        from semantic import ranked_ids
+        return ranked_ids(catalog, text, category=kwargs["category"], price_max=kwargs["price_max"],
+                          spice_min=kwargs["spice_min"], dietary=kwargs["dietary"],
+                          vegetarian=kwargs["vegetarian"], exclude_allergens=kwargs["exclude_allergens"],
+                          price_min=kwargs["price_min"])
+    except ImportError:
+        return None
+    except sqlite3.Error as e:
+        print("SEMANTIC ERROR:", e)
+        return None
+
 
 # ---------- Scoring ----------
 ENGAGEMENT_FACTORS = {
@@ -69,215 +143,463 @@ RULES = {
     "appetizer": {"category": "Appetizer"},
 }
 
-def _clean_text(s: str) -> str:
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKC", str(s))
-   
-    s = re.sub(r"[\u200B-\u200D\uFEFF]", "", s)
- 
-    s = "".join(ch for ch in s if ch.isprintable() or ch in "\n\t")
-    return s.strip()
+# Trigger phrases for each scoring factor (matched against the lowercased message)
+ENGAGEMENT_TRIGGERS = {
+    "specific_preferences": ("love", "spicy", "korean", "fusion", "burger", "pizza", "wrap"),
+    "dietary_restrictions": ("vegetarian", "vegan"),
+    "budget_mention": ("under $", "less than"),
+    "mood_indication": ("adventurous",),
+    "question_asking": ("?",),
+    "enthusiasm_words": ("amazing", "perfect", "love"),
+    "price_inquiry": ("how much",),
+    "order_intent": ("i'll take", "i will take", "order", "add to cart"),
+}
+NEGATIVE_TRIGGERS = {
+    "hesitation": ("maybe", "not sure"),
+    "budget_concern": ("too expensive",),
+    "rejection": ("don't like", "not interested"),
+}
+# Asked for one of these but nothing matched -> dietary_conflict penalty
+NO_MATCH_TRIGGERS = ("spicy", "vegetarian", "vegan", "burger", "pizza", "curry", "pasta")
+# ...and the engagement credit each of these earned is taken back
+NO_MATCH_REFUNDS = {
+    "burger": "specific_preferences",
+    "pizza": "specific_preferences",
+    "wrap": "specific_preferences",
+    "curry": "specific_preferences",
+    "pasta": "specific_preferences",
+    "vegetarian": "dietary_restrictions",
+    "vegan": "dietary_restrictions",
+}
 
-def _parse_price(text: str):
-    """Return float price if pattern found, else None. Supports 'under $X' and 'less than X dollars'."""
+# Kept under their old names for existing callers; see normalizer.py
+_clean_text = clean_text
+_parse_price = parse_price
+
+# Allergen words a user may mention -> allergen tags to exclude
+ALLERGEN_ALIASES = {
+    "nut": ("nuts", "tree nuts", "peanuts"),
+    "nuts": ("nuts", "tree nuts", "peanuts"),
+    "tree nuts": ("tree nuts",),
+    "peanut": ("peanuts",),
+    "peanuts": ("peanuts",),
+    "gluten": ("gluten",),
+    "wheat": ("gluten",),
+    "dairy": ("dairy",),
+    "milk": ("dairy",),
+    "lactose": ("dairy",),
+    "soy": ("soy",),
+    "sesame": ("sesame",),
+    "shellfish": ("shellfish",),
+    "coconut": ("coconut",),
+}
+_ALLERGEN_WORDS = "|".join(sorted(map(re.escape, ALLERGEN_ALIASES), key=len, reverse=True))
+_ALLERGEN_RE = re.compile(
+    rf"\b(?:no|without|allergic to)\s+({_ALLERGEN_WORDS})\b|\b({_ALLERGEN_WORDS})\s+allerg(?:y|ies)\b"
+)
+
+def _parse_allergens(text: str):
+    """Allergen tags the user wants excluded ("no nuts", "allergic to dairy", "soy allergy")."""
     if not text:
-        return None
-    t = text.lower()
-    m = re.search(r"under ?\$\s*([0-9]+(?:\.[0-9]+)?)", t)
-    if not m:
-        m = re.search(r"less than\s*([0-9]+(?:\.[0-9]+)?)\s*dollars?", t)
-    if m:
-        try:
-            return float(m.group(1))
-        except Exception:
-            return None
-    return None
+        return ()
+    found = set()
+    for m in _ALLERGEN_RE.finditer(text.lower()):
+        found.update(ALLERGEN_ALIASES[m.group(1) or m.group(2)])
+    return tuple(sorted(found))
+
+# Words in a user message that constrain every later turn of the session
+DIETARY_CONSTRAINTS = frozenset({"vegetarian", "vegan"})
+
+# ---------- Response cache ----------
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = None   # seconds; None keeps entries until evicted or the catalog reloads
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+# ---------- Ranking ----------
+# Relevance weights for ranking.RankingEngine (see ranking.DEFAULT_WEIGHTS),
+# e.g. {"budget_fit": 0.5, "chef_special": 0.2}; None keeps popularity order.
+# A "weights" entry in the filters passed to query_database overrides it.
+RANKING_WEIGHTS = None
+
+# ---------- Message features ----------
+def _build_matcher():
+    """One matcher over every rule key and scoring trigger, plus per-phrase lookups."""
+    signals = {}
+    for table in (ENGAGEMENT_TRIGGERS, NEGATIVE_TRIGGERS):
+        for factor, words in table.items():
+            for w in words:
+                signals.setdefault(w, set()).add(factor)
+    phrases = set(RULES) | set(signals) | set(NO_MATCH_TRIGGERS) | set(NO_MATCH_REFUNDS)
+    # Longer rule keys win; ties go to the one listed first in RULES
+    rule_rank = {key: (-len(key), i) for i, key in enumerate(RULES)}
+    return PhraseMatcher(phrases), {w: frozenset(f) for w, f in signals.items()}, rule_rank
+
+
+_MATCHER, _PHRASE_SIGNALS, _RULE_RANK = _build_matcher()
 
-def calculate_interest_score(message: str, product_match: bool = True) -> int:
-    m = (message or "").lower()
+
+class MessageFeatures:
+    """Everything rule detection and interest scoring need from one message."""
+
+    __slots__ = ("hits", "rule", "signals")
+
+    def __init__(self, hits, rule, signals):
+        self.hits = hits          # every trigger phrase found in the message
+        self.rule = rule          # winning RULES key, or None
+        self.signals = signals    # scoring factors triggered
+
+    @property
+    def filters(self) -> dict:
+        return dict(RULES[self.rule]) if self.rule else {}
+
+    @property
+    def category_like(self) -> bool:
+        return any(RULES[h].get("category") for h in self.hits if h in RULES)
+
+
+def extract_features(message: str) -> MessageFeatures:
+    """Single matcher pass over the lowercased message."""
+    hits = _MATCHER.find((message or "").lower())
+    rules = [h for h in hits if h in RULES]
+    rule = min(rules, key=_RULE_RANK.__getitem__) if rules else None
+    signals = set()
+    for h in hits:
+        factors = _PHRASE_SIGNALS.get(h)
+        if factors:
+            signals |= factors
+    return MessageFeatures(hits, rule, frozenset(signals))
+
+
+def calculate_interest_score(message: str, product_match: bool = True, features: MessageFeatures = None) -> int:
+    if features is None:
+        features = extract_features(message)
     score = 0
 
-    # Positive engagement factors
-    if any(w in m for w in ["love", "spicy", "korean", "fusion", "burger", "pizza", "wrap"]):
-        score += ENGAGEMENT_FACTORS["specific_preferences"]
-    if "vegetarian" in m or "vegan" in m:
-        score += ENGAGEMENT_FACTORS["dietary_restrictions"]
-    if "under $" in m or "less than" in m:
-        score += ENGAGEMENT_FACTORS["budget_mention"]
-    if "adventurous" in m:
-        score += ENGAGEMENT_FACTORS["mood_indication"]
-    if "?" in message:
-        score += ENGAGEMENT_FACTORS["question_asking"]
-    if any(w in m for w in ["amazing", "perfect", "love"]):
-        score += ENGAGEMENT_FACTORS["enthusiasm_words"]
-    if "how much" in m:
-        score += ENGAGEMENT_FACTORS["price_inquiry"]
-    if any(phrase in m for phrase in ["i'll take", "i will take", "order", "add to cart"]):
-        score += ENGAGEMENT_FACTORS["order_intent"]
-
-    # Negative factors
-    if any(w in m for w in ["maybe", "not sure"]):
-        score += NEGATIVE_FACTORS["hesitation"]
-    if "too expensive" in m:
-        score += NEGATIVE_FACTORS["budget_concern"]
-    if not product_match and any(w in m for w in ["spicy", "vegetarian", "vegan", "burger", "pizza", "curry", "pasta"]):
-        # Stronger penalty if user asks for something but no match exists
-        score += NEGATIVE_FACTORS["dietary_conflict"]
-    if "don't like" in m or "not interested" in m:
-        score += NEGATIVE_FACTORS["rejection"]
+    # Positive engagement and negative factors
+    for factor in features.signals:
+        score += ENGAGEMENT_FACTORS.get(factor, 0) + NEGATIVE_FACTORS.get(factor, 0)
 
-    # If no product matches at all, cap score based on positive engagement only
     if not product_match:
+        # Stronger penalty if user asks for something but no match exists
+        if any(w in features.hits for w in NO_MATCH_TRIGGERS):
+            score += NEGATIVE_FACTORS["dietary_conflict"]
         # remove specific_preferences and dietary_restrictions if no match
-        for w in ["burger", "pizza", "wrap", "vegetarian", "vegan", "curry", "pasta"]:
-            if w in m:
-                score -= ENGAGEMENT_FACTORS.get("specific_preferences", 0) if w in ["burger", "pizza", "wrap", "curry", "pasta"] else ENGAGEMENT_FACTORS.get("dietary_restrictions", 0)
+        for w, factor in NO_MATCH_REFUNDS.items():
+            if w in features.hits:
+                score -= ENGAGEMENT_FACTORS.get(factor, 0)
 
     return max(0, min(100, int(round(score))))
+
+def _context_is_vegetarian(context) -> bool:
+    if not context:
+        return False
+    if isinstance(context, SessionContext):
+        return context.vegetarian
+    ctxt = context.lower()
+    return "vegetarian" in ctxt or "vegan" in ctxt
+
 def query_database(filters: dict):
     """
-    Returns list of rows:
+    Returns a ResultSet of product.Product rows, which still index and unpack as
     (product_id, name, category, price, spice_level, description, dietary_tags)
+    Served from the in-memory catalog (see catalog.py) instead of a per-call SQL query.
+    `filters["exclude_allergens"]` drops products carrying any of those allergen tags.
     """
-    conn = sqlite3.connect("foodiebot.db")
-    c = conn.cursor()
+    try:
+        catalog = active_catalog()
+    except Exception as e:
+        print("CATALOG ERROR:", e)
+        return EMPTY
 
-    conditions = []
-    params = []
+    # context enforced vegetarian/vegan
+    vegetarian = _context_is_vegetarian(filters.get("context"))
 
-    # category LIKE
-    if "category" in filters and filters["category"]:
-        conditions.append("LOWER(category) LIKE ?")
-        params.append(f"%{filters['category'].lower()}%")
+    # keyword fallback: FTS5 per-token match ranked by bm25 + popularity,
+    # substring match through the catalog if the FTS index is unavailable
+    keyword = None
+    ranked_ids = None
+    text = None
+    if "keyword" in filters and filters["keyword"]:
+        kw = filters["keyword"].lower().strip()
+        if not extract_features(kw).category_like:
+            text = kw
+            try:
+                ranked_ids = keyword_search(kw)
+            except FTSUnavailable:
+                keyword = kw
+            except sqlite3.Error as e:
+                print("FTS ERROR:", e)
+                keyword = kw
 
-    # price
-    if "price_max" in filters and filters["price_max"] is not None:
-        conditions.append("price <= ?")
-        params.append(filters["price_max"])
+    weights = None if HEADLESS else filters.get("weights", RANKING_WEIGHTS)
+    kwargs = dict(
+        category=filters.get("category") or None,
+        price_max=filters.get("price_max"),
+        spice_min=filters.get("spice_min"),
+        dietary=filters.get("dietary_tags") or None,
+        vegetarian=vegetarian,
+        keyword=keyword,
+        ranked_ids=ranked_ids,
+        limit=20,
+        exclude_allergens=filters.get("exclude_allergens") or None,
+        price_min=filters.get("price_min"),
+    )
+    if text and SEMANTIC_SEARCH == "hybrid":
+        with span("semantic_query"):
+            similar = _semantic_ids(catalog, text, kwargs)
+        if similar:
+            seen = set(ranked_ids or ())
+            kwargs["ranked_ids"] = list(ranked_ids or ()) + [pid for pid in similar if pid not in seen]
+            kwargs["keyword"] = None
+    with span("catalog_query"):
+        results = _catalog_query(catalog, weights, kwargs)
+    if not results and text and SEMANTIC_SEARCH == "fallback":
+        with span("semantic_query"):
+            similar = _semantic_ids(catalog, text, kwargs)
+        if similar:
+            kwargs.update(ranked_ids=similar, keyword=None)
+            with span("catalog_query"):
+                results = _catalog_query(catalog, weights, kwargs)
+    return results
 
-    # spice
-    if "spice_min" in filters and filters["spice_min"] is not None:
-        conditions.append("spice_level >= ?")
-        params.append(filters["spice_min"])
+def _catalog_query(catalog, weights, kwargs):
+    if isinstance(catalog, ShardedCatalog):
+        try:
+            return catalog.query(weights=weights, **kwargs)
+        except ShardError as e:
+            print("SHARD ERROR:", e)
+            return EMPTY
+    engine = _ranking_engine(catalog) if weights else None
+    if engine is not None:
+        return engine.query(weights=weights, **kwargs)
+    return catalog.query(**kwargs)
 
-    # dietary_tags
-    if "dietary_tags" in filters and filters["dietary_tags"]:
-        conditions.append("LOWER(dietary_tags) LIKE ?")
-        params.append(f"%{filters['dietary_tags'].lower()}%")
+def _snippet_cache():
+    try:
+        return active_catalog().snippets
+    except Exception:
+        return None
 
-    # context enforced vegetarian/vegan
-    if "context" in filters and filters["context"]:
-        ctxt = filters["context"].lower()
-        if "vegetarian" in ctxt or "vegan" in ctxt:
-            conditions.append("(LOWER(dietary_tags) LIKE ? OR LOWER(dietary_tags) LIKE ?)")
-            params.extend(["%vegetarian%", "%vegan%"])
+def _render_response(results) -> str:
+    """Summary text grouped by category, joined from per-product snippets cached on the catalog."""
+    return render_response(results, _snippet_cache())
 
-    # keyword fallback 
-    if "keyword" in filters and filters["keyword"]:
-        kw = filters["keyword"].lower().strip()
-        is_cat_like = any(k in kw and RULES[k].get("category") for k in RULES.keys())
-        if not is_cat_like:
-            kw_like = f"%{kw}%"
-            conditions.append("""(
-                LOWER(name) LIKE ? OR
-                LOWER(category) LIKE ? OR
-                LOWER(description) LIKE ? OR
-                LOWER(dietary_tags) LIKE ? OR
-                LOWER(mood_tags) LIKE ?
-            )""")
-            params += [kw_like] * 5
-
-    sql = """
-        SELECT product_id, name, category, price, spice_level, description, dietary_tags
-        FROM products
-    """
-    if conditions:
-        sql += " WHERE " + " AND ".join(conditions)
-    sql += " ORDER BY popularity_score DESC LIMIT 20"
+def _cache_key(user_message: str, filters: dict, vegetarian: bool):
+    normalized = " ".join(user_message.lower().split())
+    derived = tuple(sorted((k, v) for k, v in filters.items() if k not in ("context", "keyword")))
+    return normalized, derived, vegetarian
 
-    try:
-        rows = c.execute(sql, params).fetchall()
-    except Exception as e:
-        print("SQL ERROR:", e, sql, params)
-        rows = []
-    conn.close()
-
-    cleaned = []
-    for r in rows:
-        cleaned.append((
-            _clean_text(r[0]),
-            _clean_text(r[1]),
-            _clean_text(r[2]),
-            float(r[3]) if r[3] is not None else 0.0,
-            int(r[4]) if r[4] is not None else 0,
-            _clean_text(r[5]),
-            _clean_text(r[6]),
-        ))
-    return cleaned
-
-def generate_response(user_message: str, context: str = ""):
+def generate_response(user_message: str, context=""):
     """
     Returns: (bot_text, interest_int, results_list)
-    results_list is the same rows returned from query_database
+    results_list is the ResultSet returned from query_database (read-only,
+    shared with the response cache)
+
+    `context` is either a SessionContext, which is updated with this turn,
+    or a plain transcript string (searched for "vegetarian"/"vegan").
+    """
+    with request("generate_response"):
+        return _generate_response(user_message, context)
+
+def generate_response_stream(user_message: str, context=""):
+    """
+    Like generate_response, but returns (chunks, interest_int, results_list)
+    where `chunks` yields the response text incrementally (header, then one
+    chunk per category), so a UI can start rendering before the list is
+    built. The turn is cached and recorded in a SessionContext once the
+    chunks have been consumed.
     """
-    user_message = _clean_text(user_message)
-    filters = {"context": context}
+    with request("generate_response"):
+        return _generate_response(user_message, context, stream=True)
 
-    # try rule-based detection (longer keys first)
-    for key in sorted(RULES.keys(), key=lambda x: -len(x)):
-        if key in user_message:
-            filters.update(RULES[key])
-            break
+def _stream(chunks, on_done):
+    parts = []
+    complete = False
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        complete = True
+    finally:
+        on_done("".join(parts), complete)
 
-    price_val = _parse_price(user_message)
-    if price_val is not None:
-        filters["price_max"] = price_val
+def _derive(user_message: str, context):
+    """Clean the message and derive its filters: (message, features, filters, allergens)."""
+    with span("clean_text"):
+        user_message = clean_text(user_message)
 
-    filters["keyword"] = user_message
+    with span("rule_matching"):
+        features = extract_features(user_message)
+        filters = {"context": context}
 
-    results = query_database(filters)
-    product_match = bool(results)
+        # rule-based detection (longest matching key wins)
+        filters.update(features.filters)
 
-    interest = calculate_interest_score(user_message, product_match)
+        price_min, price_val = parse_price_range(user_message)
+        if price_min is not None:
+            filters["price_min"] = price_min
+        if price_val is not None:
+            filters["price_max"] = price_val
 
-    # Build a clean summary text 
-    if not results:
-        bot_text = 'No matching products found in our database. What else can I help with?'
-    else:
-        # group by category 
-        by_cat = {}
-        for row in results:
-            pid, name, category, price, spice, desc, tags = row
-            by_cat.setdefault(category or "Other", []).append(row)
-
-        lines = ["Here are the results from our database:"]
-        for cat in sorted(by_cat.keys()):
-            lines.append(f"\n{cat}:")
-            for r in by_cat[cat]:
-                _, name, _, price, spice, desc, tags = r
-                short_desc = (desc[:140] + "...") if desc and len(desc) > 140 else desc
-                tag_text = f" (Tags: {tags})" if tags else ""
-                lines.append(f"- {name} — ${price:.2f}, Spice {spice}/10{tag_text}")
-                if short_desc:
-                    lines.append(f"  {short_desc}")
-        bot_text = "\n".join(lines)
-
-    return bot_text, interest, results
-
-def log_conversation(user_message: str, response: str, interest: int):
-    conn = sqlite3.connect("foodiebot.db")
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_message TEXT,
-            bot_response TEXT,
-            interest_score INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        allergens = _parse_allergens(user_message)
+        if isinstance(context, SessionContext) and context.allergens:
+            allergens = tuple(sorted(context.allergens.union(allergens)))
+        if allergens:
+            filters["exclude_allergens"] = allergens
+
+    # category-like messages skip the keyword fallback
+    if not features.category_like:
+        filters["keyword"] = user_message
+    return user_message, features, filters, allergens
+
+def _record(context, user_message, text, results, features, allergens):
+    if isinstance(context, SessionContext):
+        context.record_turn(
+            user_message, text, results,
+            dietary=DIETARY_CONSTRAINTS & features.hits,
+            allergens=allergens,
         )
-    """)
-    c.execute("INSERT INTO conversations (user_message, bot_response, interest_score) VALUES (?, ?, ?)",
-              (user_message, response, int(interest)))
-    conn.commit()
-    conn.close()  
+
+def _generate_response(user_message: str, context, stream: bool = False):
+    user_message, features, filters, allergens = _derive(user_message, context)
+
+    # (bot_text, results) only depend on the message, filters and the dietary
+    # constraint from context; entries are dropped when the catalog reloads
+    try:
+        RESPONSE_CACHE.set_generation(active_catalog().generation)
+    except Exception:
+        pass
+    key = _cache_key(user_message, filters, _context_is_vegetarian(context))
+    cached = RESPONSE_CACHE.get(key)
+    if cached is None:
+        with span("query_database"):
+            results = query_database(filters)
+        if not stream:
+            with span("render"):
+                bot_text = _render_response(results)
+            RESPONSE_CACHE.put(key, (bot_text, results))
+    else:
+        bot_text, results = cached
+
+    with span("interest_scoring"):
+        interest = calculate_interest_score(user_message, bool(results), features)
+
+    def record(text):
+        _record(context, user_message, text, results, features, allergens)
+
+    if not stream:
+        record(bot_text)
+        return bot_text, interest, results
+
+    if cached is not None:
+        chunks = (bot_text,)
+    else:
+        chunks = iter_response(results, _snippet_cache())
+
+    def done(text, complete):
+        if complete and cached is None:
+            RESPONSE_CACHE.put(key, (text, results))
+        record(text)
+
+    return _stream(chunks, done), interest, results
+
+# ---------- Batch ----------
+def generate_response_many(messages, contexts=None, stats: dict = None):
+    """
+    generate_response for many messages at once - log replay, bulk
+    evaluation, cache warming. Returns [(bot_text, interest_int, results_list)]
+    in input order, the same as calling generate_response on each in turn.
+
+    Identical normalized queries are answered once, messages that derive the
+    same filters and keyword share one query_database call and render, and
+    interest is scored once per distinct feature set. A SessionContext that
+    appears several times is advanced turn by turn: its k-th message is
+    answered in the k-th pass, after the earlier ones were recorded.
+    `stats`, if given, is filled with messages/unique/queries/cache_hits counts.
+    """
+    messages = list(messages)
+    if contexts is None:
+        contexts = [""] * len(messages)
+    else:
+        contexts = list(contexts)
+        if len(contexts) != len(messages):
+            raise ValueError("messages and contexts must have the same length")
+
+    passes = []
+    turn = {}
+    for i, context in enumerate(contexts):
+        k = 0
+        if isinstance(context, SessionContext):
+            k = turn.get(id(context), 0)
+            turn[id(context)] = k + 1
+        if k == len(passes):
+            passes.append([])
+        passes[k].append(i)
+
+    counts = {"messages": len(messages), "unique": 0, "queries": 0, "cache_hits": 0}
+    out = [None] * len(messages)
+    with request("generate_response_many"):
+        try:
+            RESPONSE_CACHE.set_generation(active_catalog().generation)
+        except Exception:
+            pass
+        for indexes in passes:
+            _respond_pass(messages, contexts, indexes, out, counts)
+    if stats is not None:
+        stats.update(counts)
+    return out
+
+def _respond_pass(messages, contexts, indexes, out, counts):
+    answers = {}    # response cache key -> (bot_text, results)
+    queries = {}    # (derived filters, vegetarian, keyword) -> (bot_text, results)
+    scores = {}     # (signals, product_match, hits if no match) -> interest
+    for i in indexes:
+        context = contexts[i]
+        user_message, features, filters, allergens = _derive(messages[i], context)
+        vegetarian = _context_is_vegetarian(context)
+        key = _cache_key(user_message, filters, vegetarian)
+        answer = answers.get(key)
+        if answer is None:
+            counts["unique"] += 1
+            answer = RESPONSE_CACHE.get(key)
+            if answer is None:
+                keyword = filters.get("keyword")
+                qkey = (key[1], vegetarian, keyword.lower().strip() if keyword else None)
+                answer = queries.get(qkey)
+                if answer is None:
+                    counts["queries"] += 1
+                    with span("query_database"):
+                        results = query_database(filters)
+                    with span("render"):
+                        answer = queries[qkey] = (_render_response(results), results)
+                RESPONSE_CACHE.put(key, answer)
+            else:
+                counts["cache_hits"] += 1
+            answers[key] = answer
+        bot_text, results = answer
+
+        # The score only reads the triggered factors, and the trigger words when nothing matched
+        skey = (features.signals, bool(results), None if results else frozenset(features.hits))
+        interest = scores.get(skey)
+        if interest is None:
+            interest = scores[skey] = calculate_interest_score(user_message, bool(results), features)
+        _record(context, user_message, bot_text, results, features, allergens)
+        out[i] = (bot_text, interest, results)
+
+def message_filters(user_message: str) -> dict:
+    """Filters parsed from the message alone (no session context), as compact logs store them."""
+    _, _, filters, _ = _derive(user_message, "")
+    return {k: v for k, v in filters.items() if k not in ("context", "keyword")}
+
+def log_conversation(user_message: str, response: str, interest: int, results=None) -> bool:
+    """
+    Queue the turn for the background writer (see log_writer.py); returns
+    False if the queue stayed full and the record was dropped. With
+    FOODIEBOT_LOG_STORAGE=compact, pass the turn's `results` so the product
+    IDs and message filters are logged instead of the rendered response.
+    """
+    with span("log_conversation"):
+        writer = get_log_writer()
+        if writer.storage == "compact" and results is not None:
+            return writer.submit(user_message, response, interest, results, message_filters(user_message))
+        return writer.submit(user_message, response, interest)
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from db import DB_PATH, get_connection
+from log_writer import ensure_conversations
+from rendering import NO_RESULTS, render_response
+
+PAGE_SIZE = 100
+# Turns older than this many days are rolled into conversations_daily and deleted.
+RETAIN_DAYS = int(os.environ.get("FOODIEBOT_LOG_RETAIN_DAYS", "30") or 30)
+ROLLUP_BATCH = 10000      # rows per rollup transaction
+
+TURN_COLUMNS = "id, user_message, bot_response, interest_score, timestamp, product_ids, filters"
+
+ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversations_daily (
+        day TEXT PRIMARY KEY,
+        turns INTEGER NOT NULL,
+        interest_total INTEGER NOT NULL,
+        nonzero_turns INTEGER NOT NULL,
+        nonzero_total INTEGER NOT NULL,
+        max_interest INTEGER NOT NULL,
+        no_result_turns INTEGER NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL
+    )
+"""
+
+# One day's aggregates over conversations rows, in conversations_daily column order
+_AGGREGATES = f"""
+    date(timestamp), COUNT(*), COALESCE(SUM(interest_score), 0),
+    SUM(interest_score > 0), SUM(CASE WHEN interest_score > 0 THEN interest_score ELSE 0 END),
+    COALESCE(MAX(interest_score), 0),
+    SUM(COALESCE(product_ids = '', bot_response = '{NO_RESULTS.replace("'", "''")}', 0)),
+    MIN(id), MAX(id)
+"""
+
+_ROLLUP_UPSERT = f"""
+    INSERT INTO conversations_daily
+        SELECT {_AGGREGATES} FROM conversations WHERE {{where}} GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET
+        turns = turns + excluded.turns,
+        interest_total = interest_total + excluded.interest_total,
+        nonzero_turns = nonzero_turns + excluded.nonzero_turns,
+        nonzero_total = nonzero_total + excluded.nonzero_total,
+        max_interest = MAX(max_interest, excluded.max_interest),
+        no_result_turns = no_result_turns + excluded.no_result_turns,
+        first_id = MIN(first_id, excluded.first_id),
+        last_id = MAX(last_id, excluded.last_id)
+"""
+
+_ready = set()
+
+
+def _conn(db_path: str):
+    conn = get_connection(db_path)
+    if db_path not in _ready:
+        ensure_conversations(conn)
+        conn.execute(ROLLUP_SCHEMA)
+        conn.commit()
+        _ready.add(db_path)
+    return conn
+
+
+# ---------- Readers (keyset pagination) ----------
+def page(limit: int = PAGE_SIZE, after=None, since: str = None, until: str = None,
+         newest_first: bool = False, db_path: str = DB_PATH):
+    """
+    One page of turns (TURN_COLUMNS rows) in (timestamp, id) order, and the
+    cursor for the next page (None after the last). `after` is a cursor from
+    the previous call; `since`/`until` bound the timestamp ("YYYY-MM-DD" or
+    "YYYY-MM-DD HH:MM:SS", until exclusive). Every page is a range scan of
+    idx_conversations_timestamp, so the 10,000th page costs what the first does.
+    """
+    where, params = [], []
+    if since:
+        where.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("timestamp < ?")
+        params.append(until)
+    if after is not None:
+        where.append(f"(timestamp, id) {'<' if newest_first else '>'} (?, ?)")
+        params.extend(after)
+    direction = "DESC" if newest_first else "ASC"
+    sql = (f"SELECT {TURN_COLUMNS} FROM conversations "
+           f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+           f"ORDER BY timestamp {direction}, id {direction} LIMIT ?")
+    rows = _conn(db_path).execute(sql, (*params, limit)).fetchall()
+    cursor = (rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+    return rows, cursor
+
+
+def iter_turns(since: str = None, until: str = None, page_size: int = 1000, db_path: str = DB_PATH):
+    """Every turn in a timestamp range, oldest first, one page in memory at a time."""
+    cursor = None
+    while True:
+        rows, cursor = page(page_size, cursor, since, until, db_path=db_path)
+        yield from rows
+        if cursor is None:
+            return
+
+
+def render_turn(row, db_path: str = DB_PATH) -> str:
+    """
+    The bot response of a TURN_COLUMNS row: as logged in full storage, or
+    rebuilt from its product IDs in compact storage - rendered from the
+    current catalog, so products since removed are left out.
+    """
+    if row[2] is not None or row[5] is None:
+        return row[2] or ""
+    from catalog import get_catalog
+
+    catalog = get_catalog(db_path)
+    rows = []
+    for pid in filter(None, row[5].split(",")):
+        i = catalog.position.get(pid)
+        if i is not None:
+            rows.append(catalog.rows[i])
+    return render_response(rows, catalog.snippets)
+
+
+def daily(since: str = None, until: str = None, db_path: str = DB_PATH):
+    """
+    [(day, turns, average_interest, no_result_turns)] per day, combining
+    rolled-up days with the retained turns, oldest first.
+    """
+    conn = _conn(db_path)
+    rolled_where, live_where, params = ["1"], ["timestamp IS NOT NULL"], []
+    if since:
+        rolled_where.append("day >= date(?)")
+        live_where.append("timestamp >= date(?)")
+        params.append(since)
+    if until:
+        rolled_where.append("day < date(?)")
+        live_where.append("timestamp < date(?)")
+        params.append(until)
+    days = {}
+    for day, turns, total, no_results in conn.execute(
+        f"SELECT day, turns, interest_total, no_result_turns FROM conversations_daily "
+        f"WHERE {' AND '.join(rolled_where)}", params
+    ):
+        days[day] = [turns, total, no_results]
+    for day, turns, total, _, _, _, no_results, _, _ in conn.execute(
+        f"SELECT {_AGGREGATES} FROM conversations WHERE {' AND '.join(live_where)} GROUP BY 1", params
+    ):
+        acc = days.setdefault(day, [0, 0, 0])
+        acc[0] += turns
+        acc[1] += total
+        acc[2] += no_results
+    return [(day, turns, total / turns if turns else 0.0, no_results)
+            for day, (turns, total, no_results) in sorted(days.items())]
+
+
+# ---------- Retention ----------
+def rollup(retain_days: int = RETAIN_DAYS, now: datetime = None, batch: int = ROLLUP_BATCH,
+           vacuum: bool = False, db_path: str = DB_PATH) -> dict:
+    """
+    Fold turns from before the last `retain_days` whole days into
+    conversations_daily and delete them, `batch` rows per transaction, so
+    the job can be stopped and rerun at any point without double counting.
+    The dashboard aggregates (analytics.py) are running totals and keep
+    counting the deleted turns.
+    """
+    conn = _conn(db_path)
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=retain_days)).strftime("%Y-%m-%d")
+    rolled = batches = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last = conn.execute(
+                "SELECT timestamp, id FROM conversations WHERE timestamp < ? "
+                "ORDER BY timestamp, id LIMIT 1 OFFSET ?", (cutoff, batch - 1)
+            ).fetchone()
+            if last is None:
+                where, params = "timestamp < ?", (cutoff,)
+            else:
+                # The plain bound lets SQLite stop the index scan at the batch's end
+                where, params = "timestamp <= ? AND (timestamp, id) <= (?, ?)", (last[0], *last)
+            conn.execute(_ROLLUP_UPSERT.format(where=where), params)
+            deleted = conn.execute(f"DELETE FROM conversations WHERE {where}", params).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        rolled += deleted
+        batches += 1
+        if last is None or not deleted:
+            break
+    if vacuum and rolled:
+        conn.execute("VACUUM")
+    return {"rolled_up": rolled, "batches": batches, "cutoff": cutoff}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Conversation log: pages, daily rollups and retention")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rollup = sub.add_parser("rollup", help="roll old turns into daily aggregates and delete them")
+    p_rollup.add_argument("--days", type=int, default=RETAIN_DAYS, help="whole days of turns to keep")
+    p_rollup.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    p_daily = sub.add_parser("daily", help="turns and average interest per day")
+    p_page = sub.add_parser("tail", help="most recent turns")
+    p_page.add_argument("--limit", type=int, default=20)
+    for p in (p_daily, p_page):
+        p.add_argument("--since")
+        p.add_argument("--until")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "rollup":
+            r = rollup(args.days, vacuum=args.vacuum)
+            print(f"✅ Rolled {r['rolled_up']:,} turns before {r['cutoff']} into conversations_daily "
+                  f"({r['batches']} batches).")
+        elif args.command == "daily":
+            for day, turns, average, no_results in daily(args.since, args.until):
+                print(f"{day}  {turns:>8,} turns  avg interest {average:5.1f}%  {no_results:>7,} without results")
+        else:
+            rows, _ = page(args.limit, since=args.since, until=args.until, newest_first=True)
+            for row in rows:
+                print(f"[{row[4]}] #{row[0]} ({row[3]}%) {row[1]}")
+    except sqlite3.Error as e:
+        print("CONVERSATIONS ERROR:", e)
@@ -0,0 +1,91 @@
+import atexit
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.environ.get("FOODIEBOT_DB", "foodiebot.db")
+# The committed product dataset setup_db.py loads and the stub/benchmark generators resample.
+PRODUCTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "products.json")
+
+# Applied to every connection handed out by get_connection().
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers no longer block on log_conversation writes
+    "PRAGMA synchronous=NORMAL",      # safe with WAL, one fsync per checkpoint instead of per commit
+    "PRAGMA mmap_size=268435456",     # 256MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+BUSY_TIMEOUT = 5.0          # seconds to wait on a locked database
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+
+_local = threading.local()
+_registry = {}              # id(conn) -> (thread, conn), for cleanup
+_registry_lock = threading.Lock()
+_generation = 0             # bumped by close_all() so threads drop stale handles
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # check_same_thread=False only so close_all() can close connections from
+    # the exiting thread; each connection is otherwise used by its owner only.
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _prune_dead_threads():
+    """Close connections whose owning thread has exited (Streamlit reruns use fresh threads)."""
+    with _registry_lock:
+        dead = [key for key, (t, _) in _registry.items() if not t.is_alive()]
+        conns = [_registry.pop(key)[1] for key in dead]
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def get_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Long-lived connection for the calling thread (one per thread per database)."""
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.generation != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+    conn = conns.get(db_path)
+    if conn is None:
+        _prune_dead_threads()
+        conn = conns[db_path] = _connect(db_path)
+        with _registry_lock:
+            _registry[id(conn)] = (threading.current_thread(), conn)
+    return conn
+
+
+def close_connection(db_path: str = DB_PATH):
+    """Close the calling thread's connection to db_path, if any."""
+    conns = getattr(_local, "conns", None)
+    conn = conns.pop(db_path, None) if conns else None
+    if conn is not None:
+        with _registry_lock:
+            _registry.pop(id(conn), None)
+        conn.close()
+
+
+def close_all():
+    """Close every connection handed out so far; runs automatically at exit."""
+    global _generation
+    with _registry_lock:
+        conns = [conn for _, conn in _registry.values()]
+        _registry.clear()
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+atexit.register(close_all)
@@ -0,0 +1,162 @@
+import itertools
+import math
+import re
+import sqlite3
+
+from db import DB_PATH, get_connection
+from tracing import execute as traced_execute
+
+# Columns indexed for the keyword fallback, with their bm25 weights.
+FTS_COLUMNS = ("name", "category", "description", "dietary_tags", "mood_tags")
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 3.0, 2.0)
+
+# How much popularity_score (0-100) counts against bm25 when ranking matches.
+POPULARITY_WEIGHT = 2.0
+
+# Upper bound on ranked matches handed to the catalog for the remaining filters.
+MAX_CANDIDATES = 1000
+
+# Share of a message's tokens a product must match. A bare OR let one generic
+# word ("spicy", "vegetarian") match most of the catalog; with 0.75, messages of
+# up to three tokens need all of them and longer ones may miss one in four.
+MIN_COVERAGE = 0.75
+MAX_TOKENS = 8            # tokens searched per message, bounds the size of the expression
+
+STOPWORDS = {
+    "a", "an", "and", "any", "anything", "are", "can", "do", "dollars", "dollar",
+    "for", "food", "get", "give", "have", "i", "i'd", "i'll", "i'm", "in", "is",
+    "it", "less", "like", "me", "my", "of", "on", "or", "please", "show", "some",
+    "something", "than", "that", "the", "to", "under", "want", "what", "what's",
+    "with", "you", "your",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+_COLS = ", ".join(FTS_COLUMNS)
+_NEW_COLS = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+_OLD_COLS = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        {_COLS},
+        content='products', content_rowid='rowid',
+        tokenize='porter unicode61'
+    )""",
+    # Triggers keep the external-content index in sync with products.
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, {_COLS}) VALUES (new.rowid, {_NEW_COLS});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, {_COLS}) VALUES ('delete', old.rowid, {_OLD_COLS});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, {_COLS}) VALUES ('delete', old.rowid, {_OLD_COLS});
+        INSERT INTO products_fts(rowid, {_COLS}) VALUES (new.rowid, {_NEW_COLS});
+    END""",
+]
+
+_SEARCH_SQL = f"""
+    SELECT p.product_id
+    FROM products_fts f
+    JOIN products p ON p.rowid = f.rowid
+    WHERE products_fts MATCH ?
+    ORDER BY bm25(products_fts, {", ".join(map(str, BM25_WEIGHTS))}) - ? * p.popularity_score / 100.0
+    LIMIT ?
+"""
+
+
+def create_fts(conn):
+    """Create products_fts and its sync triggers (no-op if they already exist)."""
+    for stmt in FTS_SCHEMA:
+        conn.execute(stmt)
+
+
+def rebuild_fts(conn):
+    """Re-index every row of products from scratch."""
+    conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+FTS_TRIGGERS = ("products_fts_ai", "products_fts_ad", "products_fts_au")
+FTS_OBJECTS = ("products_fts",) + FTS_TRIGGERS
+
+
+def has_fts(conn) -> bool:
+    """Whether products_fts and all three of its sync triggers exist (read-only)."""
+    found = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join('?' * len(FTS_OBJECTS))})",
+        FTS_OBJECTS,
+    ).fetchone()[0]
+    return found == len(FTS_OBJECTS)
+
+
+def ensure_fts(conn) -> bool:
+    """
+    Migrate an existing foodiebot.db: create and populate products_fts if it
+    or any of its triggers is missing (an interrupted bulk load in setup_db.py
+    leaves the triggers dropped, and the index stale). Returns True if the
+    index had to be built.
+    """
+    if has_fts(conn):
+        return False
+    create_fts(conn)
+    rebuild_fts(conn)
+    conn.commit()
+    return True
+
+
+def tokenize(text: str):
+    """Search tokens from a chat message: lowercase words minus stopwords and bare numbers."""
+    seen = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        tok = tok.strip("'")
+        if len(tok) < 2 or tok in STOPWORDS or tok.isdigit() or tok in seen:
+            continue
+        seen.append(tok)
+    return seen
+
+
+def match_expression(tokens, min_coverage: float = MIN_COVERAGE) -> str:
+    """
+    Products matching at least `min_coverage` of the tokens: a plain AND, or
+    an OR of AND groups when some tokens may be missing. bm25 still ranks
+    products that match more of them first.
+    """
+    quoted = ['"' + t.replace('"', '""') + '"' for t in tokens[:MAX_TOKENS]]
+    need = max(1, math.ceil(len(quoted) * min_coverage))
+    if need >= len(quoted):
+        return " AND ".join(quoted)
+    return " OR ".join("(" + " AND ".join(group) + ")" for group in itertools.combinations(quoted, need))
+
+
+class FTSUnavailable(sqlite3.OperationalError):
+    """products_fts is missing or incomplete; setup_db.py or `python fts.py` builds it."""
+
+
+_available = set()   # db_paths whose products_fts has been seen complete
+
+
+def keyword_search(text: str, limit: int = MAX_CANDIDATES, db_path: str = DB_PATH):
+    """
+    Return product_ids matching at least MIN_COVERAGE of the tokens of `text`,
+    best first (bm25 blended with popularity_score), or None if the message
+    has no searchable tokens. Requests never build the index: FTSUnavailable
+    is raised instead, and callers fall back to a substring match.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    conn = get_connection(db_path)
+    if db_path not in _available:
+        if not has_fts(conn):
+            raise FTSUnavailable("products_fts is missing; run setup_db.py or python fts.py")
+        _available.add(db_path)
+    rows = traced_execute(conn, _SEARCH_SQL, (match_expression(tokens), POPULARITY_WEIGHT, limit), "sql.fts_search")
+    return [r[0] for r in rows]
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    built = ensure_fts(conn)
+    count = conn.execute("SELECT COUNT(*) FROM products_fts").fetchone()[0]
+    conn.close()
+    print(f"✅ products_fts {'built' if built else 'already present'} ({count} rows indexed).")
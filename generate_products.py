@@ -1,12 +1,16 @@
-import os
+import argparse
 import json
-from dotenv import load_dotenv
-import google.generativeai as genai
-from pydantic import BaseModel, Field
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import List
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from pydantic import BaseModel, Field, ValidationError
+
+from db import PRODUCTS_PATH
 
 # Define the Pydantic model for validation (not for schema generation)
 class Product(BaseModel):
@@ -44,18 +48,20 @@ categories = [
     "Limited Time Specials"
 ]
 
-all_products = []
-start_id = 1
-model = genai.GenerativeModel('gemini-1.5-flash')  # Fast, free model
+# ---------- Config ----------
+DEFAULT_OUT = "products.ndjson"
+DEFAULT_PER_CATEGORY = 10
+BATCH_SIZE = 10           # products per model request
+WORKERS = 8               # concurrent requests
+REQUESTS_PER_MINUTE = 60  # shared across workers; 0 = unlimited
+RETRIES = 3               # extra attempts per batch before it is marked failed
+RETRY_BACKOFF = 2.0       # seconds, doubled per attempt
+AVOID_NAMES = 30          # names already generated for the category, listed in the prompt
 
-for category in categories:
-    print(f"Generating for {category}...")
-    
-    # Detailed prompt with explicit JSON structure
-    prompt = f"""
-    Generate exactly 10 unique, realistic fast food products in this category: {category}.
+PROMPT = """
+    Generate exactly {count} unique, realistic fast food products in this category: {category}.
     Ensure variety (e.g., classic, fusion, healthy options where applicable).
-    Use sequential product_ids starting from FF{start_id:03d}.
+    Use sequential product_ids starting from {first_id}.
     Output ONLY a valid JSON object with this structure:
     {{
         "products": [
@@ -77,40 +83,424 @@ for category in categories:
                 "spice_level": 5,
                 "image_prompt": "A colorful photo of the product"
             }}
-            // Repeat the above object 9 more times with unique data
+            // Repeat the above object {more} more times with unique data
         ]
     }}
     Make descriptions creative and detailed. Prices between $5-15, calories 200-900, spice_level 0-10.
     Dietary/mood/allergens tags should be relevant (e.g., ['spicy', 'vegetarian']).
-    Do not include any text outside the JSON object.
+    {avoid}Do not include any text outside the JSON object.
+    """
+
+
+# ---------- Backends ----------
+# A backend is any object with generate(prompt, category, count) -> str (the
+# model's raw text). Requests run on worker threads, so it must be thread-safe.
+class GeminiBackend:
+    """google.generativeai, configured from GEMINI_API_KEY (.env supported)."""
+
+    def __init__(self, model_name: str = "gemini-1.5-flash"):
+        from dotenv import load_dotenv
+        import google.generativeai as genai
+
+        load_dotenv()
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.model = genai.GenerativeModel(model_name)  # Fast, free model
+
+    def generate(self, prompt: str, category: str, count: int) -> str:
+        response = self.model.generate_content(
+            prompt,
+            generation_config={
+                "response_mime_type": "application/json",  # Enforces JSON output
+                "temperature": 0.7,
+                "max_output_tokens": 4096
+            }
+        )
+        return response.text or ""
+
+
+class StubBackend:
+    """
+    Offline backend: products resampled from products.json (like
+    benchmark.synthetic_products), with optional latency and injected bad
+    output - truncated JSON or out-of-range fields - to exercise retries.
+    """
+
+    def __init__(self, seed: int = 0, failure_rate: float = 0.0, latency: float = 0.0,
+                 template_path: str = None):
+        with open(template_path or PRODUCTS_PATH, "r", encoding="utf-8") as f:
+            self.templates = json.load(f)["products"]
+        self.seed = seed
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, category: str, count: int) -> str:
+        with self._lock:
+            self._calls += 1
+            rng = random.Random(f"{self.seed}:{category}:{self._calls}")
+        if self.latency:
+            time.sleep(rng.uniform(0.5, 1.5) * self.latency)
+        name = category.split(" (")[0]
+        products = []
+        for i in range(count):
+            p = dict(rng.choice(self.templates))
+            p["product_id"] = f"FF{i:03d}"
+            p["category"] = name
+            p["name"] = f"{name.split()[0]} {p['name']} {rng.randint(1, 10 ** 6)}"
+            p["price"] = round(rng.uniform(5, 15), 2)
+            p["popularity_score"] = rng.randint(0, 100)
+            products.append(p)
+        if rng.random() < self.failure_rate:
+            if rng.random() < 0.5:
+                return json.dumps({"products": products})[: rng.randint(10, 200)]
+            products[rng.randrange(count)]["spice_level"] = 42
+        return json.dumps({"products": products})
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+def make_backend(spec: str, **kwargs):
+    """'gemini', 'stub', or 'package.module:Class' for a custom backend."""
+    if ":" in spec:
+        module, _, name = spec.partition(":")
+        cls = getattr(__import__(module, fromlist=[name]), name)
+    else:
+        cls = BACKENDS[spec]
+    return cls(**kwargs)
+
+
+# ---------- Rate limiting ----------
+class RateLimiter:
+    """Token bucket shared by the worker threads: `per_minute` requests, bursts up to `burst`."""
+
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+
+# ---------- Batches ----------
+class Batch:
+    """One model request: `count` products of `category` with ids first_id..first_id+count-1."""
+
+    __slots__ = ("index", "category", "first", "count", "width")
+
+    def __init__(self, index, category, first, count, width):
+        self.index, self.category, self.first, self.count, self.width = index, category, first, count, width
+
+    def product_id(self, k: int) -> str:
+        return f"FF{self.first + k:0{self.width}d}"
+
+    def prompt(self, names=()) -> str:
+        names = sorted(names)[:AVOID_NAMES]
+        avoid = f"Do not reuse these names: {', '.join(names)}.\n    " if names else ""
+        return PROMPT.format(count=self.count, category=self.category, first_id=self.product_id(0),
+                             more=self.count - 1, avoid=avoid)
+
+
+def plan_batches(per_category: int, batch_size: int = BATCH_SIZE, cats=None):
+    """Every batch of the run, in a fixed order, so ids are the same on every resume."""
+    cats = cats or categories
+    total = per_category * len(cats)
+    width = max(3, len(str(total)))
+    batches, first = [], 1
+    for category in cats:
+        for start in range(0, per_category, batch_size):
+            count = min(batch_size, per_category - start)
+            batches.append(Batch(len(batches), category, first, count, width))
+            first += count
+    return batches
+
+
+def _dump(product: Product) -> dict:
+    return product.model_dump() if hasattr(product, "model_dump") else product.dict()
+
+
+def parse_batch(text: str, batch: Batch):
+    """
+    Validated products from a model response, with the batch's product ids
+    assigned in order. Invalid products are dropped individually; raises
+    ValueError if the response is not JSON or nothing in it validates.
+    """
+    if not text:
+        raise ValueError("empty response")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON parsing error: {e}") from None
+    items = data.get("products") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('no "products" array')
+    products, errors = [], []
+    for item in items[:batch.count]:
+        if not isinstance(item, dict):
+            errors.append("not an object")
+            continue
+        try:
+            products.append(Product(**{**item, "product_id": batch.product_id(len(products))}))
+        except (ValidationError, TypeError) as e:
+            errors.append(str(e).splitlines()[0])
+    if not products:
+        raise ValueError(f"no valid products ({'; '.join(errors[:3]) or 'empty list'})")
+    return products, errors
+
+
+# ---------- Checkpoint ----------
+class Checkpoint:
+    """
+    `<out>.checkpoint.json`: the run's parameters, finished batches (index ->
+    products written) and failed ones (index -> last error). Replaced
+    atomically after every batch, and only after that batch's lines are
+    flushed to the NDJSON file.
+    """
+
+    def __init__(self, path: str, params: dict):
+        self.path = path
+        self.params = params
+        self.done = {}
+        self.failed = {}
+
+    @classmethod
+    def load(cls, path: str, params: dict):
+        cp = cls(path, params)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("params") != params:
+                raise ValueError(f"{path} was written for different settings {data.get('params')}; "
+                                 f"pass the same --per-category/--batch-size or start over without --resume")
+            cp.done = {int(k): v for k, v in data.get("done", {}).items()}
+            cp.failed = {int(k): v for k, v in data.get("failed", {}).items()}
+        return cp
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"params": self.params, "done": self.done, "failed": self.failed}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def _batch_of(product_id: str, batches):
+    """Batch index owning a product id (ids are contiguous per batch)."""
+    try:
+        n = int(product_id[2:])
+    except (TypeError, ValueError):
+        return None
+    lo, hi = 0, len(batches) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        b = batches[mid]
+        if n < b.first:
+            hi = mid - 1
+        elif n >= b.first + b.count:
+            lo = mid + 1
+        else:
+            return mid
+    return None
+
+
+def _recover(out_path: str, checkpoint: Checkpoint, batches):
+    """
+    Make the NDJSON file agree with the checkpoint after an interrupted run:
+    drop a torn last line and any products of batches not marked done.
+    Returns the product names already written (to steer the model away from repeats).
     """
-    
-    # Generate content
-    response = model.generate_content(
-        prompt,
-        generation_config={
-            "response_mime_type": "application/json",  # Enforces JSON output
-            "temperature": 0.7,
-            "max_output_tokens": 4096
-        }
-    )
-    
-    if response.text:
+    names = {}
+    if not os.path.exists(out_path):
+        return names
+    kept, dropped = [], 0
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                p = json.loads(line)
+            except json.JSONDecodeError:
+                dropped += 1
+                continue
+            b = _batch_of(p.get("product_id"), batches)
+            if b is None or b not in checkpoint.done or not line.endswith("\n"):
+                dropped += 1
+                continue
+            kept.append(line)
+            names.setdefault(batches[b].category, set()).add(p.get("name"))
+    if dropped:
+        tmp = out_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        os.replace(tmp, out_path)
+        print(f"⚠️ Dropped {dropped} lines not covered by the checkpoint")
+    return names
+
+
+# ---------- Pipeline ----------
+def _request(backend, limiter, batch: Batch, names, retries: int, backoff: float):
+    """Run one batch with retries; returns (products, warnings) or raises the last error."""
+    last = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        limiter.acquire()
         try:
-            # Parse and validate the JSON response
-            generated_data = json.loads(response.text)
-            generated_products = [Product(**p) for p in generated_data['products']]  # Validate with Pydantic
-            all_products.extend(generated_products)
-            start_id += 10
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error for {category}: {e}. Skipping this batch.")
-        except ValueError as e:
-            print(f"Validation error for {category}: {e}. Skipping this batch.")
+            text = backend.generate(batch.prompt(names), batch.category, batch.count)
+            return parse_batch(text, batch)
+        except Exception as e:  # API errors and bad output are both retried
+            last = e
+    raise last
+
+
+def generate(backend, out_path: str = DEFAULT_OUT, per_category: int = DEFAULT_PER_CATEGORY,
+             batch_size: int = BATCH_SIZE, workers: int = WORKERS, rpm: float = REQUESTS_PER_MINUTE,
+             retries: int = RETRIES, backoff: float = RETRY_BACKOFF, resume: bool = False,
+             retry_failed: bool = False, only=None) -> dict:
+    """
+    Generate the catalog into `out_path` (NDJSON, one product per line),
+    streaming each validated batch as it completes. With `resume`, batches
+    recorded in the checkpoint are skipped; failed ones are only re-run with
+    `retry_failed` (or when listed in `only`, a set of batch indexes).
+    """
+    batches = plan_batches(per_category, batch_size)
+    params = {"per_category": per_category, "batch_size": batch_size, "categories": categories}
+    cp_path = out_path + ".checkpoint.json"
+    if resume:
+        checkpoint = Checkpoint.load(cp_path, params)
     else:
-        print(f"No response for {category}. Check API key or quota.")
+        checkpoint = Checkpoint(cp_path, params)
+        if os.path.exists(out_path):
+            os.remove(out_path)
+    names = _recover(out_path, checkpoint, batches) if resume else {}
+
+    todo = [b for b in batches if b.index not in checkpoint.done
+            and (retry_failed or b.index not in checkpoint.failed)]
+    if only is not None:
+        todo = [b for b in batches if b.index in only and b.index not in checkpoint.done]
+    checkpoint.save()
+
+    limiter = RateLimiter(rpm, burst=workers)
+    stats = {"batches": len(todo), "written": 0, "failed": 0, "dropped": 0}
+    start = time.perf_counter()
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queue = iter(todo)
+
+        def submit_next():
+            batch = next(queue, None)
+            if batch is not None:
+                seen = set(names.get(batch.category, ()))
+                pending[pool.submit(_request, backend, limiter, batch, seen, retries, backoff)] = batch
+
+        # Keep at most 2x workers batches in flight so memory stays flat for any catalog size
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                batch = pending.pop(future)
+                try:
+                    products, warnings = future.result()
+                except Exception as e:
+                    checkpoint.failed[batch.index] = f"{type(e).__name__}: {e}"
+                    stats["failed"] += 1
+                    print(f"⚠️ Batch {batch.index} ({batch.category}) failed: {e}")
+                else:
+                    out.write("".join(json.dumps(_dump(p)) + "\n" for p in products))
+                    out.flush()
+                    os.fsync(out.fileno())
+                    names.setdefault(batch.category, set()).update(p.name for p in products)
+                    checkpoint.done[batch.index] = len(products)
+                    checkpoint.failed.pop(batch.index, None)
+                    stats["written"] += len(products)
+                    stats["dropped"] += len(warnings)
+                checkpoint.save()
+                submit_next()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["total"] = sum(checkpoint.done.values())
+    stats["failed_batches"] = sorted(checkpoint.failed)
+    return stats
+
+
+def write_json(ndjson_path: str, json_path: str) -> int:
+    """Stream the NDJSON output into products.json's {"products": [...]} layout."""
+    count = 0
+    tmp = json_path + ".tmp"
+    with open(ndjson_path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+        dst.write('{"products": [\n')
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            dst.write((",\n" if count else "") + line)
+            count += 1
+        dst.write("\n]}\n")
+    os.replace(tmp, json_path)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the product catalog with an LLM")
+    parser.add_argument("--backend", default="gemini",
+                        help="gemini, stub (offline), or module:Class for a custom backend")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="NDJSON output, one product per line")
+    parser.add_argument("--json", metavar="PATH",
+                        help='also write {"products": [...]} here when no batch is left failed ("" to skip; '
+                             'default products.json for gemini, products.<backend>.json otherwise)')
+    parser.add_argument("--per-category", type=int, default=DEFAULT_PER_CATEGORY)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE, help="requests per minute, 0 = unlimited")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--resume", action="store_true", help="continue from <out>.checkpoint.json")
+    parser.add_argument("--retry-failed", action="store_true", help="with --resume, re-run failed batches too")
+    parser.add_argument("--only", type=int, nargs="+", metavar="BATCH", help="re-generate just these batches")
+    parser.add_argument("--seed", type=int, default=0, help="stub backend seed")
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="stub seconds per request")
+    args = parser.parse_args(argv)
+    if args.json is None:
+        # Only a real generation run replaces the committed dataset by default
+        backend_name = args.backend.rsplit(":", 1)[-1].lower()
+        args.json = os.path.basename(PRODUCTS_PATH) if backend_name == "gemini" else f"products.{backend_name}.json"
+
+    kwargs = {}
+    if args.backend == "stub":
+        kwargs = {"seed": args.seed, "failure_rate": args.stub_failure_rate, "latency": args.stub_latency}
+    backend = make_backend(args.backend, **kwargs)
+    stats = generate(backend, args.out, args.per_category, args.batch_size, args.workers, args.rpm,
+                     args.retries, resume=args.resume or args.only is not None,
+                     retry_failed=args.retry_failed, only=set(args.only) if args.only else None)
+
+    print(f"✅ Generated {stats['written']} products in {stats['batches']} batches "
+          f"({stats['seconds']:.1f}s); {stats['total']} in {args.out}")
+    if stats["dropped"]:
+        print(f"⚠️ {stats['dropped']} invalid products dropped from otherwise valid batches")
+    if stats["failed_batches"]:
+        print(f"⚠️ Failed batches {stats['failed_batches']}: rerun with --resume --retry-failed "
+              f"or --only {' '.join(map(str, stats['failed_batches']))}")
+        return 1
+    if args.json:
+        count = write_json(args.out, args.json)
+        print(f"Generated {count} products in {args.json}")
+    return 0
 
-# Save to JSON
-with open('products.json', 'w') as f:
-    json.dump({"products": [p.dict() for p in all_products]}, f, indent=2)
 
-print(f"Generated {len(all_products)} products in products.json")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
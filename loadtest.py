@@ -0,0 +1,432 @@
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark import QUERY_MIX, summarize
+
+DEFAULT_SESSIONS = 50
+DEFAULT_TURNS = 20          # turns per session
+DEFAULT_THINK_MS = 500.0    # mean pause between a session's turns
+DEFAULT_INTERVAL = 1.0      # seconds per report window
+MODES = ("threads", "processes", "asyncio")
+THINK_DISTRIBUTIONS = ("exp", "uniform", "fixed", "none")
+# "writer" queues turns for the background ConversationLogWriter, as app.py does;
+# "direct" commits each turn from the session itself, one write transaction per turn.
+LOG_MODES = ("writer", "direct", "off")
+
+# Backoff between BEGIN IMMEDIATE attempts in direct logging: SQLite's own
+# busy handler schedule, so waits match what a plain `timeout=` connection does.
+LOCK_RETRY_DELAYS = (0.001, 0.002, 0.005, 0.01, 0.015, 0.02, 0.025, 0.025, 0.025, 0.05, 0.05, 0.1)
+
+
+# ---------- Workload ----------
+def load_mix(path: str = None):
+    """[(message, weight)] from a JSON list of [message, weight] pairs, or benchmark.QUERY_MIX."""
+    if not path:
+        return [(message, weight) for message, weight, _ in QUERY_MIX]
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    mix = []
+    for item in items:
+        if isinstance(item, dict):
+            mix.append((item["message"], float(item.get("weight", 1.0))))
+        else:
+            mix.append((item[0], float(item[1]) if len(item) > 1 else 1.0))
+    if not mix:
+        raise ValueError(f"{path}: empty query mix")
+    return mix
+
+
+def think_time(rng: random.Random, distribution: str, mean_ms: float) -> float:
+    """Seconds a session pauses before its next turn."""
+    if distribution == "none" or mean_ms <= 0:
+        return 0.0
+    if distribution == "exp":
+        return rng.expovariate(1000.0 / mean_ms)
+    if distribution == "uniform":
+        return rng.uniform(0.0, 2.0 * mean_ms / 1000.0)
+    return mean_ms / 1000.0
+
+
+def session_script(session: int, cfg: dict, mix) -> list:
+    """
+    [(think_seconds, message)] for one session. Drawn from its own RNG seeded
+    by (seed, session), so a session says and waits the same things in every
+    run, whatever the mode or the scheduling between sessions.
+    """
+    rng = random.Random(f"{cfg['seed']}/{session}")
+    messages = [m for m, _ in mix]
+    weights = [w for _, w in mix]
+    picks = rng.choices(messages, weights=weights, k=cfg["turns"])
+    return [(think_time(rng, cfg["think"], cfg["think_ms"]), m) for m in picks]
+
+
+# ---------- Turn logging ----------
+def _is_locked(e: Exception) -> bool:
+    text = str(e).lower()
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in text or "busy" in text)
+
+
+class DirectLog:
+    """
+    One connection per session thread writing each turn in its own
+    BEGIN IMMEDIATE transaction. The connection never blocks inside SQLite
+    (timeout=0): busy attempts are retried here with SQLite's backoff, up to
+    db.BUSY_TIMEOUT, so every lock wait is counted and timed.
+    """
+
+    def __init__(self, db_path: str):
+        from db import PRAGMAS
+
+        self.conn = sqlite3.connect(db_path, timeout=0, isolation_level=None, check_same_thread=False)
+        for pragma in PRAGMAS:
+            try:
+                self.conn.execute(pragma)
+            except sqlite3.OperationalError:   # journal_mode needs the lock; another session set it
+                pass
+
+    def write(self, record) -> tuple:
+        """Commit one conversations row; returns (lock_waits, seconds_waited)."""
+        from db import BUSY_TIMEOUT
+        from log_writer import _INSERT_SQL
+
+        waits, started = 0, time.perf_counter()
+        while True:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.execute(_INSERT_SQL, record)
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                return waits, time.perf_counter() - started
+            except sqlite3.OperationalError as e:
+                waited = time.perf_counter() - started
+                if not _is_locked(e) or waited >= BUSY_TIMEOUT:
+                    raise
+                time.sleep(LOCK_RETRY_DELAYS[min(waits, len(LOCK_RETRY_DELAYS) - 1)])
+                waits += 1
+
+    def close(self):
+        self.conn.close()
+
+
+def _record(message, bot_text, interest, results):
+    """The row ConversationLogWriter.submit would queue for this turn."""
+    from chat_engine import message_filters
+    from log_writer import LOG_STORAGE, _utc_timestamp, compact_fields
+
+    if LOG_STORAGE == "compact":
+        return (message, None, int(interest), _utc_timestamp()) + compact_fields(results, message_filters(message))
+    return (message, bot_text, int(interest), _utc_timestamp(), None, None)
+
+
+# ---------- Sessions ----------
+def _turn(context, message, cfg, log):
+    """
+    One turn the way app.py runs it: generate_response with the session's
+    own SessionContext, then log it. Returns (latency_s, error, lock_waits, lock_wait_s).
+    """
+    from chat_engine import generate_response, log_conversation
+
+    t0 = time.perf_counter()
+    error, waits, waited = None, 0, 0.0
+    try:
+        bot_text, interest, results = generate_response(message, context)
+        if cfg["log"] == "writer":
+            if not log_conversation(message, bot_text, interest, results):
+                error = "log_dropped"
+        elif cfg["log"] == "direct":
+            waits, waited = log.write(_record(message, bot_text, interest, results))
+    except Exception as e:
+        error = "locked" if _is_locked(e) else type(e).__name__
+    return time.perf_counter() - t0, error, waits, waited
+
+
+def _run_session(session: int, cfg: dict, mix, start_at: float, out: list):
+    from session_context import SessionContext
+
+    context = SessionContext()
+    log = DirectLog(cfg["db"]) if cfg["log"] == "direct" else None
+    try:
+        for think, message in session_script(session, cfg, mix):
+            if think:
+                time.sleep(think)
+            began = time.time() - start_at
+            latency, error, waits, waited = _turn(context, message, cfg, log)
+            out.append((began, latency, error, waits, waited))
+    finally:
+        if log is not None:
+            log.close()
+
+
+async def _run_session_async(session, cfg, mix, start_at, out, loop, executor):
+    import asyncio
+
+    from session_context import SessionContext
+
+    context = SessionContext()
+    log = DirectLog(cfg["db"]) if cfg["log"] == "direct" else None
+    try:
+        for think, message in session_script(session, cfg, mix):
+            if think:
+                await asyncio.sleep(think)
+            began = time.time() - start_at
+            latency, error, waits, waited = await loop.run_in_executor(
+                executor, _turn, context, message, cfg, log)
+            out.append((began, latency, error, waits, waited))
+    finally:
+        if log is not None:
+            log.close()
+
+
+def _sample_writer(samples: list, start_at: float, interval: float, stop: threading.Event):
+    """(elapsed, ConversationLogWriter.stats()) every `interval`, for per-window log errors."""
+    from log_writer import get_log_writer
+
+    writer = get_log_writer()
+    while True:
+        samples.append((time.time() - start_at, writer.stats()))
+        if stop.wait(interval):
+            break
+    writer.flush()
+    samples.append((time.time() - start_at, writer.stats()))
+
+
+def run_sessions(sessions, cfg: dict, start_at: float = None) -> dict:
+    """
+    Run `sessions` (session numbers) in this process - one thread each, or
+    one coroutine each over a `cfg["workers"]` thread pool in asyncio mode -
+    starting at wall-clock `start_at` (once the catalog is loaded if None).
+    Returns {"turns": [...], "writer": [...], "start_at": ..., "finished": ...}.
+    """
+    import chat_engine
+    from catalog import get_catalog
+
+    if not cfg["cache"]:
+        chat_engine.RESPONSE_CACHE.maxsize = 0
+    get_catalog(cfg["db"])       # load before the clock starts, as a warm server would have
+    mix = load_mix(cfg["mix"])
+    turns, samples = [], []
+    stop = threading.Event()
+    sampler = None
+    if start_at is None:
+        start_at = time.time()
+    if cfg["log"] == "writer":
+        sampler = threading.Thread(target=_sample_writer, args=(samples, start_at, cfg["interval"], stop))
+    time.sleep(max(0.0, start_at - time.time()))
+    if sampler is not None:
+        sampler.start()
+
+    if cfg["mode"] == "asyncio":
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=cfg["workers"]) as executor:
+                await asyncio.gather(*(_run_session_async(s, cfg, mix, start_at, turns, loop, executor)
+                                       for s in sessions))
+
+        asyncio.run(main())
+    else:
+        threads = [threading.Thread(target=_run_session, args=(s, cfg, mix, start_at, turns), daemon=True)
+                   for s in sessions]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    finished = time.time()
+    if sampler is not None:
+        stop.set()
+        sampler.join()
+    return {"turns": turns, "writer": samples, "start_at": start_at, "finished": finished}
+
+
+# ---------- Report ----------
+def _writer_deltas(samples, windows: int, interval: float):
+    """Per-window increases of the writer's error/dropped/backpressure counters."""
+    out = [{"log_errors": 0, "log_dropped": 0, "log_backpressure": 0} for _ in range(windows)]
+    for prev, cur in zip(samples, samples[1:]):
+        w = min(int(cur[0] // interval), windows - 1)
+        for key, stat in (("log_errors", "errors"), ("log_dropped", "dropped"),
+                          ("log_backpressure", "backpressure")):
+            out[w][key] += cur[1][stat] - prev[1][stat]
+    return out
+
+
+def report(turns, writer_samples, interval: float, wall_seconds: float) -> dict:
+    """Totals plus one entry per `interval` window: throughput, latency, errors, lock waits."""
+    windows = max(1, math.ceil(wall_seconds / interval))
+    buckets = [[] for _ in range(windows)]
+    for turn in turns:
+        buckets[min(int(turn[0] // interval), windows - 1)].append(turn)
+    log_deltas = [{"log_errors": 0, "log_dropped": 0, "log_backpressure": 0} for _ in range(windows)]
+    for samples in writer_samples:
+        for w, delta in enumerate(_writer_deltas(samples, windows, interval)):
+            for key, n in delta.items():
+                log_deltas[w][key] += n
+
+    def stats(rows, seconds):
+        s = summarize([r[1] * 1e9 for r in rows], seconds)
+        errors = sum(1 for r in rows if r[2])
+        s.update({
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "locked": sum(1 for r in rows if r[2] == "locked"),
+            "lock_waits": sum(r[3] for r in rows),
+            "lock_wait_ms": sum(r[4] for r in rows) * 1000.0,
+        })
+        return s
+
+    timeline = []
+    for w, rows in enumerate(buckets):
+        seconds = min(interval, max(wall_seconds - w * interval, 1e-9))
+        entry = {"t": w * interval}
+        entry.update(stats(rows, seconds))
+        entry.update(log_deltas[w])
+        timeline.append(entry)
+    totals = stats(turns, wall_seconds)
+    kinds = {}
+    for r in turns:
+        if r[2]:
+            kinds[r[2]] = kinds.get(r[2], 0) + 1
+    totals["error_kinds"] = kinds
+    for key in ("log_errors", "log_dropped", "log_backpressure"):
+        totals[key] = sum(d[key] for d in log_deltas)
+    return {"totals": totals, "timeline": timeline}
+
+
+def copy_database(source: str, target: str):
+    """Consistent copy of `source` (WAL included) through the SQLite backup API."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+# ---------- Driver ----------
+def run(cfg: dict) -> dict:
+    """Run the whole load test described by `cfg` (see main for the keys)."""
+    sessions = list(range(cfg["sessions"]))
+    if cfg["mode"] == "processes":
+        import multiprocessing
+
+        procs = max(1, min(cfg["procs"], len(sessions)))
+        groups = [sessions[k::procs] for k in range(procs)]
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(procs) as pool:
+            # Every process waits for the same start time, so report windows line up
+            start_at = time.time() + cfg["startup_delay"]
+            parts = pool.starmap(run_sessions, [(g, cfg, start_at) for g in groups])
+    else:
+        parts = [run_sessions(sessions, cfg)]
+        start_at = parts[0]["start_at"]
+    wall = max(part["finished"] for part in parts) - start_at
+    turns = [t for part in parts for t in part["turns"]]
+    result = report(turns, [part["writer"] for part in parts], cfg["interval"], wall)
+    result["config"] = dict(cfg, env={k: v for k, v in os.environ.items() if k.startswith("FOODIEBOT_")})
+    result["wall_seconds"] = wall
+    return result
+
+
+def _print_report(r: dict):
+    print(f"{'t(s)':>6} {'turns/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'err %':>6} {'lock waits':>10} {'wait ms':>9} {'log err':>8}")
+    for w in r["timeline"]:
+        print(f"{w['t']:>6.0f} {w['throughput_per_s']:>9,.1f} {w['p50_ms']:>8.1f} {w['p99_ms']:>8.1f} "
+              f"{w['errors']:>7} {w['error_rate'] * 100:>6.2f} {w['lock_waits']:>10} "
+              f"{w['lock_wait_ms']:>9.0f} {w['log_errors'] + w['log_dropped']:>8}")
+    t = r["totals"]
+    print(f"⏱️  {t['calls']:,} turns in {r['wall_seconds']:.1f}s: {t['throughput_per_s']:,.1f} turns/s, "
+          f"p50 {t['p50_ms']:.1f} ms, p99 {t['p99_ms']:.1f} ms, max {t['max_ms']:.1f} ms")
+    status = "✅" if not t["errors"] and not t["log_errors"] else "⚠️"
+    kinds = "".join(f" {kind}={n:,}" for kind, n in sorted(t["error_kinds"].items()))
+    print(f"{status} {t['errors']:,} errors ({t['error_rate'] * 100:.2f}%){kinds}, "
+          f"{t['lock_waits']:,} lock waits ({t['lock_wait_ms']:,.0f} ms), "
+          f"{t['log_errors']:,} log write errors, {t['log_dropped']:,} dropped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent chat sessions against one database")
+    parser.add_argument("--db", help="database to run against and log every turn into "
+                                     "(default: a temporary copy of --source, removed afterwards)")
+    parser.add_argument("--source", default=os.environ.get("FOODIEBOT_DB", "foodiebot.db"),
+                        help="database copied for the run when --db is not given")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="turns per session")
+    parser.add_argument("--mode", default="threads", choices=MODES)
+    parser.add_argument("--procs", type=int, default=os.cpu_count() or 1,
+                        help="processes in --mode processes (sessions are split across them)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="thread pool serving the sessions in --mode asyncio")
+    parser.add_argument("--mix", help="JSON list of [message, weight] (default: benchmark.QUERY_MIX)")
+    parser.add_argument("--think", default="exp", choices=THINK_DISTRIBUTIONS,
+                        help="think-time distribution between a session's turns")
+    parser.add_argument("--think-ms", type=float, default=DEFAULT_THINK_MS, help="mean think time")
+    parser.add_argument("--log", default="writer", choices=LOG_MODES, help="how each turn is logged")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds per report window")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.sessions < 1 or args.turns < 1 or args.interval <= 0:
+        parser.error("--sessions and --turns must be >= 1 and --interval > 0")
+    load_mix(args.mix)   # fail on a bad --mix before starting anything
+    if args.db:
+        return _main(args)
+    if not os.path.exists(args.source):
+        parser.error(f"--source {args.source} does not exist")
+    # Simulated turns must not land in the real conversations log and analytics
+    with tempfile.TemporaryDirectory(prefix="foodiebot-loadtest-") as workdir:
+        args.db = os.path.join(workdir, os.path.basename(args.source))
+        copy_database(args.source, args.db)
+        print(f"   Running against a temporary copy of {args.source}")
+        return _main(args)
+
+
+def _main(args):
+    # chat_engine resolves the catalog from FOODIEBOT_DB, so set it before importing
+    # (spawned processes inherit it)
+    os.environ["FOODIEBOT_DB"] = args.db
+    cfg = {
+        "db": args.db, "sessions": args.sessions, "turns": args.turns, "mode": args.mode,
+        "procs": args.procs, "workers": args.workers, "mix": args.mix, "think": args.think,
+        "think_ms": args.think_ms, "log": args.log, "cache": not args.no_cache,
+        "interval": args.interval, "seed": args.seed,
+        # time for spawned processes to import and load the catalog before the shared start
+        "startup_delay": 5.0,
+    }
+    if args.log == "direct":
+        from db import get_connection
+        from log_writer import ensure_conversations
+
+        ensure_conversations(get_connection(args.db))
+
+    r = run(cfg)
+    from db import close_all
+
+    close_all()   # the temporary copy is removed next
+    _print_report(r)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2)
+        print(f"✅ Report written to {args.out}")
+    return 1 if r["totals"]["errors"] or r["totals"]["log_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
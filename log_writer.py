@@ -0,0 +1,251 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from analytics import ensure_analytics
+from db import DB_PATH, get_connection
+
+CONVERSATIONS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_message TEXT,
+        bot_response TEXT,
+        interest_score INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        product_ids TEXT,
+        filters TEXT
+    )
+"""
+# Columns added after the first release; older tables get them on first use.
+CONVERSATIONS_COLUMNS = {"product_ids": "TEXT", "filters": "TEXT"}
+# Keyset pagination and time-range reads walk (timestamp, id) in index order
+# (id is the rowid, which SQLite appends to every index entry).
+CONVERSATIONS_INDEXES = {
+    "idx_conversations_timestamp": "CREATE INDEX IF NOT EXISTS idx_conversations_timestamp "
+                                   "ON conversations(timestamp)",
+}
+
+_INSERT_SQL = """
+    INSERT INTO conversations (user_message, bot_response, interest_score, timestamp, product_ids, filters)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# "full" logs the rendered response; "compact" logs the returned product IDs and
+# the message's filters instead, and conversations.render_turn rebuilds the text.
+LOG_STORAGE = os.environ.get("FOODIEBOT_LOG_STORAGE", "full")
+LOG_STORAGES = ("full", "compact")
+
+BATCH_SIZE = 256          # flush once this many records are waiting...
+FLUSH_INTERVAL_MS = 200   # ...or once the oldest has waited this long
+QUEUE_SIZE = 10000        # bounded; submit() waits at most SUBMIT_TIMEOUT when full
+SUBMIT_TIMEOUT = 0.05
+# Backoff between attempts at a batch that failed with a transient error
+# ("database is locked" past the busy timeout, I/O); dropped only after the last.
+WRITE_RETRY_DELAYS = (0.1, 0.5, 2.0)
+
+_STOP = object()
+
+
+def ensure_conversations(conn):
+    """Create conversations, or bring an older table up to date (new columns, indexes)."""
+    conn.execute(CONVERSATIONS_SCHEMA)
+    have = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+    for column, decl in CONVERSATIONS_COLUMNS.items():
+        if column not in have:
+            conn.execute(f"ALTER TABLE conversations ADD COLUMN {column} {decl}")
+    for sql in CONVERSATIONS_INDEXES.values():
+        conn.execute(sql)
+    conn.commit()
+
+
+def compact_fields(results, filters) -> tuple:
+    """(product_ids, filters) column values: comma-joined IDs and sorted compact JSON."""
+    ids = ",".join(str(r.product_id) for r in results)
+    return ids, (json.dumps(filters, sort_keys=True, separators=(",", ":")) if filters else None)
+
+
+def _utc_timestamp() -> str:
+    """Same format as SQLite's CURRENT_TIMESTAMP, taken when the turn happened."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ConversationLogWriter:
+    """
+    Background writer for the conversations table. Records go through a
+    bounded queue and are written with executemany, one transaction per batch.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = BATCH_SIZE,
+                 flush_interval_ms: int = FLUSH_INTERVAL_MS, queue_size: int = QUEUE_SIZE,
+                 storage: str = None):
+        storage = storage or LOG_STORAGE
+        if storage not in LOG_STORAGES:
+            raise ValueError(f"unknown log storage {storage!r}; expected one of {LOG_STORAGES}")
+        self.db_path = db_path
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "backpressure": 0,   # submits that found the queue full
+            "dropped": 0,        # ...and gave up after SUBMIT_TIMEOUT
+            "retries": 0,        # batch writes retried after a transient error
+            "errors": 0,         # batches dropped
+        }
+        self._closed = False
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="conversation-log-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    # ---------- Producer side ----------
+    def submit(self, user_message: str, response: str, interest: int,
+               results=None, filters=None) -> bool:
+        """
+        Queue one turn; returns False if it was dropped. In compact storage
+        the result rows and filters are logged in place of `response` (which
+        is kept when `results` is not given).
+        """
+        if self._closed:
+            return False
+        if self.storage == "compact" and results is not None:
+            record = (user_message, None, int(interest), _utc_timestamp()) + compact_fields(results, filters)
+        else:
+            record = (user_message, response, int(interest), _utc_timestamp(), None, None)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count("backpressure")
+            try:
+                self._queue.put(record, timeout=SUBMIT_TIMEOUT)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("submitted")
+        return True
+
+    def flush(self):
+        """Block until everything submitted so far is committed."""
+        self._queue.join()
+
+    def close(self):
+        """Flush pending records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["queued"] = self._queue.qsize()
+        return snapshot
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    # ---------- Writer thread ----------
+    def _run(self):
+        conn = get_connection(self.db_path)
+        try:
+            ensure_conversations(conn)
+            ensure_analytics(conn)
+        except Exception as e:
+            print("LOG SCHEMA ERROR:", e)
+        finally:
+            self._ready.set()
+
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            batch = []
+            if first is _STOP:
+                stopping = True
+            else:
+                batch.append(first)
+            deadline = time.monotonic() + self.flush_interval
+            # Gather until the batch is full or the oldest record is due.
+            while not stopping and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if stopping:
+                # Drain whatever was queued before close()
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+                    else:
+                        self._queue.task_done()
+            self._write(conn, batch)
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self._queue.task_done()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        for attempt in range(len(WRITE_RETRY_DELAYS) + 1):
+            try:
+                with conn:
+                    conn.executemany(_INSERT_SQL, batch)
+                break
+            except sqlite3.OperationalError as e:
+                if attempt == len(WRITE_RETRY_DELAYS):
+                    self._count("errors")
+                    print(f"LOG WRITE ERROR: {e}; {len(batch)} turns dropped")
+                    return
+                self._count("retries")
+                time.sleep(WRITE_RETRY_DELAYS[attempt])
+            except Exception as e:
+                self._count("errors")
+                print(f"LOG WRITE ERROR: {e}; {len(batch)} turns dropped")
+                return
+        self._count("written", len(batch))
+        self._count("batches")
+
+
+# ---------- Process-wide writer ----------
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> ConversationLogWriter:
+    """Shared writer, started (and the schema created) on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ConversationLogWriter()
+    return _writer
+
+
+def shutdown_log_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+
+# Registered after db.close_all, so it runs first: pending logs hit disk before connections close.
+atexit.register(shutdown_log_writer)
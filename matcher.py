@@ -0,0 +1,76 @@
+import bisect
+import re
+
+
+def _trie_pattern(phrases) -> str:
+    """
+    Regex alternation shaped like a trie of `phrases`, so matching at a
+    position costs the phrase length rather than the number of phrases.
+    Branches start with distinct characters and optional tails are greedy,
+    so the first success at a position is the longest phrase there.
+    """
+    trie = {}
+    for p in phrases:
+        node = trie
+        for ch in p:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node):
+        terminal = "" in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+def _has_straddling(phrases) -> bool:
+    """True if some phrase can start inside another and run past its end."""
+    ordered = sorted(phrases)
+    for p in phrases:
+        for k in range(1, len(p)):
+            suffix = p[k:]
+            i = bisect.bisect_left(ordered, suffix)
+            while i < len(ordered) and ordered[i].startswith(suffix):
+                if len(ordered[i]) > len(suffix):
+                    return True
+                i += 1
+    return False
+
+
+class PhraseMatcher:
+    """
+    Finds every phrase of a fixed set occurring as a substring of a text in
+    a single regex scan (equivalent to `[p for p in phrases if p in text]`).
+    """
+
+    def __init__(self, phrases):
+        self.phrases = frozenset(p for p in phrases if p)
+        pattern = _trie_pattern(self.phrases)
+        if _has_straddling(self.phrases):
+            # Zero-width lookahead so overlapping occurrences are all reported.
+            self._re = re.compile("(?=(" + pattern + "))", re.S)
+        else:
+            # No phrase can straddle the end of another, so a plain
+            # non-overlapping scan (much faster in sre) misses nothing.
+            self._re = re.compile(pattern, re.S)
+        # Only the longest phrase starting at each position is captured; every
+        # shorter phrase that occurs is a substring of some captured one.
+        self._contained = {
+            p: frozenset(q for q in self.phrases if q in p) for p in self.phrases
+        }
+
+    def find(self, text: str) -> frozenset:
+        if not text or not self.phrases:
+            return frozenset()
+        found = self._re.findall(text)
+        if not found:
+            return frozenset()
+        if len(found) == 1:
+            return self._contained.get(found[0], frozenset())
+        return frozenset().union(*(self._contained.get(p, ()) for p in found))
@@ -0,0 +1,114 @@
+import re
+import unicodedata
+
+# ---------- Text ----------
+_ZERO_WIDTH_RE = re.compile(r"[\u200B-\u200D\uFEFF]")
+# ASCII characters str.isprintable() rejects, minus the \n and \t we keep
+_ASCII_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+
+def clean_text(s) -> str:
+    """
+    NFKC-normalize, drop zero-width and non-printable characters (keeping
+    newlines and tabs) and strip. Plain ASCII skips NFKC and the per-character
+    filter entirely - NFKC cannot change ASCII - and already-clean ASCII is
+    returned after two C-level checks.
+    """
+    if not s:
+        return ""
+    s = str(s)
+    if s.isascii():
+        if not s.isprintable():
+            s = _ASCII_CONTROL_RE.sub("", s)
+        return s.strip()
+    s = unicodedata.normalize("NFKC", s)
+    s = _ZERO_WIDTH_RE.sub("", s)
+    if not s.isprintable():
+        s = "".join(ch for ch in s if ch.isprintable() or ch in "\n\t")
+    return s.strip()
+
+
+# ---------- Prices ----------
+# Upper bound used for "cheap", "budget", "inexpensive"...
+CHEAP_PRICE_MAX = 8.0
+
+_NUMBER = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:[.,]\d{1,2})?)"
+_SYMBOL = r"[$€£]"
+_UNIT = r"(?:dollars?|bucks?|usd|eur(?:os?)?|gbp|pounds?|quid)\b"
+# An amount needs a currency marker on one side: "$8", "8$", "8 dollars", "€8.50", "8 eur"
+_AMOUNT = rf"(?:{_SYMBOL}\s*{_NUMBER}|{_NUMBER}\s*(?:{_SYMBOL}|{_UNIT}))"
+# In a range one marker covers both ends: "$5-10", "5 to 10 dollars"
+_BARE = rf"{_SYMBOL}?\s*{_NUMBER}\s*{_SYMBOL}?"
+
+_MAX_WORDS = (r"under|below|less than|cheaper than|no more than|not more than|at most|up to|"
+              r"max(?:imum)?|within|budget(?: is| of)?")
+_MIN_WORDS = r"over|above|more than|at least|min(?:imum)?|starting at"
+
+_RANGE_RE = re.compile(
+    rf"(?:between\s+{_BARE}\s+and\s+{_BARE}|from\s+{_BARE}\s+to\s+{_BARE}|{_BARE}\s*(?:-|–|to)\s*{_BARE})"
+    rf"\s*(?P<unit>{_UNIT})?"
+)
+_MAX_RE = re.compile(rf"\b(?:{_MAX_WORDS})\s*(?:of\s+)?{_AMOUNT}")
+_MIN_RE = re.compile(rf"\b(?:{_MIN_WORDS})\s*{_AMOUNT}")
+_SYMBOL_RE = re.compile(_SYMBOL)
+_HAS_AMOUNT_RE = re.compile(r"[\d$€£]")
+_THOUSANDS_RE = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+_CHEAP_HINTS = ("cheap", "inexpensive", "afford", "budget", "low")
+_CHEAP_RE = re.compile(r"\b(?:cheap(?:er|est)?|inexpensive|affordable|budget(?:-friendly)?|low[- ]cost)\b")
+
+
+def _to_float(number: str) -> float:
+    """'1,250' (thousands) -> 1250.0, '7,50' (decimal comma) -> 7.5."""
+    if _THOUSANDS_RE.fullmatch(number):
+        return float(number.replace(",", ""))
+    return float(number.replace(",", "."))
+
+
+def _amount(groups):
+    """First non-empty numeric group."""
+    for g in groups:
+        if g:
+            return _to_float(g)
+    return None
+
+
+def parse_price_range(text: str):
+    """
+    (price_min, price_max) mentioned in a message, either side None.
+
+        "under $10", "less than 10 dollars", "max €12"  -> (None, 10.0) ...
+        "over $5", "at least 5 bucks"                   -> (5.0, None)
+        "between $5 and $10", "$5-10", "5 to 10 euros"  -> (5.0, 10.0)
+        "2-3 tacos between $5 and $10"                  -> (5.0, 10.0)
+        "something cheap"                               -> (None, CHEAP_PRICE_MAX)
+
+    Amounts need a currency marker so "2 tacos" or "top 10" are not prices;
+    currencies are treated as the same unit.
+    """
+    if not text:
+        return None, None
+    t = text.lower()
+    if _HAS_AMOUNT_RE.search(t):
+        if "-" in t or "–" in t or " to " in t or "between" in t:
+            # The first range with a currency marker: "2-3" in "2-3 tacos for $5-10" is not a price
+            for m in _RANGE_RE.finditer(t):
+                if m.group("unit") or _SYMBOL_RE.search(m.group(0)):
+                    lo, hi = sorted(_to_float(g) for g in m.groups() if g and g[0].isdigit())[:2]
+                    return lo, hi
+        lo = hi = None
+        m = _MAX_RE.search(t)
+        if m:
+            hi = _amount(m.groups())
+        m = _MIN_RE.search(t)
+        if m:
+            lo = _amount(m.groups())
+        if lo is not None or hi is not None:
+            return lo, hi
+    if any(w in t for w in _CHEAP_HINTS) and _CHEAP_RE.search(t):
+        return None, CHEAP_PRICE_MAX
+    return None, None
+
+
+def parse_price(text: str):
+    """Upper price bound in a message, or None (see parse_price_range)."""
+    return parse_price_range(text)[1]
@@ -0,0 +1,128 @@
+from collections.abc import Sequence
+
+FIELDS = ("product_id", "name", "category", "price", "spice_level", "description", "dietary_tags")
+
+
+class Product:
+    """
+    One catalog row, built once per catalog version and shared by every query
+    that returns it. Indexes and unpacks like the 7-tuple query_database used
+    to return - (product_id, name, category, price, spice_level, description,
+    dietary_tags) - and compares equal to it; the lowercase name, parsed tag
+    set and rendered snippet are computed on first use and kept on the object.
+    """
+
+    # __weakref__ lets snapshot catalogs find a Product again after evicting it
+    __slots__ = FIELDS + ("_name_lc", "_tags", "snippet", "__weakref__")
+
+    def __init__(self, product_id, name, category, price, spice_level, description, dietary_tags):
+        self.product_id = product_id
+        self.name = name
+        self.category = category
+        self.price = price
+        self.spice_level = spice_level
+        self.description = description
+        self.dietary_tags = dietary_tags
+        self._name_lc = None
+        self._tags = None
+        self.snippet = None      # rendering.Snippet, filled by rendering.snippet()
+
+    @property
+    def name_lc(self) -> str:
+        if self._name_lc is None:
+            self._name_lc = (self.name or "").lower()
+        return self._name_lc
+
+    @property
+    def tags(self) -> frozenset:
+        """Lowercase dietary tags, e.g. frozenset({"vegetarian", "spicy"})."""
+        if self._tags is None:
+            raw = self.dietary_tags or ""
+            self._tags = frozenset(t.strip().lower() for t in raw.split(",") if t.strip())
+        return self._tags
+
+    def as_tuple(self) -> tuple:
+        return (self.product_id, self.name, self.category, self.price,
+                self.spice_level, self.description, self.dietary_tags)
+
+    def as_dict(self) -> dict:
+        return dict(zip(FIELDS, self.as_tuple()))
+
+    # ---------- 7-tuple compatibility ----------
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __getitem__(self, i):
+        if isinstance(i, int):
+            return getattr(self, FIELDS[i])
+        return self.as_tuple()[i]
+
+    def __eq__(self, other):
+        if isinstance(other, Product):
+            return other is self or self.as_tuple() == other.as_tuple()
+        if isinstance(other, tuple):
+            return self.as_tuple() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __reduce__(self):
+        return Product, self.as_tuple()
+
+    def __repr__(self):
+        return f"Product{self.as_tuple()!r}"
+
+
+def as_product(row) -> Product:
+    """`row` as a Product (rows may still arrive as plain 7-tuples from older callers)."""
+    return row if isinstance(row, Product) else Product(*row)
+
+
+class ResultSet(Sequence):
+    """
+    Query results as a read-only view: `rows` (a catalog's shared Products)
+    picked by `positions`. Nothing is copied per result - slicing returns
+    another view - so one cached ResultSet can be handed to every caller.
+    """
+
+    __slots__ = ("_rows", "_positions")
+
+    def __init__(self, rows, positions=None):
+        self._rows = rows
+        self._positions = range(len(rows)) if positions is None else positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ResultSet(self._rows, self._positions[i])
+        return self._rows[self._positions[i]]
+
+    def __iter__(self):
+        rows = self._rows
+        for i in self._positions:
+            yield rows[i]
+
+    def ids(self) -> list:
+        return [row.product_id for row in self]
+
+    def __eq__(self, other):
+        if isinstance(other, (ResultSet, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return ResultSet, (list(self),)
+
+    def __repr__(self):
+        return f"ResultSet({list(self)!r})"
+
+
+EMPTY = ResultSet(())
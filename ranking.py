@@ -0,0 +1,225 @@
+import threading
+
+import numpy as np
+
+from product import ResultSet
+
+# Relevance = sum of weight * term, each term scaled to [0, 1]:
+#   popularity       popularity_score / 100
+#   keyword          FTS rank, 1.0 for the best match down towards 0
+#   budget_fit       how far under price_max (only when a budget was given)
+#   spice_closeness  1 - |spice_level - spice_min| / 10 (only with spice_min)
+#   chef_special / limited_time   0 or 1
+# With the defaults, results come back in exactly the old order: most popular
+# first, or FTS order for keyword searches (fts.py already blends popularity
+# into that rank, so the popularity term is skipped there).
+DEFAULT_WEIGHTS = {
+    "popularity": 1.0,
+    "keyword": 1.0,
+    "budget_fit": 0.0,
+    "spice_closeness": 0.0,
+    "chef_special": 0.0,
+    "limited_time": 0.0,
+}
+
+
+def _codes(values):
+    """Dictionary-encode a list of strings: (int32 codes, list of distinct values)."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values),
+                        dtype=np.int32, count=len(values))
+    return codes, list(lookup)
+
+
+class RankingEngine:
+    """
+    Columnar view of a Catalog. Filters are boolean masks over the whole
+    catalog, relevance is one vectorized expression, and the top-k is
+    picked with argpartition, so there is no per-row Python work on the
+    query path however large the catalog is.
+
+    Numeric columns are zero-copy views of the catalog's arrays; category and
+    dietary strings are dictionary-encoded so a substring filter is evaluated
+    once per distinct value and then broadcast through the codes.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.generation = catalog.generation
+        self.n = len(catalog)
+        self.price = np.frombuffer(catalog.price, dtype=np.float64) if self.n else np.zeros(0)
+        self.spice = np.frombuffer(catalog.spice, dtype=np.int32) if self.n else np.zeros(0, np.int32)
+        self.popularity = np.asarray(catalog.popularity, dtype=np.float64) / 100.0
+        self.calories = np.asarray(catalog.calories, dtype=np.int32)
+        self.prep_time = np.asarray(catalog.prep_time, dtype=np.int32)
+        self.chef_special = np.asarray(catalog.chef_special, dtype=np.float64)
+        self.limited_time = np.asarray(catalog.limited_time, dtype=np.float64)
+
+        if hasattr(catalog, "category_code"):
+            # Snapshot catalogs (snapshot.py) store the codes as a column already
+            self.category_codes = np.frombuffer(catalog.category_code, dtype=np.int32) if self.n else np.zeros(0, np.int32)
+            self.categories = [c.lower() for c in catalog.categories]
+        else:
+            self.category_codes, self.categories = _codes(catalog.category_lc)
+        # Tag bitsets (tags.py): constraint filters are AND/ANDNOT over these
+        self.dietary_mask = np.frombuffer(catalog.dietary_mask, dtype=np.int64) if self.n else np.zeros(0, np.int64)
+        self.mood_mask = np.frombuffer(catalog.mood_mask, dtype=np.int64) if self.n else np.zeros(0, np.int64)
+        self.allergen_mask = np.frombuffer(catalog.allergen_mask, dtype=np.int64) if self.n else np.zeros(0, np.int64)
+
+    # ---------- Masks ----------
+    @staticmethod
+    def _contains(codes, values, needle):
+        table = np.array([needle in v for v in values], dtype=bool)
+        return table[codes] if len(codes) else np.zeros(0, bool)
+
+    def _keyword_mask(self, keyword):
+        """Substring match on the keyword fields (the FTS-unavailable fallback)."""
+        cat = self.catalog
+        haystack = cat.haystack
+        candidates = cat._keyword_candidates(keyword)
+        if candidates is None:
+            candidates = range(self.n)
+        mask = np.zeros(self.n, dtype=bool)
+        hits = [i for i in candidates if keyword in haystack[i]]
+        mask[hits] = True
+        return mask
+
+    def mask(self, category=None, price_max=None, spice_min=None, dietary=None,
+             vegetarian=False, keyword=None, exclude_allergens=None, price_min=None):
+        tags = self.catalog.tags
+        mask = np.ones(self.n, dtype=bool)
+        if price_max is not None:
+            mask &= self.price <= price_max
+        if price_min is not None:
+            mask &= self.price >= price_min
+        if spice_min is not None:
+            mask &= self.spice >= spice_min
+        if category:
+            mask &= self._contains(self.category_codes, self.categories, category)
+        if dietary:
+            need = tags.mask("dietary", [dietary] if isinstance(dietary, str) else dietary)
+            if need is None:
+                return np.zeros(self.n, dtype=bool)
+            mask &= (self.dietary_mask & need) == need
+        if vegetarian:
+            mask &= (self.dietary_mask & tags.any_mask("dietary", ("vegetarian", "vegan"))) != 0
+        if exclude_allergens:
+            mask &= (self.allergen_mask & tags.any_mask("allergen", exclude_allergens)) == 0
+        if keyword:
+            mask &= self._keyword_mask(keyword)
+        return mask
+
+    # ---------- Ranking ----------
+    def _relevance(self, idx, price_max, spice_min, keyword_score, weights):
+        w = weights
+        score = np.zeros(len(idx), dtype=np.float64)
+        if keyword_score is not None:
+            if w["keyword"]:
+                score += w["keyword"] * keyword_score
+        elif w["popularity"]:
+            score += w["popularity"] * self.popularity[idx]
+        if price_max and w["budget_fit"]:
+            score += w["budget_fit"] * np.clip(1.0 - self.price[idx] / price_max, 0.0, 1.0)
+        if spice_min is not None and w["spice_closeness"]:
+            score += w["spice_closeness"] * (1.0 - np.abs(self.spice[idx] - spice_min) / 10.0)
+        if w["chef_special"]:
+            score += w["chef_special"] * self.chef_special[idx]
+        if w["limited_time"]:
+            score += w["limited_time"] * self.limited_time[idx]
+        return score
+
+    @staticmethod
+    def _top_k(score, k):
+        """Indices of the k best scores, best first; ties keep their input order."""
+        if len(score) > k:
+            # Everything strictly above the k-th best score, then the earliest ties
+            kth = score[np.argpartition(-score, k - 1)[k - 1]]
+            above = np.flatnonzero(score > kth)
+            ties = np.flatnonzero(score == kth)[:k - len(above)]
+            keep = np.sort(np.concatenate((above, ties)))
+        else:
+            keep = np.arange(len(score))
+        return keep[np.argsort(-score[keep], kind="stable")]
+
+    def query(self, category=None, price_max=None, spice_min=None, dietary=None,
+              vegetarian=False, keyword=None, ranked_ids=None, limit=20,
+              exclude_allergens=None, price_min=None, weights=None):
+        """
+        Drop-in for Catalog.query, plus optional relevance `weights` (see
+        DEFAULT_WEIGHTS). Default weights only reproduce popularity/FTS order,
+        which the catalog's posting lists answer without a full pass, so those
+        queries are handed to it; anything else is ranked here.
+        """
+        if is_default(weights):
+            return self.catalog.query(category, price_max, spice_min, dietary, vegetarian,
+                                      keyword, ranked_ids, limit, exclude_allergens, price_min)
+        return self.rank(category, price_max, spice_min, dietary, vegetarian,
+                         keyword, ranked_ids, limit, exclude_allergens, price_min, weights)
+
+    def rank(self, category=None, price_max=None, spice_min=None, dietary=None,
+             vegetarian=False, keyword=None, ranked_ids=None, limit=20,
+             exclude_allergens=None, price_min=None, weights=None):
+        """Filter with masks, score every match, return the top `limit` rows."""
+        top, _ = self.top(category, price_max, spice_min, dietary, vegetarian, keyword,
+                          ranked_ids, limit, exclude_allergens, price_min, weights)
+        return ResultSet(self.catalog.rows, top.tolist())
+
+    def top(self, category=None, price_max=None, spice_min=None, dietary=None,
+            vegetarian=False, keyword=None, ranked_ids=None, limit=20,
+            exclude_allergens=None, price_min=None, weights=None, ranked_global=False):
+        """
+        (positions, scores) of the top `limit` matches, best first. With
+        `ranked_global` the keyword score of a ranked id comes from its index
+        in the whole `ranked_ids` list rather than among the ids this catalog
+        holds, so scores from catalogs holding different shards compare.
+        """
+        weights = {**DEFAULT_WEIGHTS, **weights} if weights else DEFAULT_WEIGHTS
+        category = category.lower() if category else None
+        keyword = keyword.lower() if keyword else None
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        if limit <= 0 or not self.n:
+            return empty
+
+        mask = self.mask(category, price_max, spice_min, dietary, vegetarian, keyword,
+                         exclude_allergens, price_min)
+        keyword_score = None
+        if ranked_ids is not None:
+            # Candidates in FTS order, so ties keep that order instead of popularity
+            position = self.catalog.position
+            pairs = [(k, position[pid]) for k, pid in enumerate(ranked_ids) if pid in position]
+            if not pairs:
+                return empty
+            order, ranked = (np.array(col, dtype=np.int64) for col in zip(*pairs))
+            keep = mask[ranked]
+            idx = ranked[keep]
+            if ranked_global:
+                keyword_score = (1.0 - order / max(len(ranked_ids), 1))[keep]
+            else:
+                keyword_score = (1.0 - np.arange(len(ranked)) / max(len(ranked), 1))[keep]
+        else:
+            idx = np.flatnonzero(mask)
+        score = self._relevance(idx, price_max, spice_min, keyword_score, weights)
+        best = self._top_k(score, limit)
+        return idx[best], score[best]
+
+
+def is_default(weights) -> bool:
+    """True if `weights` only reproduce popularity/FTS order."""
+    return not weights or all(weights.get(k, v) == v for k, v in DEFAULT_WEIGHTS.items())
+
+
+# ---------- Per-catalog instance ----------
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(catalog) -> RankingEngine:
+    """The RankingEngine for `catalog`, rebuilt once per catalog load."""
+    global _engine
+    engine = _engine
+    if engine is not None and engine.generation == catalog.generation:
+        return engine
+    with _engine_lock:
+        if _engine is None or _engine.generation != catalog.generation:
+            _engine = RankingEngine(catalog)
+        return _engine
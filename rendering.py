@@ -0,0 +1,69 @@
+from product import Product, as_product
+
+LISTING_DESC_CHARS = 140   # description excerpt in chat responses
+PREVIEW_DESC_CHARS = 200   # description excerpt in the app's results preview
+
+RESPONSE_HEADER = "Here are the results from our database:"
+NO_RESULTS = "No matching products found in our database. What else can I help with?"
+
+
+class Snippet:
+    """Pre-rendered text for one product; built once per catalog version."""
+
+    __slots__ = ("listing", "short_desc", "preview_title", "preview_desc")
+
+    def __init__(self, row):
+        row = as_product(row)
+        name, category, price, spice = row.name, row.category, row.price, row.spice_level
+        desc, tags = row.description, row.dietary_tags
+        self.short_desc = (desc[:LISTING_DESC_CHARS] + "...") if desc and len(desc) > LISTING_DESC_CHARS else desc
+        tag_text = f" (Tags: {tags})" if tags else ""
+        listing = f"- {name} — ${price:.2f}, Spice {spice}/10{tag_text}"
+        if self.short_desc:
+            listing += f"\n  {self.short_desc}"
+        self.listing = listing
+        self.preview_title = f"**{name}** — *{category}* — ${price:.2f} — Spice {spice}/10"
+        if desc and len(desc) > PREVIEW_DESC_CHARS:
+            self.preview_desc = desc[:PREVIEW_DESC_CHARS].rsplit(" ", 1)[0] + "..."
+        else:
+            self.preview_desc = desc
+
+
+def snippet(row, cache=None) -> Snippet:
+    """
+    Snippet for a result row: kept on the Product itself (Products live as
+    long as their catalog version), or memoized in `cache` (a Catalog's
+    `snippets`) by product_id for plain tuples.
+    """
+    if isinstance(row, Product):
+        s = row.snippet
+        if s is None:
+            s = row.snippet = Snippet(row)
+        return s
+    if cache is None:
+        return Snippet(row)
+    s = cache.get(row[0])
+    if s is None:
+        s = cache[row[0]] = Snippet(row)
+    return s
+
+
+def iter_response(results, cache=None):
+    """
+    The chat response in fragments - header, then one chunk per category
+    (sorted) - so a UI can start drawing before the whole list is joined.
+    "".join(iter_response(rows)) == render_response(rows).
+    """
+    if not results:
+        yield NO_RESULTS
+        return
+    by_cat = {}
+    for row in results:
+        by_cat.setdefault(row[2] or "Other", []).append(row)
+    yield RESPONSE_HEADER
+    for cat in sorted(by_cat):
+        yield f"\n\n{cat}:\n" + "\n".join(snippet(row, cache).listing for row in by_cat[cat])
+
+
+def render_response(results, cache=None) -> str:
+    return "".join(iter_response(results, cache))
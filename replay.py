@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+DEFAULT_BATCH = 5000
+
+
+def iter_conversations(conn, batch: int = DEFAULT_BATCH, limit: int = None, after_id: int = 0):
+    """Logged (id, user_message, interest_score) rows in id order, a page at a time by keyset."""
+    seen = 0
+    while limit is None or seen < limit:
+        size = batch if limit is None else min(batch, limit - seen)
+        rows = conn.execute(
+            "SELECT id, user_message, interest_score FROM conversations "
+            "WHERE id > ? ORDER BY id LIMIT ?", (after_id, size)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        seen += len(rows)
+        after_id = rows[-1][0]
+
+
+def replay(db_path: str, batch: int = DEFAULT_BATCH, limit: int = None, out=None, check: int = 0) -> dict:
+    """
+    Run every logged user message back through generate_response_many and
+    compare the interest score with the one that was logged. Turns are
+    replayed without session context (the table does not record sessions).
+    `check` also answers the first N messages one at a time with
+    generate_response and counts any that differ from the batch result.
+    """
+    import chat_engine
+    from db import get_connection
+
+    conn = get_connection(db_path)
+    totals = {"messages": 0, "unique": 0, "queries": 0, "cache_hits": 0,
+              "interest_changed": 0, "no_results": 0, "mismatches": 0}
+    start = time.perf_counter()
+    batch_seconds = 0.0
+    for rows in iter_conversations(conn, batch, limit):
+        messages = [m or "" for _, m, _ in rows]
+        stats = {}
+        t0 = time.perf_counter()
+        answers = chat_engine.generate_response_many(messages, stats=stats)
+        batch_seconds += time.perf_counter() - t0
+        for k in ("messages", "unique", "queries", "cache_hits"):
+            totals[k] += stats[k]
+        for (cid, message, logged), (_, interest, results) in zip(rows, answers):
+            if logged is not None and interest != logged:
+                totals["interest_changed"] += 1
+            if not results:
+                totals["no_results"] += 1
+            if out is not None:
+                out.write(json.dumps({"id": cid, "message": message, "interest": interest,
+                                      "logged_interest": logged,
+                                      "results": results.ids()}) + "\n")
+        if check > 0:
+            n = min(check, len(messages))
+            chat_engine.RESPONSE_CACHE.clear()
+            for message, answer in zip(messages[:n], answers[:n]):
+                if chat_engine.generate_response(message) != answer:
+                    totals["mismatches"] += 1
+            check -= n
+    totals["seconds"] = batch_seconds
+    totals["wall_seconds"] = time.perf_counter() - start
+    totals["messages_per_s"] = totals["messages"] / batch_seconds if batch_seconds else 0.0
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay logged conversations through generate_response_many")
+    parser.add_argument("--db", default=os.environ.get("FOODIEBOT_DB", "foodiebot.db"))
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="messages per generate_response_many call")
+    parser.add_argument("--limit", type=int, help="replay only the first N conversations")
+    parser.add_argument("--out", help="write one JSON line per replayed turn")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="verify the first N answers against one-at-a-time generate_response")
+    args = parser.parse_args(argv)
+
+    # chat_engine resolves the catalog from FOODIEBOT_DB, so set it before importing
+    os.environ["FOODIEBOT_DB"] = args.db
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    try:
+        r = replay(args.db, args.batch, args.limit, out, args.check)
+    finally:
+        if out is not None:
+            out.close()
+
+    print(f"⏱️  {r['messages']:,} messages in {r['seconds']:.2f}s: {r['messages_per_s']:,.0f} messages/s")
+    print(f"   {r['unique']:,} unique queries, {r['queries']:,} catalog queries, "
+          f"{r['cache_hits']:,} response-cache hits")
+    print(f"   {r['interest_changed']:,} interest scores differ from the log, "
+          f"{r['no_results']:,} turns without results")
+    if args.check:
+        status = "✅" if not r["mismatches"] else "⚠️"
+        print(f"{status} {r['mismatches']} of {min(args.check, r['messages'])} checked answers differ "
+              f"from generate_response")
+    if args.out:
+        print(f"✅ Results written to {args.out}")
+    return 1 if r["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
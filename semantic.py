@@ -0,0 +1,293 @@
+import math
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+
+from db import DB_PATH, get_connection
+from fts import STOPWORDS
+
+# Hashed TF-IDF over words and word prefixes: local, CPU-only, and close
+# enough for paraphrases like "cheesy" ~ "cheese" or "comforting" ~ "comfort".
+DIM = 1 << 16             # hash buckets (stored as uint16)
+PREFIX = 5                # words longer than this also count as their first PREFIX letters
+PREFIX_WEIGHT = 0.5
+# Part of every content hash: bump when featurization changes so sync_vectors redoes every row.
+FEATURES_VERSION = 1
+FIELD_WEIGHTS = (("name", 2.0), ("description", 1.0), ("ingredients", 1.0), ("mood_tags", 1.0))
+
+# Similarity below this is treated as "nothing similar" rather than a weak match.
+MIN_SCORE = 0.05
+MAX_CANDIDATES = 200
+
+VECTORS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_vectors (
+    product_id TEXT PRIMARY KEY,
+    content_hash INTEGER NOT NULL,
+    features BLOB NOT NULL
+)
+"""
+SYNC_BATCH = 2000
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+# ---------- Features ----------
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % DIM
+
+
+def features(text: str, weight: float = 1.0, into=None) -> dict:
+    """Hashed term counts for text: {bucket: weight}, words plus their prefixes."""
+    counts = into if into is not None else {}
+    for word in _WORD_RE.findall((text or "").lower()):
+        if word in STOPWORDS or len(word) < 2 or word.isdigit():
+            continue
+        b = _bucket("w:" + word)
+        counts[b] = counts.get(b, 0.0) + weight
+        if len(word) > PREFIX:
+            b = _bucket("p:" + word[:PREFIX])
+            counts[b] = counts.get(b, 0.0) + weight * PREFIX_WEIGHT
+    return counts
+
+
+def product_features(name, description, ingredients, mood_tags) -> dict:
+    counts = {}
+    for value, (_, weight) in zip((name, description, ingredients, mood_tags), FIELD_WEIGHTS):
+        features(value, weight, counts)
+    return counts
+
+
+def encode(counts: dict) -> bytes:
+    """Sparse blob: uint16 buckets then float32 sublinear term frequencies."""
+    buckets = array("H", sorted(counts))
+    weights = array("f", (1.0 + math.log(counts[b]) if counts[b] >= 1 else counts[b] for b in buckets))
+    return buckets.tobytes() + weights.tobytes()
+
+
+def content_hash(*fields) -> int:
+    key = "\0".join(str(f or "") for f in (FEATURES_VERSION, DIM, PREFIX) + fields)
+    return zlib.crc32(key.encode("utf-8"))
+
+
+# ---------- Ingestion ----------
+# Products that are new or whose text changed since their vector was computed,
+# a keyset page at a time: each page is read in full before it is written back,
+# and neither side of the comparison is held in Python memory.
+_CHANGED_SQL = """
+    SELECT p.product_id, p.name, p.description, p.ingredients, p.mood_tags
+    FROM products p LEFT JOIN product_vectors v ON v.product_id = p.product_id
+    WHERE p.product_id > ?
+      AND v.content_hash IS NOT content_hash(p.name, p.description, p.ingredients, p.mood_tags)
+    ORDER BY p.product_id
+    LIMIT ?
+"""
+
+
+def sync_vectors(conn) -> dict:
+    """
+    Bring product_vectors in line with products: featurize only products
+    whose text changed (by content hash) or that are new, and drop vectors of
+    deleted products. Safe to run after every load; memory stays flat.
+    """
+    conn.execute(VECTORS_SCHEMA)
+    conn.create_function("content_hash", 4, content_hash, deterministic=True)
+    updated = 0
+    last = ""
+    while True:
+        rows = conn.execute(_CHANGED_SQL, (last, SYNC_BATCH)).fetchall()
+        if not rows:
+            break
+        conn.executemany("INSERT OR REPLACE INTO product_vectors VALUES (?, ?, ?)", [
+            (pid, content_hash(name, desc, ingredients, mood),
+             encode(product_features(name, desc, ingredients, mood)))
+            for pid, name, desc, ingredients, mood in rows
+        ])
+        updated += len(rows)
+        last = rows[-1][0]
+    deleted = conn.execute(
+        "DELETE FROM product_vectors WHERE product_id NOT IN (SELECT product_id FROM products)"
+    ).rowcount
+    total = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    conn.commit()
+    return {"updated": updated, "deleted": deleted, "total": total}
+
+
+def has_vectors(conn) -> bool:
+    """
+    Whether product_vectors exists. Requests never build it: a database that
+    predates it has no semantic search until setup_db.py or `python semantic.py` runs.
+    """
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_vectors'"
+    ).fetchone() is not None
+
+
+# ---------- Index ----------
+class SemanticIndex:
+    """
+    Product vectors for one catalog load, IDF-weighted and L2-normalized,
+    stored bucket-major as contiguous arrays (CSR: `indptr` per bucket into
+    int32 `positions` and float32 `weights`, positions in catalog order).
+
+    A query only has a handful of non-zero buckets, so scoring reads just
+    their postings - an exact cosine top-k over the whole catalog that
+    touches a fraction of it, without an approximate index.
+    """
+
+    def __init__(self, catalog, rows):
+        import numpy as np
+
+        self.np = np
+        self.generation = catalog.generation
+        self.n = n = len(catalog)
+        position = catalog.position
+        bucket_parts, position_parts, weight_parts = [], [], []
+        for pid, blob in rows:
+            i = position.get(pid)
+            if i is None:
+                continue
+            k = len(blob) // 6
+            bucket_parts.append(np.frombuffer(blob, dtype=np.uint16, count=k))
+            weight_parts.append(np.frombuffer(blob, dtype=np.float32, count=k, offset=2 * k))
+            position_parts.append(np.full(k, i, dtype=np.int32))
+        if bucket_parts:
+            buckets = np.concatenate(bucket_parts)
+            positions = np.concatenate(position_parts)
+            weights = np.concatenate(weight_parts)
+        else:
+            buckets = np.zeros(0, dtype=np.uint16)
+            positions = np.zeros(0, dtype=np.int32)
+            weights = np.zeros(0, dtype=np.float32)
+        df = np.bincount(buckets, minlength=DIM)
+        self.idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+        weights = weights * self.idf[buckets]
+        norms = np.sqrt(np.bincount(positions, weights=weights * weights, minlength=n))
+        norms[norms == 0] = 1.0
+        weights /= norms[positions].astype(np.float32)
+        order = np.argsort(buckets, kind="stable")
+        self.positions = np.ascontiguousarray(positions[order])
+        self.weights = np.ascontiguousarray(weights[order], dtype=np.float32)
+        self.indptr = np.zeros(DIM + 1, dtype=np.int64)
+        np.cumsum(df, out=self.indptr[1:])
+
+    @classmethod
+    def load(cls, catalog, db_path: str = DB_PATH):
+        """The index for `catalog`, or None if the database has no product_vectors yet."""
+        conn = get_connection(db_path)
+        if not has_vectors(conn):
+            return None
+        return cls(catalog, conn.execute("SELECT product_id, features FROM product_vectors"))
+
+    def query_vector(self, text: str):
+        """(buckets, weights) of the normalized query vector, or None if it has no features."""
+        np = self.np
+        counts = features(text)
+        if not counts:
+            return None
+        buckets = np.fromiter(counts, dtype=np.intp, count=len(counts))
+        tf = np.fromiter((counts[b] for b in counts), dtype=np.float32, count=len(counts))
+        weights = np.where(tf >= 1, 1.0 + np.log(np.maximum(tf, 1)), tf).astype(np.float32) * self.idf[buckets]
+        norm = float(np.sqrt(weights @ weights))
+        if not norm:
+            return None
+        return buckets, weights / norm
+
+    def scores(self, text: str):
+        """Cosine similarity of every product to `text` (None if the text has no features)."""
+        q = self.query_vector(text)
+        if q is None or not self.n:
+            return None
+        np = self.np
+        scores = np.zeros(self.n, dtype=np.float32)
+        indptr, positions, weights = self.indptr, self.positions, self.weights
+        for b, w in zip(*q):
+            lo, hi = indptr[b], indptr[b + 1]
+            if lo != hi:
+                # positions are unique within a bucket, so fancy-index += is exact
+                scores[positions[lo:hi]] += w * weights[lo:hi]
+        return scores
+
+    def search(self, text: str, limit: int = MAX_CANDIDATES, mask=None, min_score: float = MIN_SCORE):
+        """Catalog positions of the `limit` most similar products, best first; `mask` restricts candidates."""
+        np = self.np
+        scores = self.scores(text)
+        if scores is None:
+            return []
+        if mask is not None:
+            scores[~mask] = -1.0
+        keep = np.flatnonzero(scores >= min_score)
+        if len(keep) > limit:
+            keep = keep[np.argpartition(-scores[keep], limit - 1)[:limit]]
+        # Best first; equal scores keep popularity order
+        return keep[np.argsort(-scores[keep], kind="stable")].tolist()
+
+
+def ranked_ids(catalog, text: str, limit: int = MAX_CANDIDATES, category=None, price_max=None,
+               spice_min=None, dietary=None, vegetarian=False, exclude_allergens=None,
+               price_min=None, db_path: str = DB_PATH):
+    """
+    Hybrid retrieval: the structured filters become a boolean mask over the
+    catalog (ranking.RankingEngine.mask), similarity ranks what passes it.
+    Returns product ids, most similar first - the same shape as
+    fts.keyword_search, so they can be passed on as Catalog.query(ranked_ids=...) -
+    or [] when the database has no vectors.
+    """
+    from ranking import get_engine
+
+    index = get_index(catalog, db_path)
+    if index is None:
+        return []
+    mask = get_engine(catalog).mask(category, price_max, spice_min, dietary, vegetarian,
+                                    None, exclude_allergens, price_min)
+    positions = index.search(text, limit, mask)
+    rows = catalog.rows
+    return [rows[i].product_id for i in positions]
+
+
+# ---------- Per-catalog instance ----------
+# How often a database without product_vectors is checked again.
+MISSING_RECHECK_INTERVAL = 30.0
+
+_index = None
+_missing = None            # (catalog generation, monotonic time) of the last "no vectors"
+_index_lock = threading.Lock()
+
+
+def get_index(catalog, db_path: str = DB_PATH):
+    """The SemanticIndex for `catalog`, rebuilt once per catalog load; None without vectors."""
+    global _index, _missing
+    index = _index
+    if index is not None and index.generation == catalog.generation:
+        return index
+    with _index_lock:
+        if _index is not None and _index.generation == catalog.generation:
+            return _index
+        missing = _missing
+        if (missing is not None and missing[0] == catalog.generation
+                and time.monotonic() - missing[1] < MISSING_RECHECK_INTERVAL):
+            return None
+        index = SemanticIndex.load(catalog, db_path)
+        if index is None:
+            _missing = (catalog.generation, time.monotonic())
+            return None
+        _index, _missing = index, None
+        return index
+
+
+if __name__ == "__main__":
+    import sys
+
+    conn = sqlite3.connect(DB_PATH)
+    stats = sync_vectors(conn)
+    conn.close()
+    print(f"✅ product_vectors: {stats['updated']} (re)computed, {stats['deleted']} removed, "
+          f"{stats['total']} products.")
+    if len(sys.argv) > 1:
+        from catalog import get_catalog
+
+        catalog = get_catalog()
+        for row in catalog.query(ranked_ids=ranked_ids(catalog, " ".join(sys.argv[1:])), limit=5):
+            print(f"   {row.name} ({row.category}, ${row.price:.2f})")
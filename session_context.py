@@ -0,0 +1,41 @@
+from collections import deque
+
+MAX_TURNS = 20        # raw (user, bot) turns kept for display/LLM prompts
+MAX_SHOWN_IDS = 100   # recently shown product IDs
+
+
+class SessionContext:
+    """
+    Per-session conversation state for generate_response. Derived state
+    (dietary constraints, excluded allergens, shown products) is updated
+    incrementally each turn, and only the last MAX_TURNS raw turns
+    are kept, so a turn costs the same however long the session runs.
+    """
+
+    __slots__ = ("turns", "dietary", "allergens", "shown_ids", "turn_count")
+
+    def __init__(self, max_turns: int = MAX_TURNS, max_shown: int = MAX_SHOWN_IDS):
+        self.turns = deque(maxlen=max_turns)      # (user_message, bot_text)
+        self.dietary = set()                      # e.g. {"vegetarian", "vegan"}
+        self.allergens = set()                    # allergen tags to exclude, e.g. {"nuts"}
+        self.shown_ids = deque(maxlen=max_shown)  # most recent last
+        self.turn_count = 0
+
+    @property
+    def vegetarian(self) -> bool:
+        """True once the user has asked for vegetarian or vegan food."""
+        return bool(self.dietary)
+
+    def record_turn(self, user_message: str, bot_text: str, results=(), dietary=(), allergens=()):
+        self.turns.append((user_message, bot_text))
+        self.dietary.update(dietary)
+        self.allergens.update(allergens)
+        self.shown_ids.extend(r.product_id for r in results)
+        self.turn_count += 1
+
+    def transcript(self) -> str:
+        """The retained turns in the old `User: ...\\nBot: ...\\n` string form."""
+        return "".join(f"User: {u}\nBot: {b}\n" for u, b in self.turns)
+
+    def __str__(self):
+        return self.transcript()
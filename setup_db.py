@@ -1,42 +1,33 @@
-import sqlite3
+import argparse
 import json
 import re
+import sqlite3
+import sys
+import time
+from functools import lru_cache
 
-def normalize_prep_time(raw):
-    """Convert prep_time strings into integer minutes."""
-    if not raw:
-        return 0
-    s = str(raw).lower().strip()
-    match = re.search(r'(\d+)', s)
-    if not match:
-        return 0
-    val = int(match.group(1))
-    if "sec" in s or "s" in s:
-        return max(1, round(val / 60))  # seconds → minutes
-    return val  # assume already minutes
-
-
-def safe_join(lst):
-    if not lst:
-        return ""
-    return ','.join([str(x) for x in lst])
-
-
-# Load products
-with open("products.json", "r", encoding="utf-8") as f:
-    products = json.load(f)["products"]
+from db import DB_PATH
+from fts import FTS_TRIGGERS, create_fts, ensure_fts, rebuild_fts
+from log_writer import ensure_conversations
+from normalizer import clean_text
+from semantic import sync_vectors
+from tags import TAG_DICTIONARY_SCHEMA, TagDictionary, ensure_tags
 
-# Connect DB
-conn = sqlite3.connect("foodiebot.db")
-c = conn.cursor()
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
-# Drop old tables for clean rebuild
-c.execute("DROP TABLE IF EXISTS products")
-c.execute("DROP TABLE IF EXISTS conversations")
+BATCH_SIZE = 5000          # rows per executemany
+COMMIT_EVERY = 100000      # rows per transaction
+# Feeds larger than this share of the existing table load in bulk: indexes and
+# FTS triggers are dropped and rebuilt once at the end. Smaller refreshes upsert
+# in place and the triggers keep products_fts in sync row by row.
+BULK_SHARE = 0.2
+READ_CHUNK = 1 << 16       # bytes read at a time when streaming JSON
 
-# Create products table
-c.execute('''
-CREATE TABLE products (
+PRODUCTS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
     product_id TEXT PRIMARY KEY,
     name TEXT NOT NULL,
     category TEXT NOT NULL,
@@ -52,54 +43,320 @@ CREATE TABLE products (
     chef_special INTEGER NOT NULL,
     limited_time INTEGER NOT NULL,
     spice_level INTEGER NOT NULL,
-    image_prompt TEXT
+    image_prompt TEXT,
+    dietary_mask INTEGER NOT NULL DEFAULT 0,   -- bitsets over tag_dictionary (tags.py)
+    mood_mask INTEGER NOT NULL DEFAULT 0,
+    allergen_mask INTEGER NOT NULL DEFAULT 0
 )
-''')
-
-# Create conversations table
-c.execute('''
-CREATE TABLE conversations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_message TEXT,
-    bot_response TEXT,
-    interest_score INTEGER,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+'''
+
+PRODUCT_COLUMNS = (
+    "product_id", "name", "category", "description", "ingredients", "price",
+    "calories", "prep_time", "dietary_tags", "mood_tags", "allergens",
+    "popularity_score", "chef_special", "limited_time", "spice_level", "image_prompt",
+    "dietary_mask", "mood_mask", "allergen_mask",
 )
-''')
-
-# Add indexes
-c.execute("CREATE INDEX IF NOT EXISTS idx_category ON products(category)")
-c.execute("CREATE INDEX IF NOT EXISTS idx_price ON products(price)")
-c.execute("CREATE INDEX IF NOT EXISTS idx_spice ON products(spice_level)")
-
-# Insert products
-inserted = 0
-for p in products:
-    try:
-        row = (
-            p.get("product_id"),
-            p.get("name", "Unnamed"),
-            p.get("category", "Misc"),
-            p.get("description", ""),
-            safe_join(p.get("ingredients", [])),
-            float(p.get("price", 0)),
-            int(p.get("calories", 0)),
-            normalize_prep_time(p.get("prep_time", "0")),
-            safe_join(p.get("dietary_tags", [])),
-            safe_join(p.get("mood_tags", [])),
-            safe_join(p.get("allergens", [])),
-            int(p.get("popularity_score", 0)),
-            1 if p.get("chef_special") else 0,
-            1 if p.get("limited_time") else 0,
-            int(p.get("spice_level", 0)),
-            p.get("image_prompt", "")
-        )
-        c.execute("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
-        inserted += 1
-    except Exception as e:
-        print(f"⚠️ Failed product {p.get('product_id', 'UNKNOWN')}: {e}")
-
-conn.commit()
-conn.close()
-
-print(f"✅ Database 'foodiebot.db' ready. Inserted {inserted}/{len(products)} products successfully.")
+
+# Insert or refresh by product_id; an UPDATE keeps the FTS triggers consistent
+UPSERT_SQL = (
+    f"INSERT INTO products ({', '.join(PRODUCT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))}) "
+    f"ON CONFLICT(product_id) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in PRODUCT_COLUMNS[1:])
+)
+
+INDEXES = {
+    "idx_category": "CREATE INDEX IF NOT EXISTS idx_category ON products(category)",
+    "idx_price": "CREATE INDEX IF NOT EXISTS idx_price ON products(price)",
+    "idx_spice": "CREATE INDEX IF NOT EXISTS idx_spice ON products(spice_level)",
+}
+
+
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+@lru_cache(maxsize=4096)  # feeds repeat a handful of prep_time strings
+def _prep_minutes(s):
+    match = _DIGITS.search(s)
+    if not match:
+        return 0
+    val = int(match.group(1))
+    if "sec" in s or "s" in s:
+        return max(1, round(val / 60))  # seconds → minutes
+    return val  # assume already minutes
+
+
+def normalize_prep_time(raw):
+    """Convert prep_time strings into integer minutes."""
+    if not raw:
+        return 0
+    return _prep_minutes(str(raw).lower().strip())
+
+
+def safe_join(lst):
+    if not lst:
+        return ""
+    return ','.join(map(str, lst))
+
+
+def product_row(p, tag_dict):
+    """Column values for one product; text is stored already cleaned (normalizer.clean_text)."""
+    return (
+        clean_text(p.get("product_id")) or None,
+        clean_text(p.get("name", "Unnamed")),
+        clean_text(p.get("category", "Misc")),
+        clean_text(p.get("description", "")),
+        clean_text(safe_join(p.get("ingredients", []))),
+        float(p.get("price", 0)),
+        int(p.get("calories", 0)),
+        normalize_prep_time(p.get("prep_time", "0")),
+        clean_text(safe_join(p.get("dietary_tags", []))),
+        clean_text(safe_join(p.get("mood_tags", []))),
+        clean_text(safe_join(p.get("allergens", []))),
+        int(p.get("popularity_score", 0)),
+        1 if p.get("chef_special") else 0,
+        1 if p.get("limited_time") else 0,
+        int(p.get("spice_level", 0)),
+        clean_text(p.get("image_prompt", "")),
+        tag_dict.encode("dietary", p.get("dietary_tags")),
+        tag_dict.encode("mood", p.get("mood_tags")),
+        tag_dict.encode("allergen", p.get("allergens")),
+    )
+
+
+# ---------- Streaming readers ----------
+def iter_ndjson(f):
+    """One product object per line; blank lines are skipped."""
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_json_array(f, key="products"):
+    """
+    Yield the elements of `{"<key>": [...]}` (or a top-level `[...]`) one at
+    a time, reading the file in chunks so memory stays flat.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(READ_CHUNK)
+    eof = not buf
+
+    # Find the opening bracket of the array
+    marker = re.compile(r'^\s*\[|"' + re.escape(key) + r'"\s*:\s*\[')
+    while True:
+        m = marker.search(buf)
+        if m:
+            pos = m.end()
+            break
+        if eof:
+            raise ValueError(f'No "{key}" array found')
+        more = f.read(READ_CHUNK)
+        eof = not more
+        buf += more
+
+    while True:
+        # Skip separators
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(READ_CHUNK), 0
+            eof = not buf
+        if pos >= len(buf):
+            raise ValueError("Unterminated products array")
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = f.read(READ_CHUNK)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        yield obj
+        pos = end
+        if pos > READ_CHUNK:
+            buf, pos = buf[pos:], 0
+
+
+def iter_products(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            yield from iter_ndjson(f)
+        else:
+            yield from iter_json_array(f)
+
+
+def _peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+# ---------- Load ----------
+def ingest(source="products.json", db_path=DB_PATH, rebuild=False, prune=False,
+           batch_size=BATCH_SIZE):
+    """
+    Stream products from `source` into db_path.
+
+    Default is an upsert keyed on product_id, so existing rows are refreshed
+    in place; `rebuild` drops products first, `prune` deletes products that
+    are not in the feed. The conversations table is never touched.
+
+    Only a rebuild, a load into an empty table, or a feed past BULK_SHARE of
+    the table drops the indexes and FTS triggers for a full re-index; small
+    refreshes leave them in place, so readers of the live database keep a
+    consistent products_fts throughout.
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=OFF")     # bulk load; a crash just means re-running it
+    c.execute("PRAGMA cache_size=-32768")   # 32MB page cache keeps memory flat
+    c.execute("PRAGMA temp_store=MEMORY")
+
+    if rebuild:
+        c.execute("DROP TABLE IF EXISTS products_fts")
+        c.execute("DROP TABLE IF EXISTS products")
+        c.execute("DROP TABLE IF EXISTS tag_dictionary")
+    c.execute(PRODUCTS_SCHEMA)
+    ensure_conversations(conn)
+    c.execute(TAG_DICTIONARY_SCHEMA)
+    ensure_tags(conn)   # older databases lack the mask columns
+    tag_dict = TagDictionary.load(conn)
+
+    existing = c.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    bulk = False
+
+    def go_bulk():
+        """Drop indexes and per-row FTS triggers; they are rebuilt once after the load."""
+        nonlocal bulk
+        bulk = True
+        for name in INDEXES:
+            c.execute(f"DROP INDEX IF EXISTS {name}")
+        for name in FTS_TRIGGERS:
+            c.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    if rebuild or not existing:
+        go_bulk()
+    else:
+        ensure_fts(conn)   # upserts below go through its sync triggers; re-created if a bulk load was cut short
+    if prune:
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS feed_ids (product_id TEXT PRIMARY KEY)")
+        c.execute("DELETE FROM feed_ids")
+
+    inserted = failed = 0
+    since_commit = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted, failed, since_commit
+        try:
+            c.executemany(UPSERT_SQL, batch)
+            ok = batch
+        except sqlite3.Error:
+            # Isolate the bad rows instead of losing the whole batch
+            ok = []
+            for row in batch:
+                try:
+                    c.execute(UPSERT_SQL, row)
+                    ok.append(row)
+                except sqlite3.Error as e:
+                    failed += 1
+                    print(f"⚠️ Failed product {row[0] or 'UNKNOWN'}: {e}")
+        if prune:
+            c.executemany("INSERT OR IGNORE INTO feed_ids VALUES (?)", ((r[0],) for r in ok))
+        inserted += len(ok)
+        since_commit += len(batch)
+        batch.clear()
+        tag_dict.save(conn)
+        if since_commit >= COMMIT_EVERY:
+            conn.commit()
+            since_commit = 0
+
+    for p in iter_products(source):
+        try:
+            batch.append(product_row(p, tag_dict))
+        except Exception as e:
+            failed += 1
+            print(f"⚠️ Failed product {p.get('product_id', 'UNKNOWN')}: {e}")
+            continue
+        if len(batch) >= batch_size:
+            flush()
+            if not bulk and inserted > existing * BULK_SHARE:
+                go_bulk()
+    if batch:
+        flush()
+
+    pruned = 0
+    if prune:
+        c.execute("DELETE FROM products WHERE product_id NOT IN (SELECT product_id FROM feed_ids)")
+        pruned = c.rowcount
+    conn.commit()
+    load_time = time.perf_counter() - start
+
+    for sql in INDEXES.values():
+        c.execute(sql)
+    if bulk:
+        create_fts(conn)
+        rebuild_fts(conn)
+    vectors = sync_vectors(conn)   # only re-featurizes products whose text changed
+
+    # Bump the catalog version so running chat engines reload their in-memory copy
+    c.execute("PRAGMA user_version")
+    c.execute(f"PRAGMA user_version = {c.fetchone()[0] + 1}")
+    conn.commit()
+    total = c.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    conn.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "inserted": inserted,
+        "failed": failed,
+        "pruned": pruned,
+        "total": total,
+        "bulk": bulk,
+        "vectors_updated": vectors["updated"],
+        "seconds": elapsed,
+        "rows_per_sec": inserted / load_time if load_time else 0.0,
+        "peak_memory_mb": _peak_memory_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load products into the FoodieBot database")
+    parser.add_argument("source", nargs="?", default="products.json",
+                        help='products.json ({"products": [...]}) or an .ndjson/.jsonl feed')
+    parser.add_argument("--db", default=DB_PATH, help="database to load (default: FOODIEBOT_DB or foodiebot.db)")
+    parser.add_argument("--rebuild", action="store_true", help="drop and recreate the products table first")
+    parser.add_argument("--prune", action="store_true", help="delete products missing from the feed")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--snapshot", action="store_true", help="also export a memory-mapped catalog snapshot")
+    parser.add_argument("--snapshot-path", help="snapshot file (default: <db>.snap)")
+    args = parser.parse_args(argv)
+
+    stats = ingest(args.source, args.db, rebuild=args.rebuild, prune=args.prune, batch_size=args.batch_size)
+    mem = f"{stats['peak_memory_mb']:.1f} MB" if stats["peak_memory_mb"] is not None else "n/a"
+    print(f"✅ Database '{args.db}' ready. Upserted {stats['inserted']}/{stats['inserted'] + stats['failed']} "
+          f"products successfully ({stats['total']} in table, {stats['pruned']} pruned, "
+          f"{stats['vectors_updated']} vectors recomputed{', bulk re-index' if stats['bulk'] else ''}).")
+    print(f"   {stats['rows_per_sec']:,.0f} rows/sec, {stats['seconds']:.2f}s total, peak memory {mem}")
+    if args.snapshot:
+        from snapshot import export_db, snapshot_path_for
+
+        path = args.snapshot_path or snapshot_path_for(args.db)
+        header = export_db(args.db, path)
+        print(f"✅ Snapshot '{path}' written ({header['size'] / 1e6:.1f} MB).")
+
+
+if __name__ == "__main__":
+    main()
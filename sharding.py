@@ -0,0 +1,415 @@
+import atexit
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from operator import itemgetter
+
+from catalog import VERSION_CHECK_INTERVAL, Catalog, _db_version, _generations, get_catalog
+import snapshot
+from db import DB_PATH, get_connection
+from product import EMPTY, Product, ResultSet
+from tags import require_tags
+
+# ---------- Config ----------
+# Serve catalog queries from this many shard processes; 0 keeps the in-process catalog.
+QUERY_WORKERS = int(os.environ.get("FOODIEBOT_QUERY_WORKERS", "0") or 0)
+# "hash" spreads products evenly by rowid; "category" keeps each category on one
+# shard, so category queries only wake the shards that hold a matching category.
+PARTITION = os.environ.get("FOODIEBOT_PARTITION", "hash")
+PARTITIONS = ("hash", "category")
+# Queries in flight at once: each holds its own set of pipes (one per shard)
+# for its whole fan-out, so concurrent requests never wait on each other's replies.
+QUERY_CONCURRENCY = int(os.environ.get("FOODIEBOT_QUERY_CONCURRENCY", "4") or 4)
+# Shard processes are named with this prefix; they never start shards themselves
+# (e.g. when "spawn" re-imports a main script without a __name__ guard).
+SHARD_NAME = "foodiebot-shard"
+
+
+class ShardError(RuntimeError):
+    """A shard process failed or died; the sharded catalog is closed."""
+
+
+# ---------- Shard process ----------
+def _merge_key(catalog, positions, scores, ranked_ids):
+    """
+    Sort key per result, comparable across shards: the FTS rank for ranked
+    queries, otherwise (-popularity, rowid) - the order Catalog.load uses -
+    prefixed by -score when custom weights ranked them.
+    """
+    if ranked_ids is not None:
+        position = catalog.position
+        rank = {position[pid]: k for k, pid in enumerate(ranked_ids) if pid in position}
+        order = [rank[i] for i in positions]
+    else:
+        popularity, rowid = catalog.popularity, catalog.rowid
+        order = [(-popularity[i], rowid[i]) for i in positions]
+    if scores is None:
+        return order
+    return [(-s, o) for s, o in zip(scores, order)]
+
+
+def _ranking():
+    """ranking.py, imported on the first weighted query; None without NumPy."""
+    try:
+        import ranking
+    except ImportError:  # shards answer in popularity/FTS order only
+        return None
+    return ranking
+
+
+def _shard_query(catalog, kwargs, weights):
+    ranking = _ranking() if weights else None
+    if ranking is not None and not ranking.is_default(weights):
+        positions, scores = ranking.get_engine(catalog).top(weights=weights, ranked_global=True, **kwargs)
+        positions, scores = positions.tolist(), scores.tolist()
+    else:
+        positions, scores = catalog.query_positions(**kwargs), None
+    rows = catalog.rows
+    keys = _merge_key(catalog, positions, scores, kwargs.get("ranked_ids"))
+    return [(key, rows[i].as_tuple()) for key, i in zip(keys, positions)]
+
+
+def _shard_main(conns, db_path):
+    """
+    Shard process loop over one pipe per parent pipe set, answering each on
+    the pipe it came in on: ("load", where, params) / ("query", kwargs, weights) / ("stop",).
+    """
+    from multiprocessing.connection import wait
+
+    catalog = None
+    conns = list(conns)
+    stopping = False
+    while conns and not stopping:
+        try:
+            ready = wait(conns)
+        except KeyboardInterrupt:
+            break
+        for conn in ready:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                conns.remove(conn)
+                continue
+            if msg[0] == "stop":
+                stopping = True
+                break
+            try:
+                if msg[0] == "load":
+                    catalog = None
+                    catalog = Catalog.load(db_path, msg[1], msg[2])
+                    reply = ("ok", (len(catalog), catalog.version))
+                else:
+                    reply = ("ok", _shard_query(catalog, msg[1], msg[2]))
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except OSError:
+                conns.remove(conn)
+    for conn in conns:
+        conn.close()
+
+
+# ---------- Partitioning ----------
+def _plan(conn, shards: int, partition: str):
+    """Per shard: (WHERE clause, params, categories held or None for "any")."""
+    if partition == "hash":
+        return [("WHERE rowid % ? = ?", (shards, k), None) for k in range(shards)]
+    if partition != "category":
+        raise ValueError(f"unknown partition {partition!r}; expected one of {PARTITIONS}")
+    counts = conn.execute(
+        "SELECT COALESCE(category, ''), COUNT(*) FROM products GROUP BY 1 ORDER BY 2 DESC, 1"
+    ).fetchall()
+    # Largest categories first, each onto the currently lightest shard
+    load = [(0, k) for k in range(shards)]
+    held = [[] for _ in range(shards)]
+    for category, count in counts:
+        size, k = heapq.heappop(load)
+        held[k].append(category)
+        heapq.heappush(load, (size + count, k))
+    plan = []
+    for categories in held:
+        if categories:
+            marks = ", ".join("?" * len(categories))
+            plan.append((f"WHERE COALESCE(category, '') IN ({marks})", tuple(categories),
+                         [c.lower() for c in categories]))
+        else:
+            plan.append(("WHERE 0", (), []))
+    return plan
+
+
+# ---------- Parent side ----------
+class ShardedCatalog:
+    """
+    The catalog split across `workers` processes, each holding only its own
+    partition, so a large catalog is neither duplicated per process nor
+    filtered under one GIL. query() fans a request out to the shards that
+    can match, which filter and rank in parallel, and merges their top
+    `limit` rows into exactly what Catalog.query / RankingEngine.query return
+    for the whole catalog.
+
+    Exposes the attributes chat_engine uses from a Catalog: generation,
+    version and snippets.
+
+    Up to `concurrency` queries are in flight at once, each on its own set
+    of pipes checked out for the whole fan-out; reload() and close() check
+    out every set, so they wait for in-flight queries and block new ones.
+    """
+
+    def __init__(self, workers: int, db_path: str = DB_PATH, partition: str = "hash",
+                 concurrency: int = None):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if partition not in PARTITIONS:
+            raise ValueError(f"unknown partition {partition!r}; expected one of {PARTITIONS}")
+        concurrency = max(1, concurrency or QUERY_CONCURRENCY)
+        self.db_path = db_path
+        self.partition = partition
+        self.version = None
+        self.generation = None
+        self.snippets = {}
+        self._products = {}
+        self.sizes = []
+        self.closed = False
+        self._lock = threading.Lock()     # reload/close only
+        self._categories = []
+        import multiprocessing  # only paid for when shards are used
+
+        ctx = multiprocessing.get_context("spawn")
+        # self._sets[i][k]: pipe set i's connection to shard k
+        self._sets = [[] for _ in range(concurrency)]
+        self._free = queue.Queue()
+        self._procs = []
+        for k in range(workers):
+            children = []
+            for pipes in self._sets:
+                parent, child = ctx.Pipe()
+                pipes.append(parent)
+                children.append(child)
+            proc = ctx.Process(target=_shard_main, args=(children, db_path),
+                               name=f"{SHARD_NAME}-{k}", daemon=True)
+            proc.start()
+            for child in children:
+                child.close()
+            self._procs.append(proc)
+        for i in range(concurrency):
+            self._free.put(i)
+        try:
+            self.reload()
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        return sum(self.sizes)
+
+    @property
+    def workers(self) -> int:
+        return len(self._procs)
+
+    @property
+    def concurrency(self) -> int:
+        return len(self._sets)
+
+    def _call(self, pipes, targets, messages):
+        """Send one message per target shard over one pipe set, then collect every reply."""
+        try:
+            for k, msg in zip(targets, messages):
+                pipes[k].send(msg)
+            replies = [pipes[k].recv() for k in targets]
+        except (EOFError, OSError) as e:
+            self.close()
+            raise ShardError(f"shard process lost: {e}") from e
+        except BaseException:
+            self.close()   # replies still in flight would desync the pipes
+            raise
+        errors = [payload for status, payload in replies if status != "ok"]
+        if errors:
+            raise ShardError("; ".join(errors))
+        return [payload for _, payload in replies]
+
+    def _checkout_all(self):
+        """Every pipe set, waiting for in-flight queries to return theirs."""
+        return [self._free.get() for _ in range(self.concurrency)]
+
+    def reload(self):
+        """(Re)partition and load every shard from the current products table."""
+        conn = get_connection(self.db_path)
+        require_tags(conn)
+        version = _db_version(conn)
+        plan = _plan(conn, self.workers, self.partition)
+        with self._lock:
+            if self.closed:
+                raise ShardError("sharded catalog is closed")
+            held = self._checkout_all()
+            try:
+                if self.closed:
+                    raise ShardError("sharded catalog is closed")
+                loaded = self._call(self._sets[held[0]], range(self.workers),
+                                    [("load", where, params) for where, params, _ in plan])
+                self.sizes = [size for size, _ in loaded]
+                # A rebuild landing mid-load leaves version None, so the next check reloads
+                self.version = version if all(v == version for _, v in loaded) else None
+                self._categories = [categories for _, _, categories in plan]
+                self.generation = next(_generations)
+                self.snippets = {}
+                self._products = {}
+            finally:
+                for i in held:
+                    self._free.put(i)
+
+    def _route(self, category):
+        """Shards that can hold a match for a category substring."""
+        if not category:
+            return list(range(self.workers))
+        needle = category.lower()
+        return [k for k, held in enumerate(self._categories)
+                if held is None or any(needle in c for c in held)]
+
+    def _product(self, row) -> Product:
+        """
+        One Product per product_id per load: shards send plain tuples (cheaper
+        to pickle) and every query returning a product shares its object.
+        """
+        product = self._products.get(row[0])
+        if product is None:
+            product = self._products.setdefault(row[0], Product(*row))
+        return product
+
+    def query(self, category=None, price_max=None, spice_min=None, dietary=None,
+              vegetarian=False, keyword=None, ranked_ids=None, limit=20,
+              exclude_allergens=None, price_min=None, weights=None):
+        """Catalog.query signature, plus RankingEngine `weights`."""
+        if limit <= 0:
+            return EMPTY
+        kwargs = dict(category=category, price_max=price_max, spice_min=spice_min,
+                      dietary=dietary, vegetarian=vegetarian, keyword=keyword,
+                      ranked_ids=ranked_ids, limit=limit,
+                      exclude_allergens=exclude_allergens, price_min=price_min)
+        message = ("query", kwargs, weights)
+        if self.closed:
+            raise ShardError("sharded catalog is closed")
+        i = self._free.get()
+        try:
+            if self.closed:
+                raise ShardError("sharded catalog is closed")
+            targets = self._route(category)
+            if not targets:
+                return EMPTY
+            results = self._call(self._sets[i], targets, [message] * len(targets))
+            if len(results) == 1:
+                merged = results[0]
+            else:
+                merged = itertools.islice(heapq.merge(*results, key=itemgetter(0)), limit)
+            # Interned before the set goes back, so a reload cannot swap _products underneath
+            return ResultSet([self._product(row) for _, row in merged])
+        finally:
+            self._free.put(i)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Stop shards over the pipe sets nobody is using; queries blocked on the
+        # others see EOF once the processes exit (or are terminated below).
+        idle = []
+        while True:
+            try:
+                idle.append(self._free.get_nowait())
+            except queue.Empty:
+                break
+        if idle:
+            for conn in self._sets[idle[0]]:
+                try:
+                    conn.send(("stop",))
+                except (OSError, ValueError):
+                    pass
+        for proc in self._procs:
+            proc.join(timeout=5 if idle else 0.5)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        for pipes in self._sets:
+            for conn in pipes:
+                conn.close()
+        for i in idle:
+            self._free.put(i)
+        self._procs = []
+
+
+# ---------- Process-wide instance ----------
+_sharded = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def configure(workers: int, partition: str = None):
+    """Switch query workers on (workers > 0) or off at runtime; drops any running shards."""
+    global QUERY_WORKERS, PARTITION
+    if partition is not None and partition not in PARTITIONS:
+        raise ValueError(f"unknown partition {partition!r}; expected one of {PARTITIONS}")
+    shutdown()
+    QUERY_WORKERS = workers
+    if partition is not None:
+        PARTITION = partition
+
+
+def get_sharded_catalog(db_path: str = DB_PATH) -> ShardedCatalog:
+    """The shared ShardedCatalog, started on first use and reloaded when products are rebuilt."""
+    global _sharded, _checked_at
+    now = time.monotonic()
+    cat = _sharded
+    if cat is not None and not cat.closed and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return cat
+    with _lock:
+        if _sharded is not None and _sharded.closed:
+            _sharded = None
+        if _sharded is None:
+            _sharded = ShardedCatalog(QUERY_WORKERS, db_path, PARTITION)
+        elif _db_version(get_connection(db_path)) != _sharded.version:
+            _sharded.reload()
+        _checked_at = now
+        return _sharded
+
+
+def _in_shard() -> bool:
+    import multiprocessing
+
+    return multiprocessing.current_process().name.startswith(SHARD_NAME)
+
+
+def active_catalog(db_path: str = DB_PATH):
+    """
+    The catalog queries should go to: the sharded one if QUERY_WORKERS > 0,
+    else the mapped snapshot if FOODIEBOT_SNAPSHOT is set, else the in-memory one.
+    """
+    if QUERY_WORKERS > 0 and not _in_shard():
+        return get_sharded_catalog(db_path)
+    if snapshot.SNAPSHOT_PATH:
+        return snapshot.get_snapshot(snapshot.SNAPSHOT_PATH, db_path)
+    return get_catalog(db_path)
+
+
+def shutdown():
+    global _sharded
+    with _lock:
+        if _sharded is not None:
+            _sharded.close()
+            _sharded = None
+
+
+atexit.register(shutdown)
+
+
+if __name__ == "__main__":
+    import sys
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else (QUERY_WORKERS or os.cpu_count() or 1)
+    start = time.perf_counter()
+    sharded = ShardedCatalog(workers, partition=PARTITION)
+    print(f"✅ {len(sharded):,} products in {workers} {PARTITION} shards "
+          f"{sharded.sizes} ({time.perf_counter() - start:.1f}s)")
+    sharded.close()
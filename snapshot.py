@@ -0,0 +1,468 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from collections import OrderedDict
+
+from catalog import VERSION_CHECK_INTERVAL, Catalog, _db_version, _generations, get_catalog
+from db import DB_PATH, get_connection
+from product import Product
+from tags import TagDictionary
+
+SNAPSHOT_PATH = os.environ.get("FOODIEBOT_SNAPSHOT", "")
+# Checking the CRC reads the whole file; opening without it only maps the header.
+VERIFY_ON_OPEN = os.environ.get("FOODIEBOT_SNAPSHOT_VERIFY", "") not in ("", "0")
+
+MAGIC = b"FBSNAP\0\0"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")   # magic, format version, header length
+_ALIGN = 8
+# Decoded rows kept alive per snapshot (least recently used dropped first);
+# popular products are returned over and over.
+ROW_CACHE_SIZE = 65536
+
+# Fixed-width per-product columns, in popularity order: name -> array typecode
+NUMERIC_COLUMNS = {
+    "price": "d", "spice": "i", "popularity": "i", "calories": "i", "prep_time": "i",
+    "chef_special": "b", "limited_time": "b",
+    "dietary_mask": "q", "mood_mask": "q", "allergen_mask": "q",
+    "rowid": "q", "category_code": "i",
+}
+# Variable-width columns: offsets (n + 1 int64) into a UTF-8 heap
+STRING_COLUMNS = ("product_key", "product_id", "name", "category", "description",
+                  "dietary_tags", "haystack", "trigram")
+# Sorted views and posting lists (positions / values as in Catalog)
+INDEX_SECTIONS = {
+    "price_order": "i", "price_sorted": "d", "spice_order": "i", "spice_sorted": "i",
+    "vegetarian": "i", "product_key_order": "i",
+    "category_postings": "i", "dietary_postings": "i",
+    "trigram_bounds": "q", "trigram_postings": "i",
+}
+
+
+class SnapshotError(ValueError):
+    """Not a snapshot, an unsupported format version, or a corrupt file."""
+
+
+# ---------- Export ----------
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % _ALIGN))
+
+
+def _strings(values):
+    """(offsets array, heap bytes) for a list of str."""
+    offsets = array("q", [0])
+    heap = bytearray()
+    for v in values:
+        heap += v.encode("utf-8")
+        offsets.append(len(heap))
+    return offsets, bytes(heap)
+
+
+def _postings(index: dict):
+    """Concatenate {key: positions} into one array plus {key: [start, end]}."""
+    blob = array("i")
+    bounds = {}
+    for key, postings in index.items():
+        bounds[key] = [len(blob), len(blob) + len(postings)]
+        blob.extend(postings)
+    return blob, bounds
+
+
+def export(catalog: Catalog, path: str, trigrams: bool = False) -> dict:
+    """
+    Write `catalog` to `path` as a snapshot (atomically, via a temp file).
+    Returns the header. Processes that already mapped the old file keep it.
+
+    `trigrams` also stores the keyword-fallback trigram index; it is usually
+    several times the size of everything else, and only needed when FTS5 is
+    unavailable, so by default readers build it on first use like Catalog.
+    """
+    n = len(catalog)
+    product_key = [None] * n
+    for pid, i in catalog.position.items():
+        product_key[i] = str(pid)
+    rows = catalog.rows
+    category_code, categories = array("i"), {}
+    for c in (row[2] for row in rows):
+        category_code.append(categories.setdefault(c, len(categories)))
+
+    sections = {name: getattr(catalog, name) for name in NUMERIC_COLUMNS if name != "category_code"}
+    sections["category_code"] = category_code
+    strings = {
+        "product_key": product_key,
+        "product_id": [row[0] for row in rows],
+        "name": [row[1] for row in rows],
+        "category": [row[2] for row in rows],
+        "description": [row[5] for row in rows],
+        "dietary_tags": [row[6] for row in rows],
+        "haystack": catalog.haystack,
+    }
+    for name in ("price_order", "price_sorted", "spice_order", "spice_sorted", "vegetarian"):
+        sections[name] = getattr(catalog, name)
+    sections["product_key_order"] = array("i", sorted(range(n), key=product_key.__getitem__))
+    sections["category_postings"], category_bounds = _postings(catalog.by_category)
+    dietary_postings, dietary_bounds = _postings(catalog.by_dietary)
+    sections["dietary_postings"] = dietary_postings
+    index = catalog.trigrams if trigrams else {}
+    grams = sorted(index)
+    sections["trigram_postings"], gram_bounds = _postings({g: index[g] for g in grams})
+    sections["trigram_bounds"] = array("q", [gram_bounds[g][0] for g in grams] + [len(sections["trigram_postings"])])
+    strings["trigram"] = grams
+
+    payload = []   # (name, typecode, bytes)
+    for name, typecode in {**NUMERIC_COLUMNS, **INDEX_SECTIONS}.items():
+        values = sections[name]
+        data = values.tobytes() if isinstance(values, array) else array(typecode, values).tobytes()
+        payload.append((name, typecode, data))
+    for name in STRING_COLUMNS:
+        offsets, heap = _strings(strings[name])
+        payload.append((f"{name}.offsets", "q", offsets.tobytes()))
+        payload.append((f"{name}.heap", "B", heap))
+
+    header = {
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "rows": n,
+        "db_version": list(catalog.version) if catalog.version else None,
+        "created": time.time(),
+        "tags": catalog.tags.bits,
+        "categories": list(categories),
+        "category_bounds": category_bounds,
+        "dietary_bounds": {str(bit): b for bit, b in dietary_bounds.items()},
+        "trigrams": len(grams) if trigrams else None,
+        "sections": {},
+        "checksum": 0,
+        "size": 0,
+    }
+    # Offsets relative to the first section for now; made absolute below
+    offset = 0
+    for name, typecode, data in payload:
+        header["sections"][name] = [offset, len(data), typecode]
+        offset += len(data) + (-len(data) % _ALIGN)
+    checksum = 0
+    for _, _, data in payload:
+        checksum = zlib.crc32(data, checksum)
+        checksum = zlib.crc32(b"\0" * (-len(data) % _ALIGN), checksum)
+    header["checksum"] = checksum
+    # Sections start right after the header, whose length depends on the
+    # absolute offsets written into it: grow the reserved space until it fits.
+    relative = {name: entry[0] for name, entry in header["sections"].items()}
+    base = 0
+    while True:
+        for name, entry in header["sections"].items():
+            entry[0] = base + relative[name]
+        header["size"] = base + offset
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        needed = _PREAMBLE.size + len(header_bytes)
+        if needed <= base:
+            break
+        base = needed + (-needed % _ALIGN)
+    header_bytes += b" " * (base - needed)
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for _, _, data in payload:
+                f.write(data)
+                _pad(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return header
+
+
+def export_db(db_path: str = DB_PATH, path: str = None, trigrams: bool = False) -> dict:
+    """Load the products table and write its snapshot (default: <db>.snap)."""
+    return export(Catalog.load(db_path), path or snapshot_path_for(db_path), trigrams)
+
+
+def snapshot_path_for(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + ".snap"
+
+
+# ---------- Reader ----------
+class _Strings:
+    """Read-only sequence of str decoded on access from an offsets + heap pair."""
+
+    __slots__ = ("offsets", "heap")
+
+    def __init__(self, offsets, heap):
+        self.offsets, self.heap = offsets, heap
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.heap[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class _Rows:
+    """
+    The catalog's Products, built from the columns on first access. One
+    Product per position for as long as anything holds it: the most recent
+    ROW_CACHE_SIZE are kept alive here, older ones are still found while the
+    response cache or a session references them.
+    """
+
+    __slots__ = ("cols", "cache", "live", "lock")
+
+    def __init__(self, cols):
+        self.cols = cols   # product_id, name, category, price, spice, description, dietary_tags
+        self.cache = OrderedDict()              # position -> Product, LRU
+        self.live = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cols[3])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        with self.lock:
+            row = self.cache.get(i)
+            if row is not None:
+                self.cache.move_to_end(i)
+                return row
+            row = self.live.get(i)
+            if row is None:
+                row = self.live[i] = Product(*[col[i] for col in self.cols])
+            self.cache[i] = row
+            if len(self.cache) > ROW_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return row
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class _Positions:
+    """product_id -> position, by binary search over the product ids in sorted order."""
+
+    __slots__ = ("keys", "order")
+
+    def __init__(self, keys, order):
+        self.keys, self.order = keys, order
+
+    def get(self, pid, default=None):
+        pid = str(pid)
+        k = bisect.bisect_left(self.order, pid, key=self.keys.__getitem__)
+        if k < len(self.order) and self.keys[self.order[k]] == pid:
+            return self.order[k]
+        return default
+
+    def __contains__(self, pid):
+        return self.get(pid) is not None
+
+    def __getitem__(self, pid):
+        i = self.get(pid)
+        if i is None:
+            raise KeyError(pid)
+        return i
+
+    def __len__(self):
+        return len(self.order)
+
+    def items(self):
+        for i in range(len(self.order)):
+            yield self.keys[i], i
+
+
+class _Trigrams:
+    """Trigram -> positions over the mapped postings; the key table is read on first use."""
+
+    def __init__(self, grams, bounds, postings):
+        self._grams, self._bounds, self._postings = grams, bounds, postings
+        self._index = None
+
+    def _lookup(self):
+        if self._index is None:
+            self._index = {g: k for k, g in enumerate(self._grams)}
+        return self._index
+
+    def get(self, gram, default=None):
+        k = self._lookup().get(gram)
+        if k is None:
+            return default
+        return self._postings[self._bounds[k]:self._bounds[k + 1]]
+
+    def __len__(self):
+        return len(self._grams)
+
+
+class SnapshotCatalog(Catalog):
+    """
+    A Catalog over a memory-mapped snapshot: columns, posting lists and the
+    trigram index are memoryviews into the file, strings are decoded when a
+    row is read, and nothing is parsed or copied at open - so opening takes
+    the same few milliseconds at any size, and every process mapping the
+    file shares one copy in the page cache. Queries go through the inherited
+    Catalog.query / query_positions, so results are identical.
+    """
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.stat.st_size else None
+        if self._mm is None or len(self._mm) < _PREAMBLE.size:
+            raise SnapshotError(f"{path}: not a FoodieBot snapshot")
+        magic, fmt, header_len = _PREAMBLE.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a FoodieBot snapshot")
+        if fmt != FORMAT_VERSION:
+            raise SnapshotError(f"{path}: format {fmt}, expected {FORMAT_VERSION}; re-export it")
+        header = json.loads(bytes(self._mm[_PREAMBLE.size:_PREAMBLE.size + header_len]))
+        if header["byteorder"] != sys.byteorder:
+            raise SnapshotError(f"{path}: written on a {header['byteorder']}-endian machine")
+        if header["size"] != len(self._mm):
+            raise SnapshotError(f"{path}: truncated ({len(self._mm)} of {header['size']} bytes)")
+        self.header = header
+        self._data_start = min(offset for offset, _, _ in header["sections"].values())
+        if verify:
+            self.verify()
+
+        view = memoryview(self._mm)
+        sections = {name: view[offset:offset + length].cast(typecode)
+                    for name, (offset, length, typecode) in header["sections"].items()}
+        strings = {name[:-len(".heap")]: _Strings(sections[f"{name[:-len('.heap')]}.offsets"], sections[name])
+                   for name in sections if name.endswith(".heap")}
+
+        self.version = tuple(header["db_version"]) if header["db_version"] else None
+        self.tags = TagDictionary(header["tags"])
+        self.generation = next(_generations)
+        for name in NUMERIC_COLUMNS:
+            setattr(self, name, sections[name])
+        self.rows = _Rows((strings["product_id"], strings["name"], strings["category"],
+                           self.price, self.spice, strings["description"], strings["dietary_tags"]))
+        self.position = _Positions(strings["product_key"], sections["product_key_order"])
+        self.haystack = strings["haystack"]
+        self.categories = header["categories"]
+        self._category_lc = None
+
+        category_postings = sections["category_postings"]
+        self.by_category = {c: category_postings[lo:hi] for c, (lo, hi) in header["category_bounds"].items()}
+        dietary_postings = sections["dietary_postings"]
+        self.by_dietary = {int(bit): dietary_postings[lo:hi]
+                           for bit, (lo, hi) in header["dietary_bounds"].items()}
+        self.vegetarian = sections["vegetarian"]
+        self.veg_bits = self.tags.any_mask("dietary", ("vegetarian", "vegan"))
+        self._match_cache = {}
+        for name in ("price_order", "price_sorted", "spice_order", "spice_sorted"):
+            setattr(self, name, sections[name])
+        self._trigrams = None
+        if header["trigrams"] is not None:
+            self._trigrams = _Trigrams(strings["trigram"], sections["trigram_bounds"],
+                                       sections["trigram_postings"])
+        self._trigram_lock = threading.Lock()
+        self.snippets = {}
+
+    @property
+    def category_lc(self):
+        """
+        Lowercased category per position. The filter loop reads it for every
+        candidate, so it is materialized on first use: one pointer per
+        product, the strings themselves are shared per category.
+        """
+        if self._category_lc is None:
+            values = [c.lower() for c in self.categories]
+            self._category_lc = list(map(values.__getitem__, self.category_code))
+        return self._category_lc
+
+    @classmethod
+    def load(cls, path: str = None, verify: bool = False):
+        return cls(path or snapshot_path_for(DB_PATH), verify)
+
+    def verify(self):
+        """Raise SnapshotError unless the payload matches the header checksum."""
+        checksum = zlib.crc32(memoryview(self._mm)[self._data_start:])
+        if checksum != self.header["checksum"]:
+            raise SnapshotError(f"{self.path}: checksum mismatch, the snapshot is corrupt")
+
+    def changed(self) -> bool:
+        """True if the file at self.path was replaced since it was mapped."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_ino, st.st_mtime_ns, st.st_size) != (
+            self.stat.st_ino, self.stat.st_mtime_ns, self.stat.st_size)
+
+
+# ---------- Process-wide instance ----------
+_snapshot = None
+_stale = False      # _snapshot was exported from an older version of the database
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_snapshot(path: str = None, db_path: str = DB_PATH) -> Catalog:
+    """
+    The shared SnapshotCatalog, remapped when the file is replaced by a new
+    export. While it is older than db_path (re-ingested without --snapshot),
+    FTS and semantic ids would come from rows it does not have, so the
+    SQLite-loaded catalog is returned instead until it is re-exported.
+    """
+    global _snapshot, _stale, _checked_at
+    path = path or SNAPSHOT_PATH or snapshot_path_for(DB_PATH)
+    now = time.monotonic()
+    snap = _snapshot
+    if snap is not None and snap.path == path and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return get_catalog(db_path) if _stale else snap
+    with _lock:
+        if _snapshot is None or _snapshot.path != path or _snapshot.changed():
+            _snapshot = SnapshotCatalog(path, VERIFY_ON_OPEN)
+            _stale = False
+        version = _db_version(get_connection(db_path))
+        stale = _snapshot.version is not None and _snapshot.version != version
+        if stale and not _stale:
+            print(f"SNAPSHOT ERROR: {path} is from db version {_snapshot.version}, {db_path} is at "
+                  f"{version}; serving the SQLite catalog until it is re-exported")
+        _stale = stale
+        _checked_at = now
+        snap = _snapshot
+    return get_catalog(db_path) if stale else snap
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export or check a memory-mapped catalog snapshot")
+    parser.add_argument("command", choices=("export", "verify", "info"))
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", help="snapshot path (default: <db>.snap)")
+    parser.add_argument("--trigrams", action="store_true",
+                        help="include the keyword-fallback trigram index (much larger file)")
+    args = parser.parse_args()
+    path = args.out or snapshot_path_for(args.db)
+
+    if args.command == "export":
+        start = time.perf_counter()
+        header = export_db(args.db, path, args.trigrams)
+        print(f"✅ {header['rows']:,} products -> {path} ({header['size'] / 1e6:.1f} MB, "
+              f"{time.perf_counter() - start:.1f}s)")
+    else:
+        start = time.perf_counter()
+        snap = SnapshotCatalog(path, verify=args.command == "verify")
+        elapsed = (time.perf_counter() - start) * 1000
+        h = snap.header
+        print(f"✅ {path}: format {h['format']}, {h['rows']:,} products, db version {h['db_version']}, "
+              f"crc32 {h['checksum']:08x}{' verified' if args.command == 'verify' else ''} "
+              f"(opened in {elapsed:.1f}ms)")
@@ -0,0 +1,182 @@
+import sqlite3
+
+from db import DB_PATH
+
+# Tag kind -> (comma-joined text column, bitmask column) on products.
+TAG_KINDS = {
+    "dietary": ("dietary_tags", "dietary_mask"),
+    "mood": ("mood_tags", "mood_mask"),
+    "allergen": ("allergens", "allergen_mask"),
+}
+MASK_COLUMNS = tuple(mask for _, mask in TAG_KINDS.values())
+
+# SQLite integers are signed 64-bit; bits 0-62 keep every mask non-negative.
+MAX_TAG_BITS = 63
+
+TAG_DICTIONARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tag_dictionary (
+    kind TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    bit INTEGER NOT NULL,
+    PRIMARY KEY (kind, tag)
+)
+"""
+
+MIGRATE_BATCH = 5000
+
+
+def split_tags(value):
+    """'Vegan, gluten-free' -> ['vegan', 'gluten-free'] (also accepts a list)."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [t for t in (str(v).strip().lower() for v in value) if t]
+
+
+class TagDictionary:
+    """
+    Tag -> bit assignments per kind, persisted in tag_dictionary so masks
+    stay valid across incremental loads. Tags are matched exactly (after
+    lowercasing), so "non-vegan" never satisfies "vegan".
+    """
+
+    def __init__(self, bits=None):
+        self.bits = {kind: {} for kind in TAG_KINDS}
+        for kind, tags in (bits or {}).items():
+            self.bits[kind].update(tags)
+        self.pending = []       # (kind, tag, bit) assigned since the last save()
+        self.overflow = set()   # (kind, tag) that did not fit in MAX_TAG_BITS
+
+    @classmethod
+    def load(cls, conn):
+        try:
+            rows = conn.execute("SELECT kind, tag, bit FROM tag_dictionary").fetchall()
+        except sqlite3.OperationalError:  # not migrated yet
+            rows = []
+        bits = {}
+        for kind, tag, bit in rows:
+            bits.setdefault(kind, {})[tag] = bit
+        return cls(bits)
+
+    def save(self, conn):
+        if self.pending:
+            conn.executemany("INSERT OR REPLACE INTO tag_dictionary (kind, tag, bit) VALUES (?, ?, ?)",
+                             self.pending)
+            self.pending = []
+
+    def bit(self, kind: str, tag: str):
+        return self.bits[kind].get(tag.strip().lower())
+
+    def _assign(self, kind, tag):
+        table = self.bits[kind]
+        if len(table) >= MAX_TAG_BITS:
+            if (kind, tag) not in self.overflow:
+                self.overflow.add((kind, tag))
+                print(f"⚠️ No bit left for {kind} tag '{tag}'; it is not filterable")
+            return None
+        bit = table[tag] = len(table)
+        self.pending.append((kind, tag, bit))
+        return bit
+
+    def encode(self, kind: str, value) -> int:
+        """Bitmask for a product's tags, assigning bits to new tags."""
+        mask = 0
+        table = self.bits[kind]
+        for tag in split_tags(value):
+            bit = table.get(tag)
+            if bit is None:
+                bit = self._assign(kind, tag)
+                if bit is None:
+                    continue
+            mask |= 1 << bit
+        return mask
+
+    def mask(self, kind: str, tags):
+        """
+        Bitmask for query tags, without assigning. Returns None if any tag is
+        unknown - nothing can carry it, so a filter requiring it matches nothing.
+        """
+        mask = 0
+        table = self.bits[kind]
+        for tag in split_tags(tags):
+            bit = table.get(tag)
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return mask
+
+    def any_mask(self, kind: str, tags) -> int:
+        """Bitmask of the known tags among `tags` (for exclusions / any-of)."""
+        mask = 0
+        table = self.bits[kind]
+        for tag in split_tags(tags):
+            bit = table.get(tag)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def decode(self, kind: str, mask: int):
+        return sorted(tag for tag, bit in self.bits[kind].items() if mask >> bit & 1)
+
+
+def _columns(conn):
+    return {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+
+
+def require_tags(conn):
+    """
+    Read-only check for the mask columns. Catalog loads never migrate (that
+    would lock out writers and rewrite every row on the request path), so a
+    database that predates them fails here until it is migrated.
+    """
+    if not set(MASK_COLUMNS) <= _columns(conn):
+        raise RuntimeError("products has no tag bitmask columns; run setup_db.py or python tags.py")
+
+
+def ensure_tags(conn) -> bool:
+    """
+    Migrate an existing foodiebot.db: add the mask columns and tag_dictionary
+    and encode every product from its text columns. Returns True if it ran.
+    """
+    conn.execute(TAG_DICTIONARY_SCHEMA)
+    if set(MASK_COLUMNS) <= _columns(conn):
+        conn.commit()
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cols = _columns(conn)
+        if set(MASK_COLUMNS) <= cols:
+            conn.rollback()
+            return False
+        for mask in MASK_COLUMNS:
+            if mask not in cols:
+                conn.execute(f"ALTER TABLE products ADD COLUMN {mask} INTEGER NOT NULL DEFAULT 0")
+        tag_dict = TagDictionary.load(conn)
+        text_cols = ", ".join(text for text, _ in TAG_KINDS.values())
+        update = (f"UPDATE products SET {', '.join(f'{m} = ?' for m in MASK_COLUMNS)} "
+                  f"WHERE rowid = ?")
+        cur = conn.execute(f"SELECT rowid, {text_cols} FROM products")
+        while True:
+            rows = cur.fetchmany(MIGRATE_BATCH)
+            if not rows:
+                break
+            conn.executemany(update, [
+                (*(tag_dict.encode(kind, value) for kind, value in zip(TAG_KINDS, row[1:])), row[0])
+                for row in rows
+            ])
+        tag_dict.save(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    migrated = ensure_tags(conn)
+    tag_dict = TagDictionary.load(conn)
+    conn.close()
+    counts = ", ".join(f"{len(tag_dict.bits[kind])} {kind}" for kind in TAG_KINDS)
+    print(f"✅ Tag bitmasks {'built' if migrated else 'already present'} ({counts} tags).")
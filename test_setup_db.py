@@ -0,0 +1,56 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+from fts import FTS_TRIGGERS
+from setup_db import ingest
+
+
+def _product(pid, name):
+    return {
+        "product_id": pid, "name": name, "category": "Burgers", "description": "A test burger",
+        "ingredients": ["bun"], "price": 9.5, "calories": 500, "prep_time": "10 mins",
+        "dietary_tags": [], "mood_tags": [], "allergens": [], "popularity_score": 50,
+        "chef_special": False, "limited_time": False, "spice_level": 1, "image_prompt": "",
+    }
+
+
+def _write_feed(path, products):
+    with open(path, "w", encoding="utf-8") as f:
+        for p in products:
+            f.write(json.dumps(p) + "\n")
+
+
+def test_refresh_restores_triggers_dropped_by_interrupted_bulk_load():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "foodiebot.db")
+        feed = os.path.join(tmp, "feed.ndjson")
+        _write_feed(feed, [_product(f"P{i:03d}", f"Burger {i}") for i in range(20)])
+        assert ingest(feed, db)["bulk"]
+
+        # A bulk load that died after dropping the triggers
+        conn = sqlite3.connect(db)
+        for name in FTS_TRIGGERS:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.commit()
+        conn.close()
+
+        # A refresh small enough to take the in-place path
+        _write_feed(feed, [_product("P007", "Zzyzx Burger")])
+        assert not ingest(feed, db)["bulk"]
+
+        conn = sqlite3.connect(db)
+        triggers = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        hits = conn.execute(
+            "SELECT p.product_id FROM products_fts f JOIN products p ON p.rowid = f.rowid "
+            "WHERE products_fts MATCH 'zzyzx'"
+        ).fetchall()
+        conn.close()
+        assert set(FTS_TRIGGERS) <= triggers
+        assert hits == [("P007",)]
+
+
+if __name__ == "__main__":
+    test_refresh_restores_triggers_dropped_by_interrupted_bulk_load()
+    print("✅ ok")
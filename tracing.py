@@ -0,0 +1,261 @@
+import bisect
+import heapq
+import os
+import threading
+import time
+
+# Off by default; a disabled span() is one function call returning a shared no-op.
+ENABLED = os.environ.get("FOODIEBOT_TRACE", "") not in ("", "0")
+# Keep cProfile (or pyinstrument) dumps for the N slowest requests; 0 = never profile
+PROFILE_SLOWEST = int(os.environ.get("FOODIEBOT_PROFILE_SLOWEST", "0") or 0)
+PROFILE_DIR = os.environ.get("FOODIEBOT_PROFILE_DIR", "profiles")
+PROFILER = os.environ.get("FOODIEBOT_PROFILER", "cprofile")   # or "pyinstrument"
+
+# Histogram bucket upper bounds, microseconds
+_BOUNDS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1_000, 2_000, 5_000, 10_000,
+              20_000, 50_000, 100_000, 200_000, 500_000, 1_000_000, 10_000_000)
+
+
+def enable(profile_slowest: int = None):
+    global ENABLED, PROFILE_SLOWEST
+    ENABLED = True
+    if profile_slowest is not None:
+        PROFILE_SLOWEST = profile_slowest
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+class Histogram:
+    """Fixed log-spaced buckets; percentiles are reported as bucket upper bounds."""
+
+    __slots__ = ("counts", "count", "total_us", "max_us")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS_US) + 1)
+        self.count = 0
+        self.total_us = 0.0
+        self.max_us = 0.0
+
+    def record(self, us: float):
+        self.counts[bisect.bisect_left(_BOUNDS_US, us)] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def percentile(self, q: float) -> float:
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(_BOUNDS_US[i], self.max_us) if i < len(_BOUNDS_US) else self.max_us
+        return self.max_us
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_us / self.count / 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) / 1000,
+            "p95_ms": self.percentile(0.95) / 1000,
+            "p99_ms": self.percentile(0.99) / 1000,
+            "max_ms": self.max_us / 1000,
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_sql = {}            # sql text -> {"plan": [...], "hist": Histogram}
+_slowest = []        # min-heap of (ms, seq, name, path)
+_seq = 0
+# Held by the one turn being profiled. Profilers are per process (cProfile only
+# sees the thread that enabled it, and on 3.12+ a second one raises), so turns
+# that overlap it on other threads just go unprofiled.
+_profile_lock = threading.Lock()
+
+
+def _record(name: str, us: float):
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = Histogram()
+        h.record(us)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, (time.perf_counter() - self.start) * 1e6)
+        return False
+
+
+def span(name: str):
+    """`with span("stage"):` times the block into the stage's histogram."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+class _RequestSpan(_Span):
+    """Root span for one chat turn; optionally profiles it and keeps the slowest dumps."""
+
+    __slots__ = ("profiler",)
+
+    def __enter__(self):
+        self.profiler = None
+        if PROFILE_SLOWEST > 0 and _profile_lock.acquire(blocking=False):
+            try:
+                self.profiler = _start_profiler()
+            except Exception as e:
+                # Diagnostics must never fail the turn being measured
+                print("TRACE ERROR:", e)
+                _profile_lock.release()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _record(self.name, elapsed * 1e6)
+        if self.profiler is not None:
+            try:
+                _keep_if_slow(self.name, elapsed * 1000, self.profiler)
+            except Exception as e:
+                print("TRACE ERROR:", e)
+            finally:
+                self.profiler = None
+                _profile_lock.release()
+        return False
+
+
+def request(name: str = "turn"):
+    if not ENABLED:
+        return _NOOP
+    return _RequestSpan(name)
+
+
+# ---------- Profiling the slowest requests ----------
+def _start_profiler():
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass
+        else:
+            p = Profiler()
+            p.start()
+            return p
+    import cProfile
+    p = cProfile.Profile()
+    p.enable()
+    return p
+
+
+def _keep_if_slow(name: str, ms: float, profiler):
+    global _seq
+    is_pyinstrument = hasattr(profiler, "output_html")
+    if is_pyinstrument:
+        profiler.stop()
+    else:
+        profiler.disable()
+    with _lock:
+        if len(_slowest) >= PROFILE_SLOWEST and ms <= _slowest[0][0]:
+            return
+        _seq += 1
+        seq = _seq
+    ext = "html" if is_pyinstrument else "prof"
+    path = os.path.join(PROFILE_DIR, f"{name}-{seq:06d}-{ms:.1f}ms.{ext}")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if is_pyinstrument:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.dump_stats(path)
+    except OSError as e:
+        # Diagnostics must never fail the turn being measured
+        print("TRACE ERROR:", e)
+        return
+    evicted = None
+    with _lock:
+        heapq.heappush(_slowest, (ms, seq, name, path))
+        if len(_slowest) > PROFILE_SLOWEST:
+            evicted = heapq.heappop(_slowest)
+    if evicted is not None:
+        try:
+            os.remove(evicted[3])
+        except OSError:
+            pass
+
+
+# ---------- SQL ----------
+def execute(conn, sql: str, params=(), name: str = "sql"):
+    """
+    conn.execute(sql, params).fetchall(), timed under `name` and per
+    statement; the query plan is captured the first time a statement runs.
+    """
+    if not ENABLED:
+        return conn.execute(sql, params).fetchall()
+    entry = _sql.get(sql)
+    if entry is None:
+        try:
+            plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        except Exception as e:
+            plan = [f"unavailable: {e}"]
+        entry = {"name": name, "plan": plan, "hist": Histogram()}
+        with _lock:
+            entry = _sql.setdefault(sql, entry)
+    start = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    us = (time.perf_counter() - start) * 1e6
+    _record(name, us)
+    with _lock:
+        entry["hist"].record(us)
+    return rows
+
+
+# ---------- Reporting ----------
+def snapshot() -> dict:
+    """Stage histograms, SQL plans/timings and the retained slow-request profiles."""
+    with _lock:
+        return {
+            "enabled": ENABLED,
+            "stages": {name: h.snapshot() for name, h in sorted(_histograms.items())},
+            "sql": [
+                {"name": e["name"], "sql": " ".join(sql.split()), "plan": e["plan"], **e["hist"].snapshot()}
+                for sql, e in _sql.items()
+            ],
+            "slowest": [
+                {"name": name, "ms": ms, "profile": path}
+                for ms, _, name, path in sorted(_slowest, reverse=True)
+            ],
+        }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _sql.clear()
+        _slowest.clear()